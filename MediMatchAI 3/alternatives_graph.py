@@ -0,0 +1,142 @@
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Reachability results kept per graph; the memo is cleared when it fills up
+REACHABILITY_CACHE_SIZE = 10000
+
+
+def split_alternatives(alternatives) -> List[str]:
+    """Split a comma-separated 'Alternatives' value into names (already-split names are kept)."""
+    if isinstance(alternatives, (list, tuple)):
+        return list(alternatives)
+    if not isinstance(alternatives, str):
+        return []
+    return [name.strip() for name in alternatives.split(',') if name.strip()]
+
+
+class AlternativesGraph:
+    """
+    Therapeutic-equivalence graph compiled from the catalog's 'Alternatives' lists.
+
+    Every distinct medication name is a node with an integer ID. Edges point
+    from a medication to the alternatives it lists, which are resolved by
+    name first and then by generic name, exactly like a one-hop lookup. The
+    adjacency lists are stored in CSR form: node i's alternatives are
+    `indices[indptr[i]:indptr[i + 1]]`, in listed order.
+    """
+
+    def __init__(self, names: Sequence[str], generic_names: Sequence[str], alternatives: Sequence):
+        self.names: List[str] = []
+        # lowercase name -> node ID
+        self.name_index: Dict[str, int] = {}
+        for name in names:
+            key = str(name).lower()
+            if key not in self.name_index:
+                self.name_index[key] = len(self.names)
+                self.names.append(name)
+
+        # lowercase generic name -> first node with that generic name
+        self.generic_index: Dict[str, int] = {}
+        for name, generic in zip(names, generic_names):
+            if isinstance(generic, str):
+                self.generic_index.setdefault(generic.lower(), self.name_index[str(name).lower()])
+
+        adjacency: List[List[int]] = [[] for _ in self.names]
+        for name, listed in zip(names, alternatives):
+            node = self.name_index[str(name).lower()]
+            if adjacency[node]:
+                continue  # Duplicate name; the first row wins, as in find_exact
+            for alternative in self.resolve(split_alternatives(listed)):
+                if alternative != node and alternative not in adjacency[node]:
+                    adjacency[node].append(alternative)
+
+        lengths = np.array([len(targets) for targets in adjacency], dtype=np.int64)
+        self.indptr = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.indptr[1:])
+        self.indices = np.array([target for targets in adjacency for target in targets], dtype=np.int64)
+
+        self._reachable: Dict[Tuple[int, int], Tuple[Tuple[int, int], ...]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def node(self, name: str) -> Optional[int]:
+        """Node ID of a medication name (or, failing that, a generic name)."""
+        key = str(name).lower()
+        node = self.name_index.get(key)
+        return node if node is not None else self.generic_index.get(key)
+
+    def resolve(self, names: Sequence[str]) -> List[int]:
+        """Node IDs of the names that are in the catalog, in order, without duplicates."""
+        nodes = []
+        for name in names:
+            node = self.node(name)
+            if node is not None and node not in nodes:
+                nodes.append(node)
+        return nodes
+
+    def reachable(self, node: int, max_depth: int = 1) -> Tuple[Tuple[int, int], ...]:
+        """
+        Medications reachable from a node within `max_depth` hops.
+
+        Args:
+            node: Starting node ID
+            max_depth: Maximum number of hops (1 returns the listed alternatives)
+
+        Returns:
+            Tuple of (node ID, hops) pairs in breadth-first order, excluding the start
+        """
+        key = (node, max_depth)
+        cached = self._reachable.get(key)
+        if cached is not None:
+            return cached
+
+        result = self._traverse([node], max_depth, exclude={node})
+
+        with self._lock:
+            if len(self._reachable) >= REACHABILITY_CACHE_SIZE:
+                self._reachable.clear()
+            self._reachable[key] = result
+        return result
+
+    def reachable_from(self, seeds: Sequence[int], max_depth: int = 1,
+                       exclude: Sequence[int] = ()) -> Tuple[Tuple[int, int], ...]:
+        """
+        Medications within `max_depth` hops, counting the seeds themselves as one hop.
+
+        Used for medications that are not in the graph but list alternatives
+        that are. Results are not cached.
+        """
+        if max_depth < 1:
+            return ()
+        excluded = set(exclude)
+        first = tuple((seed, 1) for seed in seeds if seed not in excluded)
+        rest = self._traverse([seed for seed, _ in first], max_depth - 1,
+                              exclude=excluded | {seed for seed, _ in first})
+        return first + tuple((node, hops + 1) for node, hops in rest)
+
+    def _traverse(self, start: List[int], max_depth: int, exclude: set) -> Tuple[Tuple[int, int], ...]:
+        # Breadth-first, one level at a time: each level's alternatives are gathered from the CSR
+        # arrays in listed order, and the first occurrence of each unseen node joins the next level
+        seen = set(exclude)
+        seen.update(start)
+        frontier = np.array(start, dtype=np.int64)
+        found = []
+        for depth in range(1, max_depth + 1):
+            starts = self.indptr[frontier]
+            lengths = self.indptr[frontier + 1] - starts
+            total = int(lengths.sum())
+            if not total:
+                break
+            positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+            level = []
+            for target in self.indices[positions].tolist():
+                if target not in seen:
+                    seen.add(target)
+                    level.append(target)
+            found.extend((node, depth) for node in level)
+            frontier = np.array(level, dtype=np.int64)
+        return tuple(found)
@@ -0,0 +1,544 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import math
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+import medication_db
+import shared_catalog
+import simple_db
+from async_engine import get_medication_overview
+from bm25 import get_knowledge_index
+from coalesce import get_coalescing_stats
+from insurance import SELF_PAY_PLAN, get_plan_table
+from pdf_generator import generate_pdf
+from pharmacy_locations import DEFAULT_RADIUS_MILES, attach_local_fills, get_pharmacy_locator
+from profiler import get_profiler_stats, with_profiling
+from price_matrix import ANY_PHARMACY, get_price_matrix
+from question_cache import get_answer_cache_stats
+from ranking import resolve_weights
+from recommendation_engine import find_better_tolerated_alternatives, generate_recommendations
+from simple_assistant import SimpleAssistant
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8600
+
+# Threads per server process for catalog, engine and PDF work
+WORKER_THREADS = 8
+
+# Requests larger than this are rejected
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 30
+
+# Deepest alternatives-of-alternatives search a client may ask for
+MAX_ALTERNATIVES_DEPTH = 4
+
+# Request header asking for the request's engine calls to be profiled ("1", or a threshold in ms)
+PROFILE_HEADER = "x-medimatch-profile"
+
+_assistant = SimpleAssistant()
+
+# Profiling threshold requested by the request being handled (None when not profiling)
+_request_profile: contextvars.ContextVar = contextvars.ContextVar("request_profile", default=None)
+
+
+class HTTPError(Exception):
+    """Error returned to the client as a JSON body with the given status."""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Request:
+    """A parsed HTTP request."""
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path.rstrip('/') or '/'
+        self.query = dict(parse_qsl(parts.query))
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Dict:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+        return data
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get('connection', '').lower() != 'close'
+
+
+# A handler returns (status, content type, body)
+Response = Tuple[HTTPStatus, str, bytes]
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+def _clean(value: Any) -> Any:
+    """Convert catalog values (NumPy scalars, NaN) into plain JSON values."""
+    if isinstance(value, dict):
+        return {str(k): _clean(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def json_response(data: Any, status: HTTPStatus = HTTPStatus.OK) -> Response:
+    return status, "application/json", json.dumps(_clean(data)).encode()
+
+
+def _require(data: Dict, field: str) -> str:
+    value = data.get(field)
+    if not value or not str(value).strip():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{field}' is required")
+    return str(value).strip()
+
+
+def _optional_float(data: Dict, field: str) -> Optional[float]:
+    value = data.get(field)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{field}' must be a number")
+
+
+def _catalog_module(name: Optional[str]):
+    if name in (None, "", "full"):
+        return medication_db
+    if name == "simple":
+        return simple_db
+    raise HTTPError(HTTPStatus.BAD_REQUEST, "'catalog' must be 'full' or 'simple'")
+
+
+class MediMatchAPI:
+    """
+    JSON API over the MediMatch catalogs and recommendation engine.
+
+    The event loop only parses requests and writes responses; every call into
+    the catalog, engine, assistant or PDF generator runs on a thread pool.
+    """
+
+    def __init__(self, workers: int = WORKER_THREADS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="medimatch-api")
+        self.started = time.time()
+        self.requests_served = 0
+        self.routes: Dict[Tuple[str, str], Handler] = {
+            ("GET", "/health"): self.health,
+            ("GET", "/api/medication"): self.lookup,
+            ("GET", "/api/search"): self.search,
+            ("GET", "/api/tolerated"): self.tolerated,
+            ("POST", "/api/recommendations"): self.recommendations,
+            ("POST", "/api/alternatives"): self.alternatives,
+            ("POST", "/api/assistant"): self.assistant,
+            ("POST", "/api/overview"): self.overview,
+            ("POST", "/api/pdf"): self.pdf,
+        }
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Run blocking work on the worker pool (profiled when the request asked for it)."""
+        profile = _request_profile.get()
+        if profile is not None:
+            func = with_profiling(func, profile['threshold_ms'])
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def warm(self):
+        """Load the catalogs, price matrix, plan table and knowledge index before taking traffic."""
+        medication_db.get_catalog()
+        simple_db.get_catalog()
+        get_price_matrix()
+        get_plan_table()
+        get_knowledge_index()
+        get_pharmacy_locator()
+
+    async def health(self, request: Request) -> Response:
+        return json_response({
+            'status': 'ok',
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'requests_served': self.requests_served,
+            'coalescing': get_coalescing_stats(),
+            'profiling': get_profiler_stats(),
+            'answer_cache': get_answer_cache_stats(),
+        })
+
+    async def lookup(self, request: Request) -> Response:
+        """GET /api/medication?name=Lipitor[&catalog=simple]"""
+        name = _require(request.query, 'name')
+        db = _catalog_module(request.query.get('catalog'))
+
+        info = await self.run(db.get_medication_info, name)
+        if info is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Medication '{name}' not found")
+        return json_response(info)
+
+    async def search(self, request: Request) -> Response:
+        """GET /api/search?q=statin[&catalog=simple][&limit=20]"""
+        query = _require(request.query, 'q')
+        db = _catalog_module(request.query.get('catalog'))
+        try:
+            limit = int(request.query.get('limit', 20))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'limit' must be an integer")
+
+        def search():
+            return db.get_catalog().full_text_search(query, limit)
+
+        return json_response({'query': query, 'results': await self.run(search)})
+
+    async def tolerated(self, request: Request) -> Response:
+        """GET /api/tolerated?name=Lipitor[&limit=3][&pharmacy=CVS]"""
+        name = _require(request.query, 'name')
+        try:
+            limit = int(request.query.get('limit', 3))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'limit' must be an integer")
+        pharmacy = request.query.get('pharmacy') or ANY_PHARMACY
+
+        results = await self.run(find_better_tolerated_alternatives, name, limit, pharmacy)
+        return json_response({'medication': name, 'alternatives': results})
+
+    def _recommend(self, data: Dict) -> Tuple[str, Optional[float], Callable]:
+        """Validate a recommendation request and return the blocking work to run."""
+        medication = _require(data, 'medication')
+        budget = _optional_float(data, 'budget')
+        top_k = data.get('top_k', 5)
+        if top_k is not None and (not isinstance(top_k, int) or top_k < 0):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'top_k' must be a non-negative integer")
+        weights = data.get('weights')
+        try:
+            resolve_weights(weights)
+        except (TypeError, ValueError, AttributeError) as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid 'weights': {e}")
+        zip_code = data.get('zip')
+        radius_miles = _optional_float(data, 'radius_miles') or DEFAULT_RADIUS_MILES
+
+        def compute():
+            med_info = medication_db.get_medication_info(medication)
+            recommendations = generate_recommendations(
+                medication,
+                budget,
+                data.get('insurance') or "None/Self-pay",
+                data.get('allergies'),
+                data.get('pharmacy') or ANY_PHARMACY,
+                bool(data.get('include_holistic', False)),
+                top_k,
+                weights
+            )
+            if zip_code:
+                recommendations = attach_local_fills(
+                    recommendations, str(zip_code), radius_miles, data.get('pharmacy') or ANY_PHARMACY
+                )
+            return med_info, recommendations
+
+        return medication, budget, compute
+
+    async def recommendations(self, request: Request) -> Response:
+        """POST /api/recommendations {medication, budget, insurance, allergies, pharmacy, include_holistic, top_k, weights, zip, radius_miles}"""
+        medication, _, compute = self._recommend(request.json())
+
+        med_info, recommendations = await self.run(compute)
+        if med_info is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Medication '{medication}' not found")
+        return json_response({'medication': med_info, 'recommendations': recommendations})
+
+    async def alternatives(self, request: Request) -> Response:
+        """POST /api/alternatives {medication, budget, insurance, restrictions, max_depth} (simplified catalog)"""
+        data = request.json()
+        medication = _require(data, 'medication')
+        budget = _optional_float(data, 'budget')
+        max_depth = data.get('max_depth', 1)
+        if not isinstance(max_depth, int) or isinstance(max_depth, bool) or not 1 <= max_depth <= MAX_ALTERNATIVES_DEPTH:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'max_depth' must be an integer from 1 to {MAX_ALTERNATIVES_DEPTH}")
+
+        def compute():
+            med_info = simple_db.get_medication_info(medication)
+            if med_info is None:
+                return None, []
+            return med_info, simple_db.find_alternatives(
+                med_info, budget, data.get('insurance') or SELF_PAY_PLAN, data.get('restrictions'), max_depth
+            )
+
+        med_info, alternatives = await self.run(compute)
+        if med_info is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Medication '{medication}' not found")
+        return json_response({'medication': med_info, 'alternatives': alternatives})
+
+    async def assistant(self, request: Request) -> Response:
+        """POST /api/assistant {question, medication, alternative}"""
+        data = request.json()
+        question = _require(data, 'question')
+
+        def answer():
+            med_info = simple_db.get_medication_info(data['medication']) if data.get('medication') else None
+            alt_info = None
+            if med_info and data.get('alternative'):
+                wanted = str(data['alternative']).lower()
+                for alt in simple_db.find_alternatives(med_info, None, data.get('insurance') or SELF_PAY_PLAN):
+                    if alt['name'].lower() == wanted or str(alt['generic_name']).lower() == wanted:
+                        alt_info = alt
+                        break
+            return _assistant.answer_question(question, med_info, alt_info)
+
+        return json_response({'question': question, 'answer': await self.run(answer)})
+
+    async def overview(self, request: Request) -> Response:
+        """POST /api/overview {medication, budget, insurance, allergies, pharmacy, include_holistic, question}"""
+        data = request.json()
+        medication = _require(data, 'medication')
+        budget = _optional_float(data, 'budget')
+
+        # Every data source runs concurrently on the worker pool, each under its own timeout
+        overview = await get_medication_overview(
+            medication,
+            budget,
+            data.get('insurance') or SELF_PAY_PLAN,
+            data.get('allergies'),
+            data.get('pharmacy') or ANY_PHARMACY,
+            bool(data.get('include_holistic', False)),
+            data.get('question'),
+            executor=self.executor
+        )
+        if overview['info'] is None and not overview['alternatives']:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Medication '{medication}' not found")
+        return json_response(overview)
+
+    async def pdf(self, request: Request) -> Response:
+        """POST /api/pdf {medication, budget, insurance, allergies, pharmacy} -> application/pdf"""
+        data = request.json()
+        medication, budget, compute = self._recommend(data)
+
+        def render():
+            med_info, recommendations = compute()
+            if med_info is None:
+                return None
+            buffer = generate_pdf(medication, med_info, recommendations, data.get('insurance') or "None/Self-pay", budget)
+            return buffer.getvalue()
+
+        pdf = await self.run(render)
+        if pdf is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Medication '{medication}' not found")
+        return HTTPStatus.OK, "application/pdf", pdf
+
+    async def dispatch(self, request: Request) -> Response:
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{request.method} not allowed on {request.path}")
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No endpoint at {request.path}")
+
+        profile = request.headers.get(PROFILE_HEADER) or request.query.get('profile')
+        if profile:
+            try:
+                # "1"/"true" use the configured threshold; a number sets it for this request
+                threshold_ms = None if profile.lower() in ("1", "true", "yes") else float(profile)
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Profile must be 1 or a threshold in milliseconds")
+            _request_profile.set({'threshold_ms': threshold_ms})
+        else:
+            _request_profile.set(None)
+        return await handler(request)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve HTTP/1.1 requests on one keep-alive connection."""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HTTPError as e:
+                    _write_response(writer, *json_response({'error': e.message}, e.status), keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                try:
+                    status, content_type, body = await self.dispatch(request)
+                except HTTPError as e:
+                    status, content_type, body = json_response({'error': e.message}, e.status)
+                except Exception as e:
+                    print(f"Error handling {request.method} {request.path}: {e}")
+                    status, content_type, body = json_response({'error': "Internal server error"},
+                                                               HTTPStatus.INTERNAL_SERVER_ERROR)
+
+                self.requests_served += 1
+                _write_response(writer, status, content_type, body, request.keep_alive)
+                await writer.drain()
+
+                if not request.keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """Read one request from the connection, or None when the client closed it."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+    except asyncio.LimitOverrunError:
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Request headers too large")
+
+    lines = head.decode('latin-1').split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', 'identity').lower() != 'identity':
+        raise HTTPError(HTTPStatus.NOT_IMPLEMENTED, "Transfer-Encoding is not supported; send Content-Length")
+
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+
+    return Request(method.upper(), target, headers, body)
+
+
+def _write_response(writer: asyncio.StreamWriter, status: HTTPStatus, content_type: str, body: bytes,
+                    keep_alive: bool = True):
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    writer.write(head.encode('latin-1') + body)
+
+
+def _listen_socket(host: str, port: int, reuse_port: bool) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port and hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return sock
+
+
+async def serve_forever(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = WORKER_THREADS,
+                        reuse_port: bool = False):
+    """Run one server process until cancelled."""
+    api = MediMatchAPI(workers)
+    await api.run(api.warm)
+
+    server = await asyncio.start_server(
+        api.handle_connection,
+        sock=_listen_socket(host, port, reuse_port),
+        limit=MAX_HEADER_BYTES
+    )
+    print(f"MediMatch API (pid {os.getpid()}) listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def _run_process(host: str, port: int, workers: int, reuse_port: bool):
+    try:
+        asyncio.run(serve_forever(host, port, workers, reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, processes: int = 1, workers: int = WORKER_THREADS,
+         share_catalog: bool = True):
+    """
+    Start the API server.
+
+    With more than one process, each process runs its own event loop and
+    worker pool on a shared port (SO_REUSEPORT), so throughput scales with
+    the number of cores instead of being capped by one interpreter. The
+    catalogs are then published once as shared catalogs that every process
+    attaches, so memory does not grow with the process count.
+
+    Args:
+        host: Interface to bind
+        port: Port to listen on
+        processes: Number of server processes
+        workers: Worker threads per process
+        share_catalog: Share one catalog copy between the server processes
+    """
+    if processes <= 1 or not hasattr(socket, "SO_REUSEPORT"):
+        _run_process(host, port, workers, False)
+        return
+
+    import multiprocessing
+
+    if share_catalog:
+        os.environ.setdefault(shared_catalog.SHARED_CATALOG_ENV, "1")
+        # Publish before starting the workers so they only attach
+        medication_db.get_catalog()
+        simple_db.get_catalog()
+
+    children = [
+        multiprocessing.Process(target=_run_process, args=(host, port, workers, True), daemon=True)
+        for _ in range(processes)
+    ]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the MediMatch AI JSON API.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to bind")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="Server processes sharing the port (one per core by default)")
+    parser.add_argument("--workers", type=int, default=WORKER_THREADS, help="Worker threads per process")
+    parser.add_argument("--private-catalogs", action="store_true",
+                        help="Give each process its own catalog copy instead of a shared one")
+    args = parser.parse_args()
+
+    main(args.host, args.port, args.processes, args.workers, not args.private_catalogs)
@@ -1,11 +1,16 @@
 import streamlit as st
-import pandas as pd
 import os
-from medication_db import get_medication_info, get_medication_by_class, search_medications
-from recommendation_engine import generate_recommendations, explain_medication
+from medication_db import get_medication_info, get_medication_by_class, search_medications, get_catalog_version
+from recommendation_engine import get_results_pages, get_results_view, make_results_query, explain_medication
+from session_store import measure_session_state
 from pdf_generator import generate_pdf
+from price_history import DEFAULT_WINDOW_DAYS, describe_price_summary
+from pharmacy_locations import DEFAULT_RADIUS_MILES, MAX_RADIUS_MILES, describe_local_fill, find_local_fills
 from utils import display_educational_content, display_resources
 
+# Recommendations included in the PDF report (the page itself can show them all)
+PDF_RECOMMENDATIONS = 5
+
 # Set page configuration
 st.set_page_config(
     page_title="MediMatch AI - Smarter Medication Options",
@@ -14,8 +19,11 @@ st.set_page_config(
 )
 
 # Initialize session state variables if they don't exist
-if 'recommendations' not in st.session_state:
-    st.session_state.recommendations = None
+# Sessions keep only the query; results are resolved from the cache shared by all sessions
+if 'results_query' not in st.session_state:
+    st.session_state.results_query = None
+if 'pages_shown' not in st.session_state:
+    st.session_state.pages_shown = {}
 if 'original_medication' not in st.session_state:
     st.session_state.original_medication = None
 if 'budget' not in st.session_state:
@@ -26,15 +34,22 @@ if 'allergies' not in st.session_state:
     st.session_state.allergies = None
 if 'pharmacy' not in st.session_state:
     st.session_state.pharmacy = None
+if 'zip_code' not in st.session_state:
+    st.session_state.zip_code = None
+if 'radius_miles' not in st.session_state:
+    st.session_state.radius_miles = DEFAULT_RADIUS_MILES
 
 # Function to reset the application state
 def reset_app():
-    st.session_state.recommendations = None
+    st.session_state.results_query = None
+    st.session_state.pages_shown = {}
     st.session_state.original_medication = None
     st.session_state.budget = None
     st.session_state.insurance = None
     st.session_state.allergies = None
     st.session_state.pharmacy = None
+    st.session_state.zip_code = None
+    st.session_state.radius_miles = DEFAULT_RADIUS_MILES
     st.rerun()
 
 # Main app header
@@ -63,11 +78,15 @@ with st.sidebar:
     
     if st.button("Start Over"):
         reset_app()
+    
+    with st.expander("Session diagnostics"):
+        session_memory = measure_session_state(st.session_state)
+        st.caption(f"Session state: {session_memory['total_bytes'] / 1024:.1f} KB")
 
 # Main content based on selected page
 if page == "Home":
     # Check if recommendations already exist
-    if st.session_state.recommendations is None:
+    if st.session_state.results_query is None:
         # Input form
         st.header("Enter Your Prescription Details")
         
@@ -89,6 +108,8 @@ if page == "Home":
                 ["Any", "CVS", "Walgreens", "Walmart", "Rite Aid", "Costco", "Sam's Club", "Local/Independent"],
                 help="Optional: Select your preferred pharmacy for local results"
             )
+            zip_code = st.text_input("ZIP Code", max_chars=10, help="Optional: Find the cheapest pharmacy near you")
+            radius_miles = st.slider("Search Radius (miles)", 1.0, MAX_RADIUS_MILES, DEFAULT_RADIUS_MILES, step=1.0)
             holistic = st.checkbox("I'm interested in supplements or lifestyle alternatives", help="Check this to see evidence-based complementary options")
         
         submit = st.button("Find Alternatives", type="primary")
@@ -103,6 +124,8 @@ if page == "Home":
                 st.session_state.insurance = insurance
                 st.session_state.allergies = allergies
                 st.session_state.pharmacy = pharmacy
+                st.session_state.zip_code = zip_code.strip() or None
+                st.session_state.radius_miles = radius_miles
                 
                 # Check if medication exists in our database
                 med_info = get_medication_info(medication)
@@ -112,28 +135,39 @@ if page == "Home":
                 else:
                     # Show loading indicator while generating recommendations
                     with st.spinner("Analyzing alternatives and generating recommendations..."):
-                        # Generate recommendations based on inputs
-                        recommendations = generate_recommendations(
+                        # Generate recommendations and everything the results page shows, once per search
+                        results_query = make_results_query(
                             medication,
                             budget,
                             insurance,
                             allergies,
                             pharmacy,
-                            holistic
+                            holistic,
+                            top_k=None  # Every option is kept; the results are shown a page at a time
                         )
                         
-                        if recommendations:
-                            st.session_state.recommendations = recommendations
+                        if get_results_view(results_query):
+                            st.session_state.results_query = results_query
+                            st.session_state.pages_shown = {}
                             st.rerun()
                         else:
                             st.error("We couldn't generate recommendations for this medication. Please try again or contact support.")
     
     else:
-        # Display recommendations
+        # Display recommendations from the precomputed results view
+        view = get_results_view(st.session_state.results_query)
+        
+        if view is None:
+            st.error("We couldn't generate recommendations for this medication. Please try again or contact support.")
+            st.stop()
+        
+        if st.session_state.results_query['catalog_version'] != get_catalog_version():
+            st.caption("Prices have been updated since your search; the results below use the latest prices.")
+        
         st.header(f"Medication Alternatives for {st.session_state.original_medication}")
         
         # Original medication information
-        med_info = get_medication_info(st.session_state.original_medication)
+        med_info = view['original']
         
         with st.expander("About Your Prescribed Medication", expanded=True):
             col1, col2 = st.columns([2, 1])
@@ -161,138 +195,98 @@ if page == "Home":
         # Recommended alternatives
         st.markdown("## Recommended Alternatives")
         
-        # Create tabs for different categories of recommendations
-        tabs = st.tabs(["All Options", "Generics", "Affordability", "Alternative Treatments"])
+        # Only the selected tab is rendered, so reruns cost the same however many results there are
+        tab_labels = {tab['key']: tab['label'] for tab in view['tabs']}
+        active_key = st.radio(
+            "Show",
+            list(tab_labels),
+            format_func=tab_labels.get,
+            horizontal=True,
+            label_visibility="collapsed",
+            key="results_tab"
+        )
+        active_tab = next(tab for tab in view['tabs'] if tab['key'] == active_key)
         
-        with tabs[0]:
-            for i, rec in enumerate(st.session_state.recommendations):
-                with st.container():
-                    st.markdown(f"### {i+1}. {rec['name']} - {rec['recommendation_type']}")
+        if not active_tab['items']:
+            st.info(active_tab['empty_message'])
+        
+        # Cards are built a page at a time; "Load more" shows the next page, which is prepared in the background
+        pages = get_results_pages(view, active_key).pages(st.session_state.pages_shown.get(active_key, 1))
+        cards = [card for page in pages for card in page['cards']]
+        
+        # Cheapest in-stock store near the patient for every card shown, in one radius query
+        local_fills = None
+        if st.session_state.zip_code and active_key != 'treatments':
+            local_fills = find_local_fills(
+                [card['recommendation']['name'] for card in cards],
+                st.session_state.zip_code,
+                st.session_state.radius_miles,
+                st.session_state.pharmacy
+            )
+            if local_fills is None:
+                st.caption(f"We don't have pharmacy locations for ZIP code {st.session_state.zip_code}.")
+        
+        for i, card in enumerate(cards):
+            rec = card['recommendation']
+            with st.container():
+                if active_key == 'treatments':
+                    st.markdown(f"### {i+1}. {rec['name']}")
                     
-                    col1, col2 = st.columns([3, 1])
+                    st.markdown(f"**Type:** {rec.get('type', 'Supplement/Lifestyle')}")
+                    st.markdown(f"**Average Monthly Cost:** ${rec['avg_cost']:.2f}")
+                    if rec.get('patient_cost', rec['avg_cost']) < rec['avg_cost']:
+                        st.markdown(f"**Your Cost With {st.session_state.insurance}:** ${rec['patient_cost']:.2f}")
                     
-                    with col1:
-                        st.markdown(f"**Average Monthly Cost:** ${rec['avg_cost']:.2f}")
-                        if 'savings' in rec:
-                            st.markdown(f"**Potential Savings:** ${rec['savings']:.2f}/month")
-                        
-                        st.markdown(f"**Why We Recommend This:**")
-                        st.markdown(rec['explanation'])
-                        
-                        if 'availability' in rec:
-                            st.markdown(f"**Availability:** {rec['availability']}")
-                        
-                        st.markdown(f"**Side Effects:** {rec['side_effects']}")
-                        st.markdown(f"**Source:** {rec['source']}")
+                    st.markdown(f"**Evidence-Based Benefits:**")
+                    st.markdown(rec['explanation'])
                     
-                    with col2:
-                        st.markdown("### Cost Comparison")
-                        # Create a simple bar chart for cost comparison
-                        data = {
-                            'Medication': [med_info['name'], rec['name']],
-                            'Monthly Cost': [med_info['avg_cost'], rec['avg_cost']]
-                        }
-                        chart_data = pd.DataFrame(data)
-                        st.bar_chart(chart_data.set_index('Medication'))
+                    st.markdown(f"**Important Note:** {rec.get('warning', 'Always consult with your healthcare provider before making any changes to your treatment plan.')}")
+                    st.markdown(f"**Source:** {rec['source']}")
                     
                     st.markdown("---")
+                    continue
+                
+                if active_key == 'all':
+                    st.markdown(f"### {i+1}. {rec['name']} - {rec['recommendation_type']}")
+                else:
+                    st.markdown(f"### {i+1}. {rec['name']}")
+                
+                col1, col2 = st.columns([3, 1])
+                
+                with col1:
+                    st.markdown(f"**Average Monthly Cost:** ${rec['avg_cost']:.2f}")
+                    if rec.get('patient_cost', rec['avg_cost']) < rec['avg_cost']:
+                        st.markdown(f"**Your Cost With {st.session_state.insurance}:** ${rec['patient_cost']:.2f}")
+                    if 'savings' in rec:
+                        st.markdown(f"**Potential Savings:** ${rec['savings']:.2f}/month")
+                    
+                    st.markdown(f"**Why We Recommend This:**")
+                    st.markdown(rec['explanation'])
+                    
+                    if 'availability' in rec and active_key != 'generics':
+                        st.markdown(f"**Availability:** {rec['availability']}")
+                    if local_fills is not None:
+                        st.markdown(f"**Nearest Cheapest Fill:** "
+                                    f"{describe_local_fill(local_fills.get(rec['name']), st.session_state.radius_miles)}")
+                    
+                    st.markdown(f"**Side Effects:** {rec['side_effects']}")
+                    st.markdown(f"**Source:** {rec['source']}")
+                
+                with col2:
+                    st.markdown("### Cost Comparison")
+                    st.bar_chart(card['cost_chart'])
+                    if card['price_trend'] is not None:
+                        st.markdown(f"**{DEFAULT_WINDOW_DAYS}-Day Price Trend**")
+                        st.line_chart(card['price_trend'])
+                        st.caption(describe_price_summary(card['price_summary']))
+                
+                st.markdown("---")
         
-        with tabs[1]:
-            # Filter to show only generic alternatives
-            generics = [rec for rec in st.session_state.recommendations if rec['recommendation_type'] == "Generic version available"]
-            
-            if generics:
-                for i, rec in enumerate(generics):
-                    with st.container():
-                        st.markdown(f"### {i+1}. {rec['name']}")
-                        
-                        col1, col2 = st.columns([3, 1])
-                        
-                        with col1:
-                            st.markdown(f"**Average Monthly Cost:** ${rec['avg_cost']:.2f}")
-                            if 'savings' in rec:
-                                st.markdown(f"**Potential Savings:** ${rec['savings']:.2f}/month")
-                            
-                            st.markdown(f"**Why We Recommend This:**")
-                            st.markdown(rec['explanation'])
-                            
-                            st.markdown(f"**Side Effects:** {rec['side_effects']}")
-                            st.markdown(f"**Source:** {rec['source']}")
-                        
-                        with col2:
-                            st.markdown("### Cost Comparison")
-                            # Create a simple bar chart for cost comparison
-                            data = {
-                                'Medication': [med_info['name'], rec['name']],
-                                'Monthly Cost': [med_info['avg_cost'], rec['avg_cost']]
-                            }
-                            chart_data = pd.DataFrame(data)
-                            st.bar_chart(chart_data.set_index('Medication'))
-                        
-                        st.markdown("---")
-            else:
-                st.info("No generic alternatives found for this medication.")
-        
-        with tabs[2]:
-            # Filter to show only affordability options
-            affordability = [rec for rec in st.session_state.recommendations if rec['recommendation_type'] == "Cheapest with similar effect"]
-            
-            if affordability:
-                for i, rec in enumerate(affordability):
-                    with st.container():
-                        st.markdown(f"### {i+1}. {rec['name']}")
-                        
-                        col1, col2 = st.columns([3, 1])
-                        
-                        with col1:
-                            st.markdown(f"**Average Monthly Cost:** ${rec['avg_cost']:.2f}")
-                            if 'savings' in rec:
-                                st.markdown(f"**Potential Savings:** ${rec['savings']:.2f}/month")
-                            
-                            st.markdown(f"**Why We Recommend This:**")
-                            st.markdown(rec['explanation'])
-                            
-                            if 'availability' in rec:
-                                st.markdown(f"**Availability:** {rec['availability']}")
-                            
-                            st.markdown(f"**Side Effects:** {rec['side_effects']}")
-                            st.markdown(f"**Source:** {rec['source']}")
-                        
-                        with col2:
-                            st.markdown("### Cost Comparison")
-                            # Create a simple bar chart for cost comparison
-                            data = {
-                                'Medication': [med_info['name'], rec['name']],
-                                'Monthly Cost': [med_info['avg_cost'], rec['avg_cost']]
-                            }
-                            chart_data = pd.DataFrame(data)
-                            st.bar_chart(chart_data.set_index('Medication'))
-                        
-                        st.markdown("---")
-            else:
-                st.info("No affordability alternatives found for this medication.")
-        
-        with tabs[3]:
-            # Filter to show only alternative treatments
-            alternatives = [rec for rec in st.session_state.recommendations if rec['recommendation_type'] == "Alternative treatment"]
-            
-            if alternatives:
-                for i, rec in enumerate(alternatives):
-                    with st.container():
-                        st.markdown(f"### {i+1}. {rec['name']}")
-                        
-                        st.markdown(f"**Type:** {rec.get('type', 'Supplement/Lifestyle')}")
-                        st.markdown(f"**Average Monthly Cost:** ${rec['avg_cost']:.2f}")
-                        
-                        st.markdown(f"**Evidence-Based Benefits:**")
-                        st.markdown(rec['explanation'])
-                        
-                        st.markdown(f"**Important Note:** {rec.get('warning', 'Always consult with your healthcare provider before making any changes to your treatment plan.')}")
-                        st.markdown(f"**Source:** {rec['source']}")
-                        
-                        st.markdown("---")
-            else:
-                st.info("No alternative treatments found for this medication.")
+        if pages and pages[-1]['next_cursor'] is not None:
+            remaining = pages[-1]['total'] - len(cards)
+            if st.button(f"Load more ({remaining} more)", key=f"load_more_{active_key}"):
+                st.session_state.pages_shown[active_key] = len(pages) + 1
+                st.rerun()
         
         # Action buttons
         st.markdown("## Next Steps")
@@ -305,7 +299,7 @@ if page == "Home":
                 pdf_file = generate_pdf(
                     st.session_state.original_medication,
                     med_info,
-                    st.session_state.recommendations,
+                    view['recommendations'][:PDF_RECOMMENDATIONS],
                     st.session_state.insurance,
                     st.session_state.budget
                 )
@@ -388,7 +382,7 @@ if page == "Home":
             
             I've researched some potential alternatives and would like to discuss if any of these options might be appropriate for my condition:
             
-            {', '.join([rec['name'] for rec in st.session_state.recommendations[:3]])}
+            {', '.join([rec['name'] for rec in view['recommendations'][:3]])}
             
             I understand that my health is the priority, and I'm not requesting any changes that would compromise my treatment. I'm simply hoping to explore options that might be more financially sustainable for me long-term.
             
@@ -6,9 +6,15 @@ from simple_db import (
     get_supplement_suggestions, 
     get_insurance_description,
     get_medication_risks,
-    get_do_not_combine
+    get_do_not_combine,
+    get_catalog_version
 )
 from simple_assistant import SimpleAssistant
+from insurance import SELF_PAY_PLAN, describe_patient_cost
+from pagination import PagedResults
+from coalesce import make_key
+from session_store import get_shared_results, measure_session_state
+from question_cache import get_answer_cache_stats
 
 # Initialize the simple assistant
 assistant = SimpleAssistant()
@@ -21,16 +27,13 @@ st.set_page_config(
 )
 
 # Initialize session state
-if 'medication_info' not in st.session_state:
-    st.session_state.medication_info = None
-if 'alternative_info' not in st.session_state:
-    st.session_state.alternative_info = None
-if 'supplements' not in st.session_state:
-    st.session_state.supplements = []
+# Sessions keep only the search query; results are resolved from the cache shared by all sessions
+if 'search_query' not in st.session_state:
+    st.session_state.search_query = None
+if 'alternative_pages_shown' not in st.session_state:
+    st.session_state.alternative_pages_shown = 1
 if 'user_question' not in st.session_state:
     st.session_state.user_question = ""
-if 'assistant_response' not in st.session_state:
-    st.session_state.assistant_response = ""
 if 'selected_alternative' not in st.session_state:
     st.session_state.selected_alternative = 0
 if 'original_medication' not in st.session_state:
@@ -38,31 +41,73 @@ if 'original_medication' not in st.session_state:
 
 # Function to reset the application
 def reset_app():
-    st.session_state.medication_info = None
-    st.session_state.alternative_info = None
-    st.session_state.supplements = []
+    st.session_state.search_query = None
+    st.session_state.alternative_pages_shown = 1
     st.session_state.user_question = ""
-    st.session_state.assistant_response = ""
     st.session_state.selected_alternative = 0
     st.session_state.original_medication = ""
     st.rerun()
 
-# Function to set question and get response
-def ask_question(question):
-    st.session_state.user_question = question
+# Function to build the explanation and cost chart of one alternative card
+def build_alternative_pages(med_info, alternatives):
+    # Runs ahead on the prefetch thread too, so it only uses its arguments (never session state)
+    def materialize(index):
+        alt = alternatives[index]
+        return {
+            'alternative': alt,
+            'explanation': assistant.explain_recommendation(med_info, alt),
+            'chart_data': pd.DataFrame(
+                {'Cost (USD)': [med_info['Avg Cost (USD)'], alt['avg_cost']]},
+                index=pd.Index([med_info['Medication Name'], alt['name']], name='Medication')
+            )
+        }
+
+    return PagedResults(range(len(alternatives)), materialize)
+
+# Function to resolve a search query to its results (shared by every session with the same search)
+def get_search_results(query):
+    if query is None:
+        return None
+
+    def build():
+        med_info = get_medication_info(query['medication'])
+        if med_info is None:
+            return None
+        alternatives = find_alternatives(med_info, query['budget'], query['insurance'], query['allergies'])
+        return {
+            'medication_info': med_info,
+            'alternatives': alternatives,
+            'pages': build_alternative_pages(med_info, alternatives),
+            'supplements': get_supplement_suggestions(med_info) if query['include_supplements'] else []
+        }
+
+    params = {key: value for key, value in query.items() if key != 'catalog_version'}
+    return get_shared_results(make_key('simple_search', params, get_catalog_version()), build)
+
+# Function to get the assistant's response to the session's question
+def get_assistant_response(results, question):
+    if not results or not question:
+        return ""
 
     # Get the selected alternative for context
     alternative = None
-    if st.session_state.alternative_info and len(st.session_state.alternative_info) > st.session_state.selected_alternative:
-        alternative = st.session_state.alternative_info[st.session_state.selected_alternative]
-
-    st.session_state.assistant_response = assistant.answer_question(
-        question, 
-        st.session_state.medication_info, 
-        alternative
-    )
+    if len(results['alternatives']) > st.session_state.selected_alternative:
+        alternative = results['alternatives'][st.session_state.selected_alternative]
+
+    # Answers are cached for all sessions by the assistant (see question_cache)
+    return assistant.answer_question(question, results['medication_info'], alternative)
+
+# Function to set question and get response
+def ask_question(question):
+    st.session_state.user_question = question
     st.rerun()
 
+# Results for this session's search, if any
+results = get_search_results(st.session_state.search_query)
+if st.session_state.search_query is not None and results is None:
+    # The medication is no longer in the catalog
+    st.session_state.search_query = None
+
 # Main app header with styled title and subheader
 st.markdown("<h1 style='text-align: center; color: #2C8ECF;'>💊 MediMatch AI</h1>", unsafe_allow_html=True)
 st.markdown("<h3 style='text-align: center; margin-bottom: 20px;'>Find Affordable Medication Alternatives</h3>", unsafe_allow_html=True)
@@ -82,7 +127,7 @@ with st.sidebar:
     st.markdown("<h2 style='text-align: center; color: white;'>💬 Medication Assistant</h2>", unsafe_allow_html=True)
     st.markdown("<div style='margin-bottom: 20px;'></div>", unsafe_allow_html=True)
 
-    if st.session_state.medication_info is not None:
+    if results is not None:
         st.markdown("### Ask me about your medications")
 
         user_question = st.text_input("Type your question here:", key="user_question_input")
@@ -127,12 +172,13 @@ with st.sidebar:
             if user_question:
                 ask_question(user_question)
 
-        if st.session_state.user_question and st.session_state.assistant_response:
+        assistant_response = get_assistant_response(results, st.session_state.user_question)
+        if st.session_state.user_question and assistant_response:
             st.markdown("<div style='background-color: rgba(255, 255, 255, 0.1); padding: 10px; border-radius: 5px; margin-top: 20px;'>", unsafe_allow_html=True)
             st.markdown("<h3 style='font-size: 18px; margin-bottom: 5px;'>Your Question</h3>", unsafe_allow_html=True)
             st.markdown(f"<p style='color: white;'><strong>Q:</strong> {st.session_state.user_question}</p>", unsafe_allow_html=True)
             st.markdown("<h3 style='font-size: 18px; margin-bottom: 5px; margin-top: 15px;'>Response</h3>", unsafe_allow_html=True)
-            st.markdown(f"<p style='color: white;'><strong>A:</strong> {st.session_state.assistant_response}</p>", unsafe_allow_html=True)
+            st.markdown(f"<p style='color: white;'><strong>A:</strong> {assistant_response}</p>", unsafe_allow_html=True)
             st.markdown("</div>", unsafe_allow_html=True)
     else:
         st.markdown("Enter your medication details to get started with personalized assistance.")
@@ -142,8 +188,17 @@ with st.sidebar:
     if st.button("Start Over"):
         reset_app()
 
+    with st.expander("Session diagnostics"):
+        session_memory = measure_session_state(st.session_state)
+        st.caption(f"Session state: {session_memory['total_bytes'] / 1024:.1f} KB")
+        answer_cache = get_answer_cache_stats()
+        st.caption(
+            f"Shared answers: {answer_cache['entries']} cached, "
+            f"{answer_cache['hit_rate']:.0%} hit rate"
+        )
+
 # Check if recommendations already exist
-if st.session_state.medication_info is None:
+if results is None:
     # Input form
     st.header("Enter Your Prescription Details")
 
@@ -180,31 +235,25 @@ if st.session_state.medication_info is None:
             if med_info is None:
                 st.error(f"We couldn't find '{medication}' in our database. Please check the spelling or try a different medication.")
             else:
-                # Save medication info and user selections to session state
-                st.session_state.medication_info = med_info
+                # Save the search (not its results) and user selections to session state
                 st.session_state.insurance = insurance
                 st.session_state.budget = budget
                 st.session_state.allergies = allergies
                 st.session_state.original_medication = medication #Added this line
-
-                # Find alternatives based on criteria
-                alternatives = find_alternatives(
-                    med_info,
-                    budget,
-                    insurance,
-                    allergies
-                )
-
-                st.session_state.alternative_info = alternatives
-
-                # Get supplement suggestions if requested
-                if include_supplements:
-                    st.session_state.supplements = get_supplement_suggestions(med_info)
+                st.session_state.search_query = {
+                    'medication': med_info['Medication Name'],
+                    'budget': budget,
+                    'insurance': insurance,
+                    'allergies': allergies,
+                    'include_supplements': include_supplements,
+                    'catalog_version': get_catalog_version()
+                }
+                st.session_state.alternative_pages_shown = 1
 
                 st.rerun()
 else:
     # Display medication information and alternatives
-    st.header(f"Medication Information: {st.session_state.medication_info['Medication Name']}")
+    st.header(f"Medication Information: {results['medication_info']['Medication Name']}")
 
     # Create a visually separated card for the prescribed medication
     st.markdown("""<div style="border: 1px solid rgba(44, 142, 207, 0.3); 
@@ -218,27 +267,19 @@ else:
 
     with col1:
         st.markdown("<h3 style='font-size: 20px;'>Your Prescribed Medication</h3>", unsafe_allow_html=True)
-        med_info = st.session_state.medication_info
+        med_info = results['medication_info']
 
         st.markdown(f"**Name:** {med_info['Medication Name']} ({med_info['Generic Name']})")
         st.markdown(f"**Class:** {med_info['Type/Class']}")
         st.markdown(f"**Average Monthly Cost:** ${med_info['Avg Cost (USD)']}")
 
-        # Display detailed insurance coverage information with savings estimates
-        insurance_level = med_info['Insurance Coverage']
-
-        if insurance_level == "Most":
-            savings_min = max(5, int(med_info['Avg Cost (USD)'] * 0.4))
-            savings_max = max(10, int(med_info['Avg Cost (USD)'] * 0.7))
-            st.markdown(f"**Insurance Coverage:** Most plans cover this medication. You may save **${savings_min}–${savings_max}** per month with insurance.")
-        elif insurance_level == "Some":
-            savings_min = max(3, int(med_info['Avg Cost (USD)'] * 0.2))
-            savings_max = max(6, int(med_info['Avg Cost (USD)'] * 0.4))
-            st.markdown(f"**Insurance Coverage:** Some plans offer partial coverage. Estimated savings: **${savings_min}–${savings_max}** monthly.")
-        elif insurance_level == "Limited":
-            st.markdown("**Insurance Coverage:** Only a few plans cover this drug. Savings may be small or none.")
-        else:
-            st.markdown("**Insurance Coverage:** This medication is not covered. Expect to pay the full price out of pocket.")
+        # Display insurance coverage with the out-of-pocket cost under the user's plan
+        st.markdown(describe_patient_cost(
+            med_info['Avg Cost (USD)'],
+            med_info['Insurance Coverage'],
+            st.session_state.get('insurance', SELF_PAY_PLAN),
+            med_info['Medication Name']
+        ))
 
         # Add spacing before warnings
         st.markdown("<div style='margin-top: 15px;'></div>", unsafe_allow_html=True)
@@ -296,8 +337,13 @@ else:
     # Display alternatives if any
     st.header("Recommended Alternatives")
 
-    if st.session_state.alternative_info:
-        for alt in st.session_state.alternative_info:
+    if results['alternatives']:
+        # Cards are built a page at a time; the next page is prepared in the background
+        pages = results['pages'].pages(st.session_state.alternative_pages_shown)
+        cards = [card for page in pages for card in page['cards']]
+
+        for card in cards:
+            alt = card['alternative']
             # Create a visually separated card with a light border
             st.markdown("""<div style="border: 1px solid rgba(44, 142, 207, 0.2); 
                                        border-radius: 10px; 
@@ -311,12 +357,8 @@ else:
             col1, col2 = st.columns([3, 1])
 
             with col1:
-                # Get an explanation from the assistant
-                explanation = assistant.explain_recommendation(
-                    st.session_state.medication_info, 
-                    alt
-                )
-                st.write(explanation)
+                # Explanation from the assistant
+                st.write(card['explanation'])
 
 
 
@@ -353,15 +395,8 @@ else:
                 original_cost = med_info['Avg Cost (USD)']
                 alt_cost = alt['avg_cost']
 
-                # Create data frame with better labels
-                data = {
-                    'Medication': [med_info['Medication Name'], alt['name']],
-                    'Cost (USD)': [original_cost, alt_cost]
-                }
-                chart_data = pd.DataFrame(data)
-
                 # Create custom bar chart with better formatting
-                chart = st.bar_chart(chart_data.set_index('Medication'), use_container_width=True)
+                chart = st.bar_chart(card['chart_data'], use_container_width=True)
 
                 # Display cost values directly and calculate savings
                 st.markdown(f"""
@@ -377,11 +412,17 @@ else:
 
             # Close the container div
             st.markdown("</div>", unsafe_allow_html=True)
+
+        if pages[-1]['next_cursor'] is not None:
+            remaining = pages[-1]['total'] - len(cards)
+            if st.button(f"Load more alternatives ({remaining} more)"):
+                st.session_state.alternative_pages_shown = len(pages) + 1
+                st.rerun()
     else:
         st.info("No suitable alternatives found based on your criteria.")
 
     # Display supplement suggestions if any
-    if st.session_state.supplements:
+    if results['supplements']:
         st.header("Supplement & Lifestyle Suggestions")
 
         # Create a container for all supplements
@@ -392,7 +433,7 @@ else:
                                    background-color: rgba(44, 142, 207, 0.03);">""", 
                    unsafe_allow_html=True)
 
-        for i, supplement in enumerate(st.session_state.supplements):
+        for i, supplement in enumerate(results['supplements']):
             # Create a container for each supplement to improve spacing
             with st.container():
                 st.markdown(f"<h4 style='color: #2C8ECF; margin-bottom: 10px;'>{supplement}</h4>", unsafe_allow_html=True)
@@ -407,7 +448,7 @@ else:
                 st.markdown("<p style='font-style: italic; color: rgba(255, 255, 255, 0.7);'>Note: Supplements are not FDA-approved to treat medical conditions.</p>", unsafe_allow_html=True)
 
                 # Add a separator if it's not the last item
-                if i < len(st.session_state.supplements) - 1:
+                if i < len(results['supplements']) - 1:
                     st.markdown("<hr style='margin: 15px 0; opacity: 0.2;'>", unsafe_allow_html=True)
 
         # Close the container div
@@ -0,0 +1,245 @@
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import simple_db
+from compiled_catalog import CompiledCatalog
+
+# Intents, in the order SimpleAssistant checks them
+DIFFERENCE = "difference"
+SAVINGS = "savings"
+WITHOUT_INSURANCE = "without_insurance"
+TREATS = "treats"
+SUPPLEMENTS_HELPFUL = "supplements_helpful"
+NO_ALTERNATIVE = "no_alternative"
+WHY_CHEAPER = "why_cheaper"
+SAFETY = "safety"
+WHAT_IS = "what_is"
+ALCOHOL = "alcohol"
+INTERACTION = "interaction"
+SUPPLEMENT_INTERACTION = "supplement_interaction"
+SUPPLEMENTS = "supplements"
+GENERAL = "general"
+
+# Medications the assistant recognizes in "can I take this with ..." questions, in match order
+INTERACTION_ENTITIES = ["advil", "tylenol", "xanax", "zoloft", "prozac", "aspirin", "benadryl", "lisinopril"]
+
+# Supplements the assistant has interaction data for, in match order
+SUPPLEMENT_ENTITIES = ["turmeric", "omega-3", "magnesium", "vitamin d", "st. john's wort"]
+
+# Words that route a question to each keyword intent
+CHEAPER_TERMS = ["why cheaper", "why less expensive", "why cost less", "price difference"]
+SAFETY_TERMS = ["safe", "safety", "side effect", "dangerous"]
+ALCOHOL_TERMS = ["alcohol", "drink", "beer", "wine"]
+INTERACTION_TERMS = ["mix", "combine", "together", "interaction", "conflict"]
+SUPPLEMENT_TERMS = ["turmeric", "omega", "vitamin", "zinc", "magnesium", "st. john", "st john"]
+GENERAL_SUPPLEMENT_TERMS = ["supplement", "natural", "alternative treatment"]
+
+# Intents whose answer depends only on the medication (and the entity asked about)
+MEDICATION_INTENTS = {
+    WITHOUT_INSURANCE, TREATS, SUPPLEMENTS_HELPFUL, NO_ALTERNATIVE, WHY_CHEAPER, SAFETY, WHAT_IS,
+    ALCOHOL, INTERACTION, SUPPLEMENT_INTERACTION, SUPPLEMENTS, GENERAL,
+}
+
+# Distinct questions whose classification is remembered
+CLASSIFY_CACHE_SIZE = 4096
+
+# Seconds between checks that the table still matches the catalog version
+TABLE_CHECK_INTERVAL = 1.0
+
+# Answer code for table cells the rules could not precompute
+MISSING = -1
+
+# A question that classifies as each (intent, entity), used to compute the table's answers
+CANONICAL_QUESTIONS = {
+    WITHOUT_INSURANCE: "without insurance",
+    TREATS: "what does it treat",
+    SUPPLEMENTS_HELPFUL: "supplement helpful",
+    NO_ALTERNATIVE: "no alternative",
+    WHY_CHEAPER: "why cheaper",
+    SAFETY: "safe",
+    WHAT_IS: "what is it",
+    ALCOHOL: "alcohol",
+    INTERACTION: "mix {entity}",
+    SUPPLEMENT_INTERACTION: "{entity}",
+    SUPPLEMENTS: "natural",
+    GENERAL: "",
+}
+
+# Entities each intent is precomputed for (None is "no recognized entity")
+INTENT_ENTITIES = {
+    INTERACTION: [None] + INTERACTION_ENTITIES,
+    SUPPLEMENT_INTERACTION: [None] + SUPPLEMENT_ENTITIES,
+}
+
+# Question used for "no recognized entity" where the template needs one
+NO_ENTITY_QUESTIONS = {
+    INTERACTION: "mix",
+    SUPPLEMENT_INTERACTION: "zinc",
+}
+
+
+@functools.lru_cache(maxsize=CLASSIFY_CACHE_SIZE)
+def classify_intent(question: str, has_medication: bool = True, has_alternative: bool = False) -> Tuple[str, Optional[str]]:
+    """
+    Classify a question the way SimpleAssistant's rules do.
+
+    Args:
+        question: The user's question
+        has_medication: Whether a medication is selected
+        has_alternative: Whether an alternative is selected
+
+    Returns:
+        Tuple of (intent, entity); the entity is the medication or supplement
+        asked about for interaction intents, otherwise None
+    """
+    q = question.lower()
+
+    if "difference between" in q and has_medication and has_alternative:
+        return DIFFERENCE, None
+    if "save" in q and "cheaper" in q and has_medication and has_alternative:
+        return SAVINGS, None
+    if "without insurance" in q:
+        return WITHOUT_INSURANCE, None
+    if "what does" in q and "treat" in q:
+        return TREATS, None
+    if "supplement" in q and "helpful" in q:
+        return SUPPLEMENTS_HELPFUL, None
+    if "no alternative" in q or "why wasn't" in q:
+        return NO_ALTERNATIVE, None
+    if any(term in q for term in CHEAPER_TERMS):
+        return WHY_CHEAPER, None
+    if any(term in q for term in SAFETY_TERMS):
+        return SAFETY, None
+    if "what is" in q and has_medication:
+        return WHAT_IS, None
+    if any(term in q for term in ALCOHOL_TERMS):
+        return ALCOHOL, None
+    if any(term in q for term in INTERACTION_TERMS):
+        return INTERACTION, next((med for med in INTERACTION_ENTITIES if med in q), None)
+    if any(term in q for term in SUPPLEMENT_TERMS):
+        return SUPPLEMENT_INTERACTION, next((supp for supp in SUPPLEMENT_ENTITIES if supp in q), None)
+    if any(term in q for term in GENERAL_SUPPLEMENT_TERMS):
+        return SUPPLEMENTS, None
+    return GENERAL, None
+
+
+def canonical_question(intent: str, entity: Optional[str] = None) -> str:
+    """A question that classifies as (intent, entity)."""
+    if entity is None and intent in NO_ENTITY_QUESTIONS:
+        return NO_ENTITY_QUESTIONS[intent]
+    return CANONICAL_QUESTIONS[intent].format(entity=entity or "")
+
+
+class AnswerTable:
+    """
+    Rule-based answers for every medication, intent and entity, computed lazily.
+
+    The answers for all (intent, entity) slots of a medication are computed
+    together the first time it is asked about, and kept for the catalog
+    version the table belongs to. Answers are stored once each;
+    `codes[row][slot]` is the index of the answer for a compiled catalog row
+    (None when no medication is selected) and a slot.
+    """
+
+    def __init__(self, compiled: CompiledCatalog, answer: Callable[[str, Optional[Dict]], str]):
+        """
+        Args:
+            compiled: Compiled simplified catalog the rows belong to
+            answer: Rule-based answer for (question, medication record or None)
+        """
+        self.compiled = compiled
+        self.answer = answer
+        # (catalog id, version) the table belongs to, set by `get_answer_table`
+        self.catalog_key: Optional[tuple] = None
+
+        slots = [
+            (intent, entity)
+            for intent in CANONICAL_QUESTIONS
+            for entity in INTENT_ENTITIES.get(intent, [None])
+        ]
+        self.slot_index = {slot: i for i, slot in enumerate(slots)}
+        self.questions = [canonical_question(intent, entity) for intent, entity in slots]
+
+        self.answers: List[str] = []
+        self._answer_ids: Dict[str, int] = {}
+        self.codes: Dict[Optional[int], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _code(self, text: str) -> int:
+        with self._lock:
+            code = self._answer_ids.get(text)
+            if code is None:
+                code = self._answer_ids[text] = len(self.answers)
+                self.answers.append(text)
+            return code
+
+    def _fill(self, row: Optional[int]) -> np.ndarray:
+        codes = np.full(len(self.questions), MISSING, dtype=np.int32)
+        record = self.compiled.record(row) if row is not None else None
+        if row is not None and record is None:
+            return codes  # Deleted since the catalog was compiled; left to the rules
+        for slot, question in enumerate(self.questions):
+            try:
+                codes[slot] = self._code(self.answer(question, record))
+            except Exception:
+                # Left to the rules at question time (e.g. a record with missing fields)
+                continue
+        return codes
+
+    def lookup(self, medication: Optional[str], intent: str, entity: Optional[str] = None) -> Optional[str]:
+        """
+        The table's answer, or None if the table does not cover the question.
+
+        Args:
+            medication: Selected medication name (None when no medication is selected)
+            intent: Intent from `classify_intent`
+            entity: Entity from `classify_intent`
+        """
+        slot = self.slot_index.get((intent, entity))
+        row = None if medication is None else self.compiled.row(medication)
+        if slot is None or (medication is not None and row is None):
+            return None
+        codes = self.codes.get(row)
+        if codes is None:
+            # Concurrent first lookups compute the same answers; the first stored wins
+            codes = self.codes.setdefault(row, self._fill(row))
+        code = codes[slot]
+        return self.answers[code] if code != MISSING else None
+
+
+_table: Optional[AnswerTable] = None
+_table_key: Optional[tuple] = None
+_table_checked = 0.0
+_table_lock = threading.Lock()
+
+
+def get_answer_table(answer: Callable[[str, Optional[Dict]], str]) -> AnswerTable:
+    """
+    Get the answer table for the simplified catalog, started afresh for each catalog version.
+
+    The table fills itself as medications are asked about, so a new version
+    costs nothing up front. The catalog version is re-checked at most every
+    TABLE_CHECK_INTERVAL seconds, so a lookup does not pay for the catalog's
+    file checks.
+
+    Args:
+        answer: Rule-based answer for (question, medication record or None)
+    """
+    global _table, _table_key, _table_checked
+
+    now = time.monotonic()
+    if _table is not None and now - _table_checked < TABLE_CHECK_INTERVAL:
+        return _table
+
+    catalog = simple_db.get_catalog()
+    key = (id(catalog), catalog.version)
+    with _table_lock:
+        if _table is None or key != _table_key:
+            _table = AnswerTable(simple_db.get_compiled_catalog(), answer)
+            _table.catalog_key = _table_key = key
+        _table_checked = now
+        return _table
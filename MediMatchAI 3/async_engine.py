@@ -0,0 +1,330 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import simple_db
+from insurance import SELF_PAY_PLAN
+from medication_db import get_medication_info
+from price_matrix import ANY_PHARMACY, get_price_quotes
+from recommendation_engine import (
+    check_if_generic_available,
+    find_cheaper_alternatives,
+    rank_recommendations,
+    suggest_alternative_treatments
+)
+from simple_assistant import SimpleAssistant
+
+# Seconds each data source may take before it is left out of the result
+SOURCE_TIMEOUTS = {
+    'catalog': 5.0,
+    'generic': 5.0,
+    'cheaper_alternatives': 5.0,
+    'treatments': 5.0,
+    'ranking': 5.0,
+    'recommendations': 10.0,
+    'simple_info': 5.0,
+    'simple_catalog': 5.0,
+    'simple_prices': 5.0,
+    'simple_interactions': 5.0,
+    'simple_alternatives': 10.0,
+    'prices': 5.0,
+    'interactions': 5.0,
+    'assistant': 10.0,
+}
+DEFAULT_SOURCE_TIMEOUT = 5.0
+
+# Statuses reported per source
+OK = "ok"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+_assistant = SimpleAssistant()
+
+
+def _timeout(source: str, timeouts: Optional[Dict[str, float]]) -> float:
+    if timeouts and source in timeouts:
+        return timeouts[source]
+    return SOURCE_TIMEOUTS.get(source, DEFAULT_SOURCE_TIMEOUT)
+
+
+async def fetch_source(
+    source: str,
+    func: Callable,
+    *args,
+    default: Any = None,
+    timeouts: Optional[Dict[str, float]] = None,
+    executor: Optional[Executor] = None,
+    report: Optional[Dict[str, Dict]] = None
+) -> Any:
+    """
+    Run one blocking data source on a worker thread, with a timeout.
+
+    A source that times out or fails yields `default`, so the other sources
+    still make it into the result. A timed-out call keeps running on its
+    thread (threads cannot be cancelled); only its result is dropped.
+
+    Args:
+        source: Source name, used for its timeout (see SOURCE_TIMEOUTS) and in the report
+        func: Blocking function to call with `args`
+        default: Value used when the source times out or fails
+        timeouts: Per-source timeouts in seconds, overriding SOURCE_TIMEOUTS
+        executor: Thread pool to run on (defaults to the event loop's, as `asyncio.to_thread`)
+        report: Dictionary that receives the source's status and elapsed time
+
+    Returns:
+        The source's result, or `default`
+    """
+    timeout = _timeout(source, timeouts)
+    start = time.perf_counter()
+    status = OK
+    try:
+        if executor is None:
+            call = asyncio.to_thread(func, *args)
+        else:
+            call = asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args))
+        return await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        status = TIMEOUT
+        print(f"Warning: {source} did not answer within {timeout:g}s; leaving it out")
+        return default
+    except Exception as e:
+        status = ERROR
+        print(f"Error fetching {source}: {e}")
+        return default
+    finally:
+        if report is not None:
+            report[source] = {'status': status, 'elapsed_ms': (time.perf_counter() - start) * 1000}
+
+
+async def _bounded(source: str, call: Awaitable, default: Any, timeouts: Optional[Dict[str, float]],
+                   report: Optional[Dict[str, Dict]]) -> Any:
+    # Bounds a group of sources as a whole; each of them is also reported individually
+    timeout = _timeout(source, timeouts)
+    start = time.perf_counter()
+    status = OK
+    try:
+        return await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        status = TIMEOUT
+        print(f"Warning: {source} did not finish within {timeout:g}s; leaving them out")
+        return default
+    finally:
+        if report is not None:
+            report[source] = {'status': status, 'elapsed_ms': (time.perf_counter() - start) * 1000}
+
+
+async def _recommend(
+    med_info: Optional[Dict],
+    medication: str,
+    budget: Optional[float],
+    insurance: str,
+    allergies: Optional[str],
+    pharmacy: str,
+    include_holistic: bool,
+    top_k: Optional[int],
+    weights: Optional[Dict[str, float]],
+    options: Dict
+) -> List[Dict]:
+    if not med_info or not med_info.get('drug_class'):
+        return []
+
+    # Budget and allergy filters run after ranking, so keep every candidate when they apply
+    alternatives_limit = None if (budget and budget > 0) or allergies else top_k
+
+    sources = [
+        fetch_source('generic', check_if_generic_available, medication, pharmacy, default={}, **options)
+        if med_info['is_brand'] else asyncio.sleep(0, {}),
+        fetch_source('cheaper_alternatives', find_cheaper_alternatives, medication, med_info['drug_class'], pharmacy,
+                     alternatives_limit, insurance, weights, default=[], **options),
+        fetch_source('treatments', suggest_alternative_treatments, medication, default=[], **options)
+        if include_holistic else asyncio.sleep(0, []),
+    ]
+    generic, alternatives, treatments = await asyncio.gather(*sources)
+
+    recommendations = ([generic] if generic else []) + alternatives + treatments
+    return await fetch_source(
+        'ranking', rank_recommendations, med_info, recommendations, budget, insurance, allergies, top_k, weights,
+        pharmacy, default=[], **options
+    )
+
+
+async def generate_recommendations_async(
+    medication: str,
+    budget: Optional[float] = None,
+    insurance: str = "None/Self-pay",
+    allergies: Optional[str] = None,
+    pharmacy: str = ANY_PHARMACY,
+    include_holistic: bool = False,
+    top_k: Optional[int] = 5,
+    weights: Optional[Dict[str, float]] = None,
+    timeouts: Optional[Dict[str, float]] = None,
+    executor: Optional[Executor] = None,
+    report: Optional[Dict[str, Dict]] = None
+) -> List[Dict]:
+    """
+    Async counterpart of `recommendation_engine.generate_recommendations`.
+
+    The generic version, the cheaper alternatives and the alternative
+    treatments are fetched concurrently, so the latency is that of the
+    slowest of them rather than their sum. A source that times out is left
+    out of the recommendations.
+
+    Args:
+        medication: The prescribed medication
+        budget: Monthly budget constraint (optional)
+        insurance: Insurance provider (optional)
+        allergies: Allergies or restrictions (optional)
+        pharmacy: Preferred pharmacy (optional)
+        include_holistic: Whether to include holistic/alternative options
+        top_k: Number of recommendations to return (None for all)
+        weights: Ranking criterion weights (see `ranking.DEFAULT_WEIGHTS`)
+        timeouts: Per-source timeouts in seconds (see SOURCE_TIMEOUTS)
+        executor: Thread pool to run the sources on (optional)
+        report: Dictionary that receives each source's status and elapsed time
+
+    Returns:
+        List of recommendation dictionaries, best first
+    """
+    options = dict(timeouts=timeouts, executor=executor, report=report)
+
+    med_info = await fetch_source('catalog', get_medication_info, medication, **options)
+    return await _recommend(med_info, medication, budget, insurance, allergies, pharmacy, include_holistic,
+                            top_k, weights, options)
+
+
+async def find_alternatives_async(
+    medication_info: Dict,
+    budget: Optional[float] = None,
+    insurance: str = SELF_PAY_PLAN,
+    restrictions: Optional[str] = None,
+    max_depth: int = 1,
+    timeouts: Optional[Dict[str, float]] = None,
+    executor: Optional[Executor] = None,
+    report: Optional[Dict[str, Dict]] = None
+) -> List[Dict]:
+    """
+    Async counterpart of `simple_db.find_alternatives`.
+
+    Once the candidates are read from the catalog, their prices and their
+    interaction warnings are fetched concurrently. Alternatives are never
+    shown without their warnings, so if either of those sources times out
+    no alternatives are returned.
+
+    Args:
+        medication_info: Dictionary with original medication information
+        budget: Optional budget constraint
+        insurance: Insurance coverage level
+        restrictions: Optional medical restrictions/allergies
+        max_depth: How many hops of the alternatives graph to follow
+        timeouts: Per-source timeouts in seconds (see SOURCE_TIMEOUTS)
+        executor: Thread pool to run the sources on (optional)
+        report: Dictionary that receives each source's status and elapsed time
+
+    Returns:
+        List of alternative medication dictionaries, cheapest out-of-pocket cost first
+    """
+    options = dict(timeouts=timeouts, executor=executor, report=report)
+
+    candidates, hops = await fetch_source('simple_catalog', simple_db.find_alternative_candidates, medication_info,
+                                          restrictions, max_depth, default=([], []), **options)
+    if not candidates:
+        return []
+
+    names = [alt_info['Medication Name'] for alt_info in candidates]
+    patient_costs, warnings = await asyncio.gather(
+        fetch_source('simple_prices', simple_db.price_alternatives, medication_info, candidates, insurance, **options),
+        fetch_source('simple_interactions', simple_db.get_interaction_warnings, names, **options),
+    )
+    if patient_costs is None or warnings is None:
+        return []
+    return simple_db.format_alternatives(medication_info, candidates, hops, patient_costs, warnings, budget, insurance)
+
+
+def _interactions(medication: str) -> Dict:
+    return {
+        'do_not_combine': simple_db.get_do_not_combine(medication),
+        'risks': simple_db.get_medication_risks(medication),
+    }
+
+
+async def get_medication_overview(
+    medication: str,
+    budget: Optional[float] = None,
+    insurance: str = SELF_PAY_PLAN,
+    allergies: Optional[str] = None,
+    pharmacy: str = ANY_PHARMACY,
+    include_holistic: bool = False,
+    question: Optional[str] = None,
+    timeouts: Optional[Dict[str, float]] = None,
+    executor: Optional[Executor] = None
+) -> Dict:
+    """
+    Everything the app shows for a medication, with every data source fetched concurrently.
+
+    Recommendations, alternatives from the simplified catalog, pharmacy
+    price quotes, interaction warnings and (when a question is given) the
+    assistant's answer are gathered at once, each under its own timeout.
+    Each catalog record is fetched once and shared by the sources that need it.
+
+    Args:
+        medication: The prescribed medication
+        budget: Monthly budget constraint (optional)
+        insurance: Insurance provider (optional)
+        allergies: Allergies or restrictions (optional)
+        pharmacy: Preferred pharmacy (optional)
+        include_holistic: Whether to include holistic/alternative options
+        question: Question for the assistant (optional)
+        timeouts: Per-source timeouts in seconds (see SOURCE_TIMEOUTS)
+        executor: Thread pool to run the sources on (optional)
+
+    Returns:
+        Dictionary with 'info' (the catalog record, None if the medication
+        is unknown), 'recommendations', 'alternatives', 'prices',
+        'interactions', 'answer', 'sources' (status and elapsed time per
+        source) and 'elapsed_ms'
+    """
+    start = time.perf_counter()
+    report: Dict[str, Dict] = {}
+    options = dict(timeouts=timeouts, executor=executor, report=report)
+
+    catalog = asyncio.ensure_future(fetch_source('catalog', get_medication_info, medication, **options))
+    simple_info = asyncio.ensure_future(
+        fetch_source('simple_info', simple_db.get_medication_info, medication, **options)
+    )
+
+    async def recommendations():
+        return await _recommend(await catalog, medication, budget, insurance, allergies, pharmacy, include_holistic,
+                                5, None, options)
+
+    async def simple_alternatives():
+        info = await simple_info
+        if info is None:
+            return []
+        return await find_alternatives_async(info, budget, insurance, allergies, **options)
+
+    async def assistant_answer():
+        return await fetch_source('assistant', _assistant.answer_question, question, await simple_info, **options)
+
+    results = await asyncio.gather(
+        catalog,
+        _bounded('recommendations', recommendations(), [], timeouts, report),
+        _bounded('simple_alternatives', simple_alternatives(), [], timeouts, report),
+        fetch_source('prices', get_price_quotes, medication, default=[], **options),
+        fetch_source('interactions', _interactions, medication, default={}, **options),
+        assistant_answer() if question else asyncio.sleep(0),
+    )
+
+    info, recommended, alternatives, prices, interactions, answer = results
+    return {
+        'medication': medication,
+        'info': info,
+        'recommendations': recommended,
+        'alternatives': alternatives,
+        'prices': [{'pharmacy': name, 'monthly_cost': cost} for name, cost in prices],
+        'interactions': interactions,
+        'answer': answer,
+        'sources': report,
+        'elapsed_ms': (time.perf_counter() - start) * 1000,
+    }
@@ -0,0 +1,204 @@
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import medication_db
+from compiled_catalog import CompiledCatalog
+from educational_content import educational_sections
+from question_cache import STOPWORDS
+
+# BM25 term-frequency saturation and document-length normalization
+K1 = 1.2
+B = 0.75
+
+# Passages returned for a question, and the score a passage needs to be returned at all
+DEFAULT_TOP_K = 2
+MIN_PASSAGE_SCORE = 1.5
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of a text without stopwords, with plural "s" stripped."""
+    tokens = []
+    for word in _WORD_RE.findall(str(text).lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class Passage(NamedTuple):
+    """A searchable piece of text."""
+    title: str
+    text: str
+    source: str
+
+
+class BM25Index:
+    """
+    In-memory BM25 index over a list of documents.
+
+    The inverted index maps each term to the documents containing it and
+    the term's BM25 weight in each, with the IDF and length normalization
+    already applied, so a query only adds up the posting lists of its terms.
+    """
+
+    def __init__(self, documents: Sequence[str], k1: float = K1, b: float = B):
+        """
+        Args:
+            documents: Text of each document
+            k1: Term-frequency saturation
+            b: Document-length normalization (0 ignores length)
+        """
+        term_counts = [Counter(tokenize(document)) for document in documents]
+        lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float64)
+        self.size = len(documents)
+        avg_length = lengths.mean() if self.size and lengths.sum() else 1.0
+
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for doc, counts in enumerate(term_counts):
+            for term, tf in counts.items():
+                docs, tfs = postings.setdefault(term, ([], []))
+                docs.append(doc)
+                tfs.append(tf)
+
+        # Length normalization of each document, shared by all its terms
+        norms = k1 * (1 - b + b * lengths / avg_length)
+
+        # term -> (document ids, BM25 weight of the term in each document)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, (docs, tfs) in postings.items():
+            docs = np.array(docs, dtype=np.int32)
+            tfs = np.array(tfs, dtype=np.float64)
+            idf = np.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+            self.postings[term] = (docs, idf * tfs * (k1 + 1) / (tfs + norms[docs]))
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K) -> List[Tuple[int, float]]:
+        """
+        Best-matching documents for a query.
+
+        Args:
+            query: Free-form query text
+            top_k: Maximum number of documents to return
+
+        Returns:
+            List of (document id, score) tuples, best first
+        """
+        scores = np.zeros(self.size)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                docs, weights = posting
+                scores[docs] += weights
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind='stable')]
+        return [(int(doc), float(scores[doc])) for doc in matched]
+
+
+def _text(value) -> str:
+    return "" if value is None or (isinstance(value, float) and pd.isna(value)) else str(value)
+
+
+def build_knowledge_passages(medications: CompiledCatalog, drug_classes: pd.DataFrame) -> List[Passage]:
+    """
+    Passages for the assistant's search: one per medication, one per drug
+    class and one per educational section.
+
+    Args:
+        medications: Compiled medications catalog (see `medication_db.get_compiled_catalog`);
+            only its descriptions are read from the catalog
+        drug_classes: Drug classes table (see `medication_db.load_drug_classes`)
+    """
+    passages = []
+    side_effects = medications.lists['side_effects']
+    rows = zip(medications.names, medications.values['drug_class'], medications.column('description'))
+    for row, (name, drug_class, description) in enumerate(rows):
+        name = _text(name)
+        if not name:
+            continue
+        text = f"{name} is a {_text(drug_class)}. {_text(description)}."
+        effects = side_effects.text(row)
+        if effects:
+            text += f" Common side effects: {effects}."
+        passages.append(Passage(name, text, 'medication'))
+
+    for drug_class in drug_classes.to_dict('records'):
+        title = _text(drug_class.get('class_name'))
+        text = f"{title} ({_text(drug_class.get('full_name'))}): {_text(drug_class.get('description'))}."
+        if _text(drug_class.get('common_uses')):
+            text += f" Common uses: {_text(drug_class.get('common_uses'))}."
+        passages.append(Passage(title, text, 'drug_class'))
+
+    for title, text in educational_sections():
+        passages.append(Passage(title, text, 'education'))
+
+    return passages
+
+
+class KnowledgeIndex:
+    """BM25 index over the knowledge passages."""
+
+    def __init__(self, passages: List[Passage]):
+        self.passages = passages
+        self.index = BM25Index([f"{passage.title} {passage.text}" for passage in passages])
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K, min_score: float = MIN_PASSAGE_SCORE) -> List[Dict]:
+        """
+        Passages best matching a question.
+
+        Args:
+            query: Free-form question
+            top_k: Maximum number of passages
+            min_score: Drop passages scoring below this
+
+        Returns:
+            List of dictionaries with 'title', 'text', 'source' and 'score', best first
+        """
+        return [
+            {**self.passages[doc]._asdict(), 'score': score}
+            for doc, score in self.index.search(query, top_k)
+            if score >= min_score
+        ]
+
+
+_knowledge_index: Optional[KnowledgeIndex] = None
+_knowledge_key: Optional[tuple] = None
+_knowledge_lock = threading.Lock()
+
+
+def get_knowledge_index() -> KnowledgeIndex:
+    """
+    Get the knowledge index, rebuilt when the medications catalog is
+    recompiled (once per catalog version) or the drug classes file changes.
+    """
+    global _knowledge_index, _knowledge_key
+
+    compiled = medication_db.get_compiled_catalog()
+    classes_path = medication_db.DRUG_CLASSES_CSV
+    classes_mtime = os.path.getmtime(classes_path) if os.path.exists(classes_path) else None
+    key = (compiled, classes_mtime)
+    if _knowledge_index is not None and key == _knowledge_key:
+        return _knowledge_index
+
+    with _knowledge_lock:
+        if _knowledge_index is None or key != _knowledge_key:
+            passages = build_knowledge_passages(compiled, medication_db.load_drug_classes())
+            _knowledge_index = KnowledgeIndex(passages)
+            _knowledge_key = key
+        return _knowledge_index
+
+
+def search_knowledge(query: str, top_k: int = DEFAULT_TOP_K) -> List[Dict]:
+    """Passages best matching a question (see `KnowledgeIndex.search`)."""
+    return get_knowledge_index().search(query, top_k)
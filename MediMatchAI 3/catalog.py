@@ -0,0 +1,547 @@
+import bisect
+import copy
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# Directory of delta files replayed (in file name order) whenever a catalog is loaded
+DELTAS_DIR = os.path.join("data", "deltas")
+
+# Column in a delta file holding the operation for each row
+DELTA_OP_COLUMN = "op"
+
+# Supported delta operations
+DELTA_UPSERT = "upsert"
+DELTA_DELETE = "delete"
+
+# Row dictionaries kept for repeat lookups; the memo is cleared when it fills up
+RECORD_CACHE_SIZE = 10000
+
+
+class Catalog:
+    """
+    In-memory medication catalog with name and drug-class indexes.
+
+    Rows keep a stable integer label for their whole lifetime, so the name
+    index, the generic-name index and the per-class member lists can be
+    patched in place when a delta is applied instead of being rebuilt.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        name_column: str,
+        class_column: str,
+        generic_column: Optional[str] = None,
+        text_columns: Optional[List[str]] = None,
+        version: int = 0
+    ):
+        self.df = df.reset_index(drop=True)
+        self.name_column = name_column
+        self.class_column = class_column
+        self.generic_column = generic_column
+        self.text_columns = text_columns or [name_column]
+        self.version = version
+
+        # lowercase name -> row label
+        self.name_index: Dict[str, int] = {}
+        # lowercase generic name -> first row label with that generic name
+        self.generic_index: Dict[str, int] = {}
+        # lowercase drug class -> row labels in catalog order
+        self.class_index: Dict[str, List[int]] = {}
+
+        self._next_label = len(self.df)
+        self._index_rows(self.df)
+
+        # Per-version memos, cleared by apply_delta
+        self._records: Dict[int, Dict] = {}
+        self._class_records: Dict[str, List[Dict]] = {}
+        self._text: Optional[pd.Series] = None
+
+    @property
+    def empty(self) -> bool:
+        return self.df.empty or self.name_column not in self.df.columns
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    @staticmethod
+    def _key(value) -> Optional[str]:
+        if value is None or (isinstance(value, float) and pd.isna(value)):
+            return None
+        return str(value).lower()
+
+    def _index_rows(self, rows: pd.DataFrame):
+        """Add rows to every index (rows must already be in self.df)."""
+        if self.name_column not in rows.columns:
+            return
+
+        names = rows[self.name_column].tolist()
+        classes = rows[self.class_column].tolist() if self.class_column in rows.columns else [None] * len(rows)
+        generics = rows[self.generic_column].tolist() if self.generic_column in rows.columns else [None] * len(rows)
+
+        for label, name, drug_class, generic in zip(rows.index, names, classes, generics):
+            name_key = self._key(name)
+            if name_key is not None:
+                self.name_index.setdefault(name_key, label)
+
+            generic_key = self._key(generic)
+            if generic_key is not None:
+                self.generic_index.setdefault(generic_key, label)
+
+            class_key = self._key(drug_class)
+            if class_key is not None:
+                # Labels grow with catalog order, so insort keeps members in catalog order
+                bisect.insort(self.class_index.setdefault(class_key, []), label)
+
+    def _unindex_row(self, label: int):
+        """Remove one row from every index (row must still be in self.df)."""
+        row = self.df.loc[label]
+
+        name_key = self._key(row.get(self.name_column))
+        if name_key is not None and self.name_index.get(name_key) == label:
+            del self.name_index[name_key]
+
+        generic_key = self._key(row.get(self.generic_column)) if self.generic_column else None
+        if generic_key is not None and self.generic_index.get(generic_key) == label:
+            del self.generic_index[generic_key]
+
+        class_key = self._key(row.get(self.class_column))
+        members = self.class_index.get(class_key)
+        if members is not None:
+            members.remove(label)
+            if not members:
+                del self.class_index[class_key]
+
+    def copy(self) -> 'Catalog':
+        """
+        Independent copy of the catalog, to change while readers keep using this one.
+
+        The indexes are copied rather than rebuilt, so rows keep their labels.
+        """
+        clone = copy.copy(self)
+        clone.df = self.df.copy()
+        clone.name_index = dict(self.name_index)
+        clone.generic_index = dict(self.generic_index)
+        clone.class_index = {key: list(labels) for key, labels in self.class_index.items()}
+        clone._records = {}
+        clone._class_records = {}
+        clone._text = None
+        return clone
+
+    def _record(self, label: int) -> Dict:
+        record = self._records.get(label)
+        if record is None:
+            if len(self._records) >= RECORD_CACHE_SIZE:
+                self._records.clear()
+            record = self._records[label] = self.df.loc[label].to_dict()
+        # Callers may modify the dictionary they get back
+        return dict(record)
+
+    def find_exact(self, value: str, column: Optional[str] = None) -> Optional[Dict]:
+        """
+        Find the row whose name (or generic name) matches `value` case-insensitively.
+
+        Args:
+            value: Value to look up
+            column: Column to match; the name and generic columns use their indexes
+
+        Returns:
+            Row dictionary or None if not found
+        """
+        if self.empty:
+            return None
+
+        column = column or self.name_column
+        key = str(value).lower()
+
+        if column == self.name_column:
+            label = self.name_index.get(key)
+        elif column == self.generic_column:
+            label = self.generic_index.get(key)
+        else:
+            matches = self.df.index[self.df[column].astype(str).str.lower() == key]
+            label = matches[0] if len(matches) else None
+
+        return self._record(label) if label is not None else None
+
+    def find(self, medication_name: str) -> Optional[Dict]:
+        """Find a medication by exact name, falling back to a partial name match."""
+        record = self.find_exact(medication_name)
+        if record is not None or self.empty:
+            return record
+
+        names = self.df[self.name_column].astype(str).str.lower()
+        matches = self.df.index[names.str.contains(medication_name.lower(), regex=False)]
+
+        return self._record(matches[0]) if len(matches) else None
+
+    def by_class(self, drug_class: str) -> List[Dict]:
+        """Return every medication in a drug class (case-insensitive)."""
+        key = drug_class.lower()
+        records = self._class_records.get(key)
+        if records is None:
+            labels = self.class_index.get(key, [])
+            if not labels:
+                return []
+            records = self._class_records[key] = self.df.loc[labels].to_dict('records')
+        return [dict(record) for record in records]
+
+    def search(self, query: str) -> List[Dict]:
+        """Return medications whose name or drug class contains the query."""
+        if self.empty:
+            return []
+
+        term = query.lower()
+        mask = self.df[self.name_column].astype(str).str.lower().str.contains(term, regex=False)
+        if self.class_column in self.df.columns:
+            mask |= self.df[self.class_column].astype(str).str.lower().str.contains(term, regex=False)
+
+        return self.df[mask].to_dict('records')
+
+    def full_text_search(self, query: str, limit: int = 20) -> List[Dict]:
+        """Return medications whose text columns contain every search term."""
+        terms = [term for term in query.lower().split() if term]
+        if self.empty or not terms:
+            return []
+
+        text = self._text
+        if text is None:
+            text = pd.Series('', index=self.df.index)
+            for column in self.text_columns:
+                if column in self.df.columns:
+                    text = text + ' ' + self.df[column].fillna('').astype(str)
+            text = self._text = text.str.lower()
+
+        mask = pd.Series(True, index=self.df.index)
+        for term in terms:
+            mask &= text.str.contains(term, regex=False)
+
+        return self.df[mask].head(limit).to_dict('records')
+
+    def select(self, filters: Dict, limit: Optional[int] = None) -> List[Dict]:
+        """Return rows where every column equals the given value."""
+        if self.df.empty:
+            return []
+
+        mask = pd.Series(True, index=self.df.index)
+        for column, value in filters.items():
+            mask &= self.df[column] == value
+
+        matches = self.df[mask]
+        if limit is not None:
+            matches = matches.head(limit)
+        return matches.to_dict('records')
+
+    def column_values(self, columns: List[str]) -> Tuple[np.ndarray, Dict[str, list]]:
+        """
+        Every row's values of some columns, without building row dictionaries.
+
+        Args:
+            columns: Columns to read (missing columns read as None)
+
+        Returns:
+            Tuple of (row IDs in catalog order, values per column); row IDs
+            are stable labels to pass to `get_records`
+        """
+        values = {column: self.df[column].tolist() if column in self.df.columns else [None] * len(self.df)
+                  for column in columns}
+        return self.df.index.to_numpy(dtype=np.int64), values
+
+    def get_records(self, row_ids: List[int]) -> List[Optional[Dict]]:
+        """Row dictionaries by row ID (None for rows that no longer exist)."""
+        return [self._record(label) if label in self.df.index else None for label in row_ids]
+
+    def _assign(self, labels: pd.Index, column: str, values: pd.Series):
+        """Write delta values into one catalog column, widening its dtype if needed."""
+        if column not in self.df.columns:
+            self.df[column] = pd.Series(dtype=values.dtype)
+
+        current = self.df[column].dtype
+        if pd.api.types.is_integer_dtype(current) and not pd.api.types.is_integer_dtype(values.dtype):
+            self.df[column] = self.df[column].astype(float)
+        elif pd.api.types.is_bool_dtype(current) and not pd.api.types.is_bool_dtype(values.dtype):
+            self.df[column] = self.df[column].astype(object)
+
+        if pd.api.types.is_numeric_dtype(self.df[column].dtype) and not pd.api.types.is_bool_dtype(self.df[column].dtype):
+            values = pd.to_numeric(values, errors='coerce')
+
+        self.df.loc[labels, column] = values.to_numpy()
+
+    def apply_delta(self, delta: pd.DataFrame) -> Dict:
+        """
+        Apply a delta of upserts and deletes keyed by medication name.
+
+        Updates are written into the existing rows column by column, so a price
+        change only touches the cost column; the indexes are only patched for
+        rows whose name, generic name or class actually changes. Empty cells
+        in an upsert leave the existing value untouched.
+
+        Args:
+            delta: DataFrame with the catalog name column, an optional `op`
+                column ("upsert" or "delete", default "upsert") and any subset
+                of the catalog columns
+
+        Returns:
+            Dictionary with the new version and the number of rows updated,
+            inserted and deleted
+        """
+        start = time.perf_counter()
+
+        if self.name_column not in delta.columns:
+            raise ValueError(f"Delta is missing the '{self.name_column}' key column")
+
+        delta = delta.copy()
+        if DELTA_OP_COLUMN in delta.columns:
+            delta[DELTA_OP_COLUMN] = delta[DELTA_OP_COLUMN].fillna(DELTA_UPSERT).astype(str).str.strip().str.lower()
+        else:
+            delta[DELTA_OP_COLUMN] = DELTA_UPSERT
+
+        invalid = ~delta[DELTA_OP_COLUMN].isin([DELTA_UPSERT, DELTA_DELETE])
+        if invalid.any():
+            raise ValueError(f"Unknown delta operations: {sorted(delta.loc[invalid, DELTA_OP_COLUMN].unique())}")
+
+        # The last operation for each medication wins
+        delta['_key'] = delta[self.name_column].astype(str).str.strip().str.lower()
+        delta = delta.drop_duplicates('_key', keep='last')
+        # Plain dict lookups: Series.map(dict) would copy the whole name index
+        delta['_label'] = pd.array([self.name_index.get(key) for key in delta['_key']], dtype='Int64')
+
+        data_columns = [col for col in delta.columns if col not in (DELTA_OP_COLUMN, '_key', '_label')]
+        index_columns = {self.name_column, self.class_column, self.generic_column}
+
+        is_delete = delta[DELTA_OP_COLUMN] == DELTA_DELETE
+        exists = delta['_label'].notna()
+
+        # Deletes
+        deleted = delta[is_delete & exists]['_label'].astype(int).tolist()
+        for label in deleted:
+            self._unindex_row(label)
+        if deleted:
+            self.df = self.df.drop(index=deleted)
+
+        # Updates of existing rows
+        updates = delta[~is_delete & exists]
+        if not updates.empty:
+            labels = pd.Index(updates['_label'].astype(int))
+            reindex = [col for col in data_columns if col in index_columns and col != self.name_column]
+
+            for label in labels if reindex else []:
+                self._unindex_row(label)
+
+            for column in data_columns:
+                if column == self.name_column:
+                    continue
+                present = updates[column].notna().to_numpy()
+                if present.any():
+                    self._assign(labels[present], column, updates[column][present])
+
+            if reindex:
+                self._index_rows(self.df.loc[labels])
+
+        # Inserts of new medications
+        inserts = delta[~is_delete & ~exists]
+        if not inserts.empty:
+            new_rows = inserts[data_columns].reindex(columns=self.df.columns.union(data_columns, sort=False))
+            new_rows.index = pd.RangeIndex(self._next_label, self._next_label + len(new_rows))
+            self._next_label += len(new_rows)
+            self.df = pd.concat([self.df, new_rows]) if not self.df.empty else new_rows
+            self._index_rows(new_rows)
+
+        self.version += 1
+        self._records = {}
+        self._class_records = {}
+        self._text = None
+
+        return {
+            'version': self.version,
+            'updated': len(updates),
+            'inserted': len(inserts),
+            'deleted': len(deleted),
+            'elapsed_ms': (time.perf_counter() - start) * 1000
+        }
+
+
+def read_delta(path: str) -> pd.DataFrame:
+    """
+    Read a delta file.
+
+    A delta is a CSV with the catalog's name column, an optional `op` column
+    ("upsert" or "delete") and any catalog columns to set, e.g.:
+
+        op,name,avg_cost
+        upsert,Lipitor,245.50
+        delete,Mevacor,
+
+    Args:
+        path: Path to the delta CSV
+
+    Returns:
+        DataFrame with the delta rows
+    """
+    return pd.read_csv(path)
+
+
+def list_delta_files(directory: str = DELTAS_DIR) -> List[str]:
+    """Return the delta files in a directory in the order they should be applied."""
+    if not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.endswith('.csv')
+    ]
+
+
+def write_csv_atomic(df: pd.DataFrame, path: str):
+    """
+    Write a CSV so readers see either the old file or the complete new one.
+
+    The file is written under a temporary name unique to this thread and
+    renamed over the target, so concurrent writers never interleave either.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        df.to_csv(temp_path, index=False)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def save_delta(delta: pd.DataFrame, directory: str = DELTAS_DIR) -> str:
+    """
+    Persist a delta so it is replayed the next time the catalog is loaded.
+
+    Args:
+        delta: Delta DataFrame
+        directory: Delta directory for the catalog
+
+    Returns:
+        Path of the written delta file
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    # Timestamped names sort in the order the deltas were applied
+    path = os.path.join(directory, f"delta_{time.strftime('%Y%m%d%H%M%S')}_{time.time_ns() % 10**9:09d}.csv")
+    write_csv_atomic(delta, path)
+    return path
+
+
+def build_catalog(
+    df: pd.DataFrame,
+    name_column: str,
+    class_column: str,
+    generic_column: Optional[str] = None,
+    text_columns: Optional[List[str]] = None,
+    deltas_dir: str = DELTAS_DIR
+) -> Catalog:
+    """
+    Build an in-memory catalog and replay any persisted delta files onto it.
+
+    Args:
+        df: Base catalog loaded from CSV
+        name_column: Column holding the medication name
+        class_column: Column holding the drug class
+        generic_column: Column holding the generic/brand counterpart name (optional)
+        text_columns: Columns searched by `Catalog.full_text_search`
+        deltas_dir: Directory of delta files to replay
+
+    Returns:
+        Catalog whose version equals the number of deltas applied
+    """
+    catalog = Catalog(df, name_column, class_column, generic_column, text_columns)
+
+    for path in list_delta_files(deltas_dir):
+        try:
+            delta = read_delta(path)
+            if name_column in delta.columns:
+                catalog.apply_delta(delta)
+        except Exception as e:
+            print(f"Error applying catalog delta {path}: {e}")
+
+    return catalog
+
+
+class CatalogSwap:
+    """
+    The current snapshot of an in-memory catalog, replaced by atomic swaps (read-copy-update).
+
+    A published catalog is never modified. Reloads and deltas build a new
+    catalog off to the side and publish it with a single reference
+    assignment, so readers take no lock and never see a half-loaded or
+    half-updated catalog. A reader keeps a consistent snapshot for as long
+    as it holds the catalog it got, and an old snapshot is freed as soon as
+    the last reader drops it.
+
+    Versions only increase within a process, also across reloads, so
+    caches keyed on the version never confuse two snapshots.
+    """
+
+    def __init__(self, build: Callable[[], Catalog], source_path: str):
+        """
+        Args:
+            build: Builds the catalog from its source file (and persisted deltas)
+            source_path: File the catalog is reloaded from when it changes
+        """
+        self.build = build
+        self.source_path = source_path
+        # (catalog, source modification time), replaced as one reference
+        self._snapshot: Optional[Tuple[Catalog, Optional[float]]] = None
+        # Serializes writers only; readers never take it
+        self._write_lock = threading.RLock()
+
+    def _source_mtime(self) -> Optional[float]:
+        return os.path.getmtime(self.source_path) if os.path.exists(self.source_path) else None
+
+    def _publish(self, catalog: Catalog, mtime: Optional[float]):
+        previous = self._snapshot
+        if previous is not None and catalog.version <= previous[0].version:
+            catalog.version = previous[0].version + 1
+        self._snapshot = (catalog, mtime)
+
+    def get(self) -> Catalog:
+        """
+        The current catalog, reloaded first if the source file changed.
+
+        While another thread is building the next snapshot, the current one
+        is returned rather than waiting for it.
+        """
+        snapshot = self._snapshot
+        mtime = self._source_mtime()
+        if snapshot is not None:
+            if snapshot[1] == mtime or not self._write_lock.acquire(blocking=False):
+                return snapshot[0]
+        else:
+            self._write_lock.acquire()
+
+        try:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot[1] != mtime:
+                catalog = self.build()
+                # The build may create the source file (e.g. sample data)
+                self._publish(catalog, mtime if mtime is not None else self._source_mtime())
+            return self._snapshot[0]
+        finally:
+            self._write_lock.release()
+
+    def apply_delta(self, delta: pd.DataFrame) -> Dict:
+        """Apply a delta to a copy of the current catalog and publish the copy (see `Catalog.apply_delta`)."""
+        with self._write_lock:
+            current = self.get()
+            updated = current.copy()
+            result = updated.apply_delta(delta)
+            self._publish(updated, self._snapshot[1])
+            return result
+
+
+def as_delta(delta: Union[str, pd.DataFrame]) -> pd.DataFrame:
+    """Accept either a delta file path or an already loaded delta DataFrame."""
+    if isinstance(delta, pd.DataFrame):
+        return delta
+    return read_delta(delta)
@@ -0,0 +1,126 @@
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    """One in-flight computation and the callers waiting on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Share one in-flight computation between concurrent identical calls.
+
+    The first caller for a key runs the function; callers that arrive with the
+    same key while it is running wait for it and receive its result (or its
+    exception) instead of recomputing. Nothing is cached once the call
+    finishes, so results are never stale.
+    """
+
+    def __init__(self, name: str, copy_result: Optional[Callable[[Any], Any]] = None):
+        """
+        Args:
+            name: Name reported in the statistics
+            copy_result: Makes a private copy of the shared result for each
+                caller (the one that ran the call included), for results
+                callers may modify
+        """
+        self.name = name
+        self.copy_result = copy_result
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_waiters = 0
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """
+        Call `func(*args, **kwargs)`, or join an identical call already running.
+
+        Args:
+            key: Identifies identical calls (see `make_key`)
+            func: Function to run
+
+        Returns:
+            The function's result
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return self.copy_result(call.result) if self.copy_result else call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+        # Waiters copy the shared result concurrently, so the leader must not hand it out either
+        return self.copy_result(call.result) if self.copy_result else call.result
+
+    def stats(self) -> Dict:
+        """Counters for this flight: calls, executions, coalesced calls and the coalesce rate."""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'coalesce_rate': self.coalesced / self.calls if self.calls else 0.0,
+                'errors': self.errors,
+                'in_flight': len(self._inflight),
+                'max_waiters': self.max_waiters,
+            }
+
+
+_flights: Dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name: str, copy_result: Optional[Callable[[Any], Any]] = None) -> SingleFlight:
+    """Get (or create) the process-wide flight with the given name."""
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name, copy_result)
+        return _flights[name]
+
+
+def get_coalescing_stats() -> Dict[str, Dict]:
+    """Statistics for every flight in this process, keyed by flight name."""
+    with _flights_lock:
+        flights = list(_flights.values())
+    return {flight.name: flight.stats() for flight in flights}
+
+
+def make_key(*args, **kwargs) -> str:
+    """
+    Build a key from call arguments, including unhashable ones such as lists
+    of recommendation dictionaries.
+    """
+    return json.dumps([args, kwargs], sort_keys=True, default=str)
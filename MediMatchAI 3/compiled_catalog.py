@@ -0,0 +1,266 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Restriction values meaning "no restrictions"
+NO_RESTRICTIONS = {"", "none", "nan"}
+
+
+def split_list(value) -> Tuple[str, ...]:
+    """Split a comma-separated field into its stripped, non-empty items (missing values are empty)."""
+    if not isinstance(value, str):
+        return ()
+    return tuple(item.strip() for item in value.split(',') if item.strip())
+
+
+def coerce_numeric(df: pd.DataFrame, columns: Sequence[str], source: str = "catalog") -> pd.DataFrame:
+    """
+    Convert numeric columns to float once at load, so lookups never re-coerce them.
+
+    Values that are not numbers become NaN and are reported.
+
+    Args:
+        df: Loaded catalog
+        columns: Columns that hold numbers (missing columns are skipped)
+        source: Name used in the warning
+
+    Returns:
+        The DataFrame with those columns as float64
+    """
+    for column in columns:
+        if column not in df.columns or pd.api.types.is_float_dtype(df[column]):
+            continue
+        values = pd.to_numeric(df[column], errors='coerce')
+        invalid = values.isna() & df[column].notna()
+        if invalid.any():
+            print(f"Warning: {int(invalid.sum())} non-numeric '{column}' values in {source}: "
+                  f"{df.loc[invalid, column].astype(str).head(5).tolist()}")
+        df[column] = values.astype(np.float64)
+    return df
+
+
+def _encode_strings(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Strings as one UTF-8 blob plus an offsets array."""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _decode_strings(offsets: np.ndarray, data: np.ndarray) -> List[str]:
+    blob = data.tobytes()
+    offsets = offsets.tolist()
+    return [blob[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+
+
+class ListColumn:
+    """
+    A comma-separated field of every row, split once and stored in CSR form.
+
+    Row i's items are `vocabulary[codes[indptr[i]:indptr[i + 1]]]`, in
+    listed order; each distinct item is stored once in `vocabulary`.
+    """
+
+    def __init__(self, indptr: np.ndarray, codes: np.ndarray, vocabulary: List[str]):
+        self.indptr = indptr
+        self.codes = codes
+        self.vocabulary = vocabulary
+
+    @classmethod
+    def from_values(cls, values: Iterable) -> 'ListColumn':
+        """Split every value with `split_list`."""
+        positions: Dict[str, int] = {}
+        vocabulary: List[str] = []
+        codes: List[int] = []
+        lengths: List[int] = []
+        for value in values:
+            items = split_list(value)
+            for item in items:
+                code = positions.get(item)
+                if code is None:
+                    code = positions[item] = len(vocabulary)
+                    vocabulary.append(item)
+                codes.append(code)
+            lengths.append(len(items))
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return cls(indptr, np.array(codes, dtype=np.int32), vocabulary)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'ListColumn':
+        """Inverse of `to_arrays`."""
+        return cls(arrays['indptr'], arrays['codes'],
+                   _decode_strings(arrays['vocabulary.offsets'], arrays['vocabulary.data']))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        offsets, data = _encode_strings(self.vocabulary)
+        return {'indptr': self.indptr, 'codes': self.codes, 'vocabulary.offsets': offsets, 'vocabulary.data': data}
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def __getitem__(self, row: int) -> Tuple[str, ...]:
+        vocabulary = self.vocabulary
+        return tuple(vocabulary[code] for code in self.codes[self.indptr[row]:self.indptr[row + 1]].tolist())
+
+    def __iter__(self) -> Iterator[Tuple[str, ...]]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def text(self, row: int) -> str:
+        """The row's items re-joined with ", "."""
+        return ", ".join(self[row])
+
+    def lengths(self) -> np.ndarray:
+        """Number of items per row."""
+        return np.diff(self.indptr)
+
+    def entry_rows(self) -> np.ndarray:
+        """Row of each entry in `codes`."""
+        return np.repeat(np.arange(len(self)), self.lengths())
+
+    def keep(self, entries: np.ndarray) -> 'ListColumn':
+        """Copy with only the entries where the boolean mask `entries` is set."""
+        lengths = np.bincount(self.entry_rows()[entries], minlength=len(self))
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return ListColumn(indptr, self.codes[entries], self.vocabulary)
+
+
+class CompiledCatalog:
+    """
+    Columns of one catalog version, parsed once and stored as arrays.
+
+    Each distinct medication name (first row wins, as in `find_exact`) is a
+    row. `names[row]` is its name, `values[field][row]` the raw value of a
+    plain field, `lists[field]` a `ListColumn` of a comma-separated field
+    (`lists[field][row]` is the row's items) and `numbers[field][row]` a
+    numeric field as a float (NaN when missing). Only these columns are read
+    from the catalog, never whole rows; records are fetched by row ID on
+    demand with `record`/`records`. References to medications that are not
+    in the catalog are dropped from the reference field's lists and listed
+    in `dangling`.
+
+    Catalogs that can store arrays (the SQLite backend) keep the parsed list
+    and numeric columns of each version in the database, so other processes
+    read them back instead of parsing them again.
+    """
+
+    # Name prefix of the arrays stored in the catalog
+    ARRAY_PREFIX = "compiled."
+
+    def __init__(self, catalog, name_key: str, list_fields: Sequence[str] = (),
+                 numeric_fields: Sequence[str] = (), value_fields: Sequence[str] = (),
+                 reference_field: Optional[str] = None, generic_key: Optional[str] = None):
+        """
+        Args:
+            catalog: Catalog backend (`Catalog`, `SqliteCatalog` or `SharedCatalog`)
+            name_key: Field holding the medication name
+            list_fields: Comma-separated fields to split
+            numeric_fields: Fields to convert to float
+            value_fields: Fields to keep as they are
+            reference_field: List field naming other medications, validated against the catalog
+            generic_key: Field holding the generic name, which references may also use (kept as a value field)
+        """
+        self.catalog = catalog
+        list_fields = list(dict.fromkeys([*list_fields, *([reference_field] if reference_field else [])]))
+        value_fields = list(dict.fromkeys([*value_fields, *([generic_key] if generic_key else [])]))
+
+        version = catalog.version
+        stored = catalog.load_arrays(version, self.ARRAY_PREFIX) if hasattr(catalog, 'load_arrays') else None
+
+        row_ids, columns = catalog.column_values([name_key, *value_fields])
+
+        # lowercase name -> row
+        self.row_index: Dict[str, int] = {}
+        keep: List[int] = []
+        for position, name in enumerate(columns[name_key]):
+            if isinstance(name, str) and name.lower() not in self.row_index:
+                self.row_index[name.lower()] = len(keep)
+                keep.append(position)
+        everything = len(keep) == len(row_ids)
+
+        def kept(values: list) -> list:
+            return values if everything else [values[position] for position in keep]
+
+        self.row_ids: np.ndarray = row_ids if everything else row_ids[keep]
+        self.names: List[str] = kept(columns.pop(name_key))
+        # Plain fields mostly repeat a few values (drug classes, flags), so each distinct value is stored once
+        self.values: Dict[str, list] = {}
+        for field in value_fields:
+            distinct: Dict = {}
+            self.values[field] = [distinct.setdefault(value, value) if isinstance(value, str) else value
+                                  for value in kept(columns.pop(field))]
+        del columns
+
+        if stored is not None and all(len(stored.get(f"numbers.{field}", ())) == len(keep) for field in numeric_fields) \
+                and all(len(stored.get(f"lists.{field}.indptr", ())) == len(keep) + 1 for field in list_fields):
+            self.lists: Dict[str, ListColumn] = {
+                field: ListColumn.from_arrays({name[len(f"lists.{field}."):]: array for name, array in stored.items()
+                                               if name.startswith(f"lists.{field}.")})
+                for field in list_fields
+            }
+            self.numbers: Dict[str, np.ndarray] = {field: stored[f"numbers.{field}"] for field in numeric_fields}
+        else:
+            # One raw column at a time, so only one column of unparsed text is ever held
+            self.lists = {field: ListColumn.from_values(kept(catalog.column_values([field])[1][field]))
+                          for field in list_fields}
+            self.numbers = {
+                field: pd.to_numeric(pd.Series(kept(catalog.column_values([field])[1][field]), dtype=object),
+                                     errors='coerce').to_numpy(dtype=np.float64)
+                for field in numeric_fields
+            }
+            if hasattr(catalog, 'save_arrays'):
+                arrays = {f"numbers.{field}": values for field, values in self.numbers.items()}
+                for field, column in self.lists.items():
+                    arrays.update({f"lists.{field}.{name}": array for name, array in column.to_arrays().items()})
+                try:
+                    catalog.save_arrays(version, self.ARRAY_PREFIX, arrays)
+                except Exception as e:
+                    print(f"Warning: could not store the compiled catalog: {e}")
+
+        # Medications named in the reference field that are not in the catalog, by referencing medication
+        self.dangling: Dict[str, List[str]] = {}
+        if reference_field is not None:
+            known = set(self.row_index)
+            if generic_key:
+                known.update(generic.lower() for generic in self.values[generic_key] if isinstance(generic, str))
+            references = self.lists[reference_field]
+            known_items = np.array([item.lower() in known for item in references.vocabulary], dtype=bool)
+            entries = known_items[references.codes] if len(references.codes) else np.zeros(0, dtype=bool)
+            if not entries.all():
+                for row in np.unique(references.entry_rows()[~entries]).tolist():
+                    self.dangling[self.names[row]] = [item for item in references[row] if item.lower() not in known]
+                self.lists[reference_field] = references.keep(entries)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def row(self, name) -> Optional[int]:
+        """Row of a medication name, or None if it is not in the catalog."""
+        return self.row_index.get(str(name).lower()) if name is not None else None
+
+    def record(self, row: int) -> Optional[Dict]:
+        """Full catalog record of a row, fetched from the catalog."""
+        return self.records([row])[0]
+
+    def records(self, rows: Sequence[int]) -> List[Optional[Dict]]:
+        """Full catalog records of some rows, fetched from the catalog in one call."""
+        return self.catalog.get_records(self.row_ids[np.asarray(rows, dtype=np.int64)].tolist())
+
+    def column(self, field: str) -> list:
+        """Every row's raw value of a field that was not compiled, read from the catalog in one pass."""
+        row_ids, columns = self.catalog.column_values([field])
+        values = columns[field]
+        return [values[position] if position >= 0 else None
+                for position in pd.Index(row_ids).get_indexer(self.row_ids).tolist()]
+
+    def describe_dangling(self, field: str) -> Optional[str]:
+        """One-line summary of the dangling references, or None if there are none."""
+        if not self.dangling:
+            return None
+        count = sum(len(missing) for missing in self.dangling.values())
+        examples = [f"{name} -> {', '.join(missing)}" for name, missing in list(self.dangling.items())[:3]]
+        return (f"{count} '{field}' entries in {len(self.dangling)} medications name medications "
+                f"not in the catalog (e.g. {'; '.join(examples)})")
@@ -0,0 +1,168 @@
+import textwrap
+from typing import List, Tuple
+
+# Content of the educational tabs, shared by the app and the assistant's search index
+EDUCATIONAL_TOPICS = [
+    {
+        'tab': "Understanding Medications",
+        'title': "Understanding Your Medications",
+        'content': """
+        ### What Are Drug Classes?
+
+        Medications are grouped into "classes" based on how they work in the body or what conditions they treat.
+        For example, statins lower cholesterol, while SSRIs are a type of antidepressant.
+
+        ### Reading Medication Labels
+
+        Medication labels contain important information, including:
+
+        - **Active Ingredient**: The therapeutic component of the drug
+        - **Inactive Ingredients**: Fillers, binders, colors, or preservatives
+        - **Dosage Information**: How much and how often to take the medication
+        - **Warnings**: Potential side effects and when to contact a healthcare provider
+        - **Expiration Date**: When the medication is no longer guaranteed to be safe and effective
+
+        ### Important Questions to Ask About New Medications
+
+        1. What is this medication supposed to do?
+        2. How and when should I take it?
+        3. What side effects might I experience?
+        4. Should I take it with food or on an empty stomach?
+        5. Will it interact with other medications I'm taking?
+        6. How will I know if it's working?
+        7. What should I do if I miss a dose?
+
+        Source: FDA, American Pharmacists Association
+        """,
+    },
+    {
+        'tab': "Generic vs. Brand",
+        'title': "Generic vs. Brand-Name Medications",
+        'content': """
+        ### What Are Generic Medications?
+
+        Generic medications are copies of brand-name drugs that have the same:
+
+        - Active ingredient
+        - Strength
+        - Dosage form (pill, liquid, etc.)
+        - Administration route
+        - Safety profile
+        - Intended use
+
+        ### Key Facts About Generics
+
+        - The FDA requires generics to be "bioequivalent" to brand-name drugs, meaning they work the same way
+        - Generics typically cost 80-85% less than brand-name medications
+        - About 90% of prescriptions filled in the US are for generic drugs
+        - Differences in inactive ingredients (colors, fillers) may exist but don't affect how the drug works
+
+        ### Why Are Generics Cheaper?
+
+        1. No need to repeat expensive clinical trials
+        2. Multiple companies can produce them, creating competition
+        3. Lower marketing expenses
+        4. No need to recover research and development costs
+
+        ### When Brand Names Might Be Preferred
+
+        - For "narrow therapeutic index" drugs where small differences in blood levels matter (e.g., certain thyroid medications)
+        - If you've had a negative reaction to a specific generic's inactive ingredients
+        - Some extended-release formulations may have different release mechanisms
+
+        Source: FDA, American Medical Association
+        """,
+        'table_title': "Brand vs. Generic Comparison",
+        'table': {
+            "Feature": ["Active Ingredient", "FDA Approval", "Appearance", "Cost", "Safety & Effectiveness"],
+            "Brand-Name": ["Original formula", "Full clinical trials", "Consistent", "Higher", "Proven in clinical trials"],
+            "Generic": ["Identical", "Bioequivalence testing", "May differ", "Lower (80-85% less)", "Same as brand-name"]
+        },
+    },
+    {
+        'tab': "Saving on Prescriptions",
+        'title': "Strategies for Saving on Prescriptions",
+        'content': """
+        ### Insurance Optimization
+
+        - **Formulary Tiers**: Understand your insurance's preferred drug list and tiers
+        - **Prior Authorization**: Learn when and how to request it for non-preferred medications
+        - **Mail-Order Options**: Many insurance plans offer discounts for 90-day supplies through mail order
+
+        ### Patient Assistance Programs
+
+        - **Manufacturer Programs**: Many pharmaceutical companies offer programs to help eligible patients get medications at reduced or no cost
+        - **Non-Profit Organizations**: Organizations specific to certain conditions often provide medication assistance
+
+        ### Discount Programs and Coupons
+
+        - **Discount Cards**: Programs like GoodRx, SingleCare, or RxSaver can offer significant savings
+        - **Manufacturer Coupons**: Search for "[Medication Name] savings card" online
+        - **Pharmacy Memberships**: Many pharmacies offer membership programs with prescription discounts
+
+        ### Medication Alternatives
+
+        - **Therapeutic Substitution**: Different medications in the same class that might cost less
+        - **Over-the-Counter Options**: For some conditions, OTC medicines may be effective and less expensive
+        - **Pill Splitting**: With doctor approval, sometimes a higher dose can be split to save money
+
+        Source: Consumer Reports, Medicare.gov, GoodRx
+        """,
+    },
+    {
+        'tab': "Talking to Your Doctor",
+        'title': "Talking to Your Doctor About Medication Costs",
+        'content': """
+        ### Starting the Conversation
+
+        Many patients feel uncomfortable discussing medication costs, but doctors want to help you manage your health affordably. 
+        Here are some conversation starters:
+
+        - "I'm concerned about the cost of this medication. Are there less expensive options that would work for me?"
+        - "My insurance doesn't cover this medication well. Could you recommend an alternative that's on my formulary?"
+        - "I'm having trouble affording my medications. Can we discuss some options?"
+
+        ### Questions to Ask Your Doctor
+
+        1. "Is a generic version available?"
+        2. "Is there a similar medication that costs less?"
+        3. "Are there any patient assistance programs for this medication?"
+        4. "Can I safely split a higher-dose pill to save money?"
+        5. "Is this medication absolutely necessary, or are there other approaches we could try first?"
+        6. "Can I get a 90-day supply to reduce costs?"
+
+        ### Preparing for Your Appointment
+
+        - Bring a list of your current medications
+        - Research your insurance formulary beforehand
+        - Check discount prices on GoodRx or similar sites
+        - Bring information about your financial concerns
+        - Consider asking for samples to try a medication before paying for a full prescription
+
+        Source: American Academy of Family Physicians, Mayo Clinic
+        """,
+    },
+]
+
+
+def educational_sections() -> List[Tuple[str, str]]:
+    """
+    Split the educational content into its "###" sections.
+
+    Returns:
+        List of (title, text) tuples, with titles like "Generic vs. Brand: Why Are Generics Cheaper?"
+    """
+    sections = []
+    for topic in EDUCATIONAL_TOPICS:
+        for section in textwrap.dedent(topic['content']).split("### ")[1:]:
+            heading, _, body = section.partition("\n")
+            sections.append((f"{topic['tab']}: {heading.strip()}", body.strip()))
+        if topic.get('table'):
+            table = topic['table']
+            label, *columns = list(table)
+            rows = [
+                f"{table[label][i]}: " + ", ".join(f"{column} {table[column][i]}" for column in columns)
+                for i in range(len(table[label]))
+            ]
+            sections.append((f"{topic['tab']}: {topic['table_title']}", ". ".join(rows) + "."))
+    return sections
@@ -0,0 +1,339 @@
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Optional plan and formulary data; the built-in plans below are used when absent
+INSURANCE_PLANS_CSV = os.path.join("data", "insurance_plans.csv")
+FORMULARY_CSV = os.path.join("data", "formulary.csv")
+
+# Plan used for patients paying cash
+SELF_PAY_PLAN = "None / Self-pay"
+
+# Formulary tiers run from 1 (preferred generic) to MAX_TIER; tier 0 means not covered
+MAX_TIER = 4
+NOT_COVERED = 0
+
+# Built-in cost sharing per plan: tier -> (copay in USD, coinsurance fraction).
+# Tiers missing from a plan are not covered by it.
+DEFAULT_PLANS = {
+    SELF_PAY_PLAN: {},
+    "Limited": {1: (15.0, 0.0), 2: (0.0, 0.5)},
+    "Some": {1: (10.0, 0.0), 2: (30.0, 0.0), 3: (0.0, 0.4)},
+    "Most": {1: (5.0, 0.0), 2: (20.0, 0.0), 3: (40.0, 0.0), 4: (0.0, 0.25)},
+    "Medicare": {1: (0.0, 0.0), 2: (10.0, 0.0), 3: (45.0, 0.0), 4: (0.0, 0.25)},
+    "Medicaid": {1: (1.0, 0.0), 2: (4.0, 0.0), 3: (4.0, 0.0)},
+    "Blue Cross Blue Shield": {1: (10.0, 0.0), 2: (35.0, 0.0), 3: (60.0, 0.0), 4: (0.0, 0.3)},
+    "Aetna": {1: (10.0, 0.0), 2: (40.0, 0.0), 3: (70.0, 0.0), 4: (0.0, 0.3)},
+    "Cigna": {1: (10.0, 0.0), 2: (35.0, 0.0), 3: (65.0, 0.0), 4: (0.0, 0.3)},
+    "UnitedHealthcare": {1: (5.0, 0.0), 2: (35.0, 0.0), 3: (70.0, 0.0), 4: (0.0, 0.3)},
+    "Humana": {1: (5.0, 0.0), 2: (30.0, 0.0), 3: (60.0, 0.0), 4: (0.0, 0.25)},
+    "Kaiser Permanente": {1: (10.0, 0.0), 2: (30.0, 0.0), 3: (50.0, 0.0)},
+    "Other": {1: (10.0, 0.0), 2: (35.0, 0.0), 3: (0.0, 0.4)},
+}
+
+# Other spellings of plan names used across the apps
+PLAN_ALIASES = {
+    "none/self-pay": SELF_PAY_PLAN,
+    "none": SELF_PAY_PLAN,
+    "self-pay": SELF_PAY_PLAN,
+    "": SELF_PAY_PLAN,
+}
+
+# Default formulary tier from a medication's 'Insurance Coverage' level (simplified catalog)
+COVERAGE_TIERS = {"Most": 1, "Some": 2, "Limited": 3, "None": NOT_COVERED}
+
+# How widely each 'Insurance Coverage' level is covered
+COVERAGE_SUMMARIES = {
+    "Most": "Most plans cover this medication",
+    "Some": "Some plans offer partial coverage",
+    "Limited": "Only a few plans cover this drug",
+    "None": "This medication is not covered",
+}
+
+# Default formulary tiers from brand status (full catalog)
+GENERIC_TIER = 1
+BRAND_TIER = 3
+
+
+class PlanTable:
+    """
+    Cost sharing for every plan as (plans x tiers) NumPy arrays.
+
+    Out-of-pocket cost for a candidate is min(price, copay + coinsurance * price)
+    on a covered tier and the full price otherwise, so pricing many candidates
+    under many plans is one broadcast expression.
+    """
+
+    def __init__(self, plans: Dict[str, Dict[int, Tuple[float, float]]], formulary: Optional[pd.DataFrame] = None):
+        self.plans = list(plans)
+        self.plan_index = {name: i for i, name in enumerate(self.plans)}
+        self.copay = np.zeros((len(self.plans), MAX_TIER + 1))
+        self.coinsurance = np.ones((len(self.plans), MAX_TIER + 1))
+        self.covered = np.zeros((len(self.plans), MAX_TIER + 1), dtype=bool)
+
+        for i, tiers in enumerate(plans.values()):
+            for tier, (copay, coinsurance) in tiers.items():
+                if 1 <= tier <= MAX_TIER:
+                    self.copay[i, tier] = copay
+                    self.coinsurance[i, tier] = coinsurance
+                    self.covered[i, tier] = True
+
+        # Per-plan formulary overrides: lowercase medication name -> tier
+        self.formulary: Dict[str, pd.Series] = {}
+        if formulary is not None and not formulary.empty:
+            formulary = formulary.assign(medication=formulary['medication'].astype(str).str.lower())
+            for plan, group in formulary.groupby('plan'):
+                entries = group.drop_duplicates('medication', keep='last')
+                self.formulary[resolve_plan_name(plan)] = pd.Series(
+                    entries['tier'].to_numpy(dtype=int), index=pd.Index(entries['medication'])
+                )
+
+    def plan_row(self, plan: str) -> int:
+        return self.plan_index.get(resolve_plan_name(plan), self.plan_index[SELF_PAY_PLAN])
+
+    def tiers_for(self, plan: str, names: Sequence[str], default_tiers: np.ndarray) -> np.ndarray:
+        """Apply a plan's formulary overrides to the default tiers."""
+        overrides = self.formulary.get(resolve_plan_name(plan))
+        if overrides is None:
+            return default_tiers
+
+        positions = overrides.index.get_indexer([str(name).lower() for name in names])
+        listed = positions >= 0
+        return np.where(listed, overrides.to_numpy()[np.where(listed, positions, 0)], default_tiers)
+
+    def out_of_pocket(self, costs: np.ndarray, tiers: np.ndarray, plan_rows: np.ndarray) -> np.ndarray:
+        """
+        Patient cost for each (plan, candidate) pair.
+
+        Args:
+            costs: Price of each candidate, shape (n,)
+            tiers: Formulary tier of each candidate, shape (n,) or (plans, n)
+            plan_rows: Plan row indexes, shape (plans,)
+
+        Returns:
+            Array of shape (plans, n)
+        """
+        rows = plan_rows[:, None]
+        tiers = np.clip(np.broadcast_to(tiers, (len(plan_rows), len(costs))), 0, MAX_TIER)
+
+        copay = self.copay[rows, tiers]
+        coinsurance = self.coinsurance[rows, tiers]
+        covered = self.covered[rows, tiers]
+
+        shared = np.minimum(costs, copay + coinsurance * costs)
+        return np.where(covered, shared, costs)
+
+
+def resolve_plan_name(plan: Optional[str]) -> str:
+    """Map the insurance values used by the apps onto plan names."""
+    if plan is None:
+        return SELF_PAY_PLAN
+    plan = str(plan).strip()
+    return PLAN_ALIASES.get(plan.lower(), plan)
+
+
+def load_plans(path: str = INSURANCE_PLANS_CSV) -> Dict[str, Dict[int, Tuple[float, float]]]:
+    """
+    Load plan cost sharing, overlaying an optional CSV on the built-in plans.
+
+    The CSV has one row per covered tier: plan, tier, copay, coinsurance.
+
+    Returns:
+        Dictionary mapping plan name to {tier: (copay, coinsurance)}
+    """
+    plans = {name: dict(tiers) for name, tiers in DEFAULT_PLANS.items()}
+
+    try:
+        if os.path.exists(path):
+            df = pd.read_csv(path)
+            for plan, group in df.groupby('plan', sort=False):
+                plans[resolve_plan_name(plan)] = {
+                    int(row['tier']): (float(row['copay']), float(row['coinsurance']))
+                    for _, row in group.iterrows()
+                }
+    except Exception as e:
+        print(f"Error loading insurance plans: {e}")
+
+    return plans
+
+
+def load_formulary(path: str = FORMULARY_CSV) -> pd.DataFrame:
+    """
+    Load plan formulary tiers (plan, medication, tier); empty if not provided.
+    """
+    try:
+        if os.path.exists(path):
+            return pd.read_csv(path)
+    except Exception as e:
+        print(f"Error loading formulary: {e}")
+    return pd.DataFrame(columns=['plan', 'medication', 'tier'])
+
+
+_table: Optional[PlanTable] = None
+_table_key: Optional[Tuple] = None
+_table_lock = threading.Lock()
+
+
+def get_plan_table() -> PlanTable:
+    """Get the shared plan table, rebuilding it when the plan or formulary files change."""
+    global _table, _table_key
+
+    key = tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in (INSURANCE_PLANS_CSV, FORMULARY_CSV))
+    if _table is not None and key == _table_key:
+        return _table
+
+    with _table_lock:
+        if _table is None or key != _table_key:
+            _table = PlanTable(load_plans(), load_formulary())
+            _table_key = key
+        return _table
+
+
+def default_tiers(medications: List[Dict]) -> np.ndarray:
+    """
+    Default formulary tier for each medication record.
+
+    Uses the 'Insurance Coverage' level when the record has one, otherwise
+    generics go on the preferred tier and brands on the non-preferred tier.
+    Records with neither (e.g. supplements) are not covered.
+    """
+    tiers = np.full(len(medications), NOT_COVERED, dtype=int)
+    for i, med in enumerate(medications):
+        if 'Insurance Coverage' in med:
+            tiers[i] = COVERAGE_TIERS.get(str(med['Insurance Coverage']).strip(), NOT_COVERED)
+        elif 'is_brand' in med:
+            tiers[i] = BRAND_TIER if med['is_brand'] else GENERIC_TIER
+    return tiers
+
+
+def get_patient_costs(
+    medications: List[Dict],
+    plan: str,
+    costs: Optional[Sequence[float]] = None,
+    name_key: str = 'name',
+    cost_key: str = 'avg_cost'
+) -> np.ndarray:
+    """
+    Out-of-pocket monthly cost of each medication under one plan.
+
+    Args:
+        medications: Medication dictionaries
+        plan: Insurance plan or coverage level selected by the user
+        costs: Prices to use instead of the records' cost_key (e.g. pharmacy prices)
+        name_key: Key holding the medication name
+        cost_key: Key holding the price
+
+    Returns:
+        Array of patient costs, one per medication
+    """
+    if not medications:
+        return np.empty(0)
+
+    table = get_plan_table()
+    prices = np.asarray(costs if costs is not None else [med[cost_key] for med in medications], dtype=float)
+    names = [med.get(name_key, '') for med in medications]
+    tiers = table.tiers_for(plan, names, default_tiers(medications))
+
+    return table.out_of_pocket(prices, tiers, np.array([table.plan_row(plan)]))[0]
+
+
+def compare_plans(
+    medications: List[Dict],
+    plans: Optional[List[str]] = None,
+    costs: Optional[Sequence[float]] = None,
+    name_key: str = 'name',
+    cost_key: str = 'avg_cost'
+) -> pd.DataFrame:
+    """
+    Out-of-pocket cost of every medication under every plan.
+
+    Args:
+        medications: Medication dictionaries
+        plans: Plans to evaluate (defaults to every known plan)
+        costs: Prices to use instead of the records' cost_key
+        name_key: Key holding the medication name
+        cost_key: Key holding the price
+
+    Returns:
+        DataFrame indexed by plan with one column per medication
+    """
+    table = get_plan_table()
+    plans = plans or table.plans
+    prices = np.asarray(costs if costs is not None else [med[cost_key] for med in medications], dtype=float)
+    names = [med.get(name_key, '') for med in medications]
+    base_tiers = default_tiers(medications)
+
+    tiers = np.stack([table.tiers_for(plan, names, base_tiers) for plan in plans]) if plans else base_tiers
+    rows = np.array([table.plan_row(plan) for plan in plans])
+
+    return pd.DataFrame(table.out_of_pocket(prices, tiers, rows), index=plans, columns=names)
+
+
+def describe_cost_sharing(coverage_level: str) -> str:
+    """
+    Summarize what insured patients typically pay for a coverage level.
+
+    Args:
+        coverage_level: A medication's 'Insurance Coverage' level
+
+    Returns:
+        Short text such as "$5-$35 copay or 25-40% coinsurance", or "" if not covered
+    """
+    tier = COVERAGE_TIERS.get(str(coverage_level).strip(), NOT_COVERED)
+    if tier == NOT_COVERED:
+        return ""
+
+    table = get_plan_table()
+    covered = table.covered[:, tier]
+    copays = table.copay[covered, tier][table.coinsurance[covered, tier] == 0]
+    coinsurance = table.coinsurance[covered, tier][table.coinsurance[covered, tier] > 0]
+
+    parts = []
+    if copays.size:
+        low, high = copays.min(), copays.max()
+        parts.append(f"${low:.0f} copay" if low == high else f"${low:.0f}-${high:.0f} copay")
+    if coinsurance.size:
+        low, high = coinsurance.min() * 100, coinsurance.max() * 100
+        parts.append(f"{low:.0f}% coinsurance" if low == high else f"{low:.0f}-{high:.0f}% coinsurance")
+
+    return " or ".join(parts)
+
+
+def describe_patient_cost(cost: float, coverage_level: str, plan: str, name: str = '') -> str:
+    """
+    Markdown line explaining what the patient pays for a medication.
+
+    Insured patients see their plan's out-of-pocket cost. Self-pay patients
+    see the full price next to the range the known plans would charge.
+
+    Args:
+        cost: Monthly cash price
+        coverage_level: The medication's 'Insurance Coverage' level
+        plan: Insurance plan or coverage level selected by the user
+        name: Medication name, used for formulary overrides
+
+    Returns:
+        Markdown text starting with "**Insurance Coverage:**"
+    """
+    summary = COVERAGE_SUMMARIES.get(str(coverage_level).strip(), COVERAGE_SUMMARIES["None"])
+    record = {'name': name, 'Insurance Coverage': coverage_level}
+    plan = resolve_plan_name(plan)
+
+    if plan != SELF_PAY_PLAN:
+        patient_cost = get_patient_costs([record], plan, costs=[cost])[0]
+        if patient_cost < cost:
+            return (f"**Insurance Coverage:** {summary}. Under your plan ({plan}) you pay about "
+                    f"**\\${patient_cost:.2f} per month** (\\${cost - patient_cost:.2f} less than the cash price).")
+        return (f"**Insurance Coverage:** {summary}. Your {plan} coverage does not lower the cost; "
+                f"expect to pay about **\\${cost:.2f}** out of pocket.")
+
+    insured_plans = [p for p in get_plan_table().plans if p != SELF_PAY_PLAN]
+    plan_costs = compare_plans([record], insured_plans, costs=[cost]).iloc[:, 0]
+    if plan_costs.min() >= cost:
+        return f"**Insurance Coverage:** {summary}. Expect to pay the full price out of pocket."
+
+    return (f"**Insurance Coverage:** {summary}. Insured patients typically pay "
+            f"**\\${plan_costs.min():.2f}–\\${plan_costs.max():.2f}** per month instead of \\${cost:.2f}.")
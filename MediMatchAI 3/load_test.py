@@ -0,0 +1,586 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from api_server import DEFAULT_HOST, DEFAULT_PORT
+
+# Request mix: (weight, method, path, body); {med} is replaced by a random medication
+DEFAULT_MIX = [
+    (40, "GET", "/api/medication?name={med}", None),
+    (10, "GET", "/api/medication?name={med}&catalog=simple", None),
+    (10, "GET", "/api/search?q={med}&limit=10", None),
+    (25, "POST", "/api/recommendations", {'medication': "{med}", 'insurance': "Aetna"}),
+    (10, "POST", "/api/alternatives", {'medication': "{med}", 'insurance': "Most"}),
+    (5, "POST", "/api/assistant", {'question': "Can I drink alcohol with this?", 'medication': "{med}"}),
+]
+
+DEFAULT_MEDICATIONS = ["Lipitor", "Atorvastatin", "Crestor", "Zoloft", "Sertraline", "Nexium",
+                       "Omeprazole", "Advil", "Ibuprofen", "Metformin"]
+
+# Questions every simulated user asks the assistant about their best alternative
+SESSION_QUESTIONS = [
+    "What's the difference between this and the alternative?",
+    "How much can I save with the cheaper option?",
+    "Can I drink alcohol with this medication?",
+]
+
+# Insurance each simulated user picks in the full app and in the simplified app
+SESSION_INSURANCE = "Aetna"
+SESSION_COVERAGE = "Most"
+
+# Name columns renamed in each copy of a synthetic catalog, and columns listing other medications
+SYNTHETIC_NAME_COLUMNS = {
+    'medications.csv': ['name', 'brand_equivalent'],
+    'medications_simple.csv': ['Medication Name', 'Generic Name'],
+}
+SYNTHETIC_LIST_COLUMNS = {
+    'medications_simple.csv': ['Alternatives'],
+}
+
+# Seconds to wait for a locally started server to accept requests
+SERVER_START_TIMEOUT = 60
+
+
+def _render(template, medication: str):
+    if isinstance(template, str):
+        return template.replace("{med}", medication)
+    if isinstance(template, dict):
+        return {k: _render(v, medication) for k, v in template.items()}
+    return template
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 client connection."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: Optional[Dict] = None) -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        payload = json.dumps(body).encode() if body is not None else b""
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "\r\n"
+        )
+        self.writer.write(head.encode() + payload)
+        await self.writer.drain()
+
+        response_head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = response_head.decode('latin-1').split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        length = 0
+        for line in lines[1:]:
+            if line.lower().startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+        return status, await self.reader.readexactly(length)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+async def run_load_test(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    requests: int = 20000,
+    concurrency: int = 64,
+    medications: Optional[List[str]] = None,
+    mix: Optional[List] = None,
+    seed: int = 0
+) -> Dict:
+    """
+    Send a mixed workload to a running API server and measure it.
+
+    Args:
+        host: Server host
+        port: Server port
+        requests: Total number of requests to send
+        concurrency: Number of concurrent keep-alive connections
+        medications: Medication names to query
+        mix: Weighted request templates (defaults to DEFAULT_MIX)
+        seed: Random seed for the request sequence
+
+    Returns:
+        Dictionary with throughput, latency percentiles (ms) and status counts
+    """
+    medications = medications or DEFAULT_MEDICATIONS
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    templates = rng.choices(mix, weights=[entry[0] for entry in mix], k=requests)
+    plan = [(method, _render(path, med), _render(body, med))
+            for (_, method, path, body), med in zip(templates, rng.choices(medications, k=requests))]
+
+    latencies = np.zeros(requests)
+    statuses: Dict[int, int] = {}
+    errors = 0
+    next_index = 0
+
+    async def client():
+        nonlocal next_index, errors
+        connection = Connection(host, port)
+        try:
+            while next_index < requests:
+                i = next_index
+                next_index += 1
+                method, path, body = plan[i]
+                start = time.perf_counter()
+                try:
+                    status, _ = await connection.request(method, path, body)
+                    statuses[status] = statuses.get(status, 0) + 1
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    errors += 1
+                    connection.close()
+                latencies[i] = time.perf_counter() - start
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = latencies * 1000
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'elapsed_seconds': elapsed,
+        'requests_per_second': requests / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'p50': float(np.percentile(latencies_ms, 50)),
+            'p90': float(np.percentile(latencies_ms, 90)),
+            'p99': float(np.percentile(latencies_ms, 99)),
+            'max': float(latencies_ms.max()),
+        },
+        'statuses': statuses,
+        'errors': errors,
+    }
+
+
+def _percentiles(latencies_ms) -> Dict:
+    latencies_ms = np.asarray(latencies_ms, dtype=float)
+    if not latencies_ms.size:
+        return {'count': 0, 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+    return {
+        'count': int(latencies_ms.size),
+        'p50': float(np.percentile(latencies_ms, 50)),
+        'p90': float(np.percentile(latencies_ms, 90)),
+        'p99': float(np.percentile(latencies_ms, 99)),
+        'max': float(latencies_ms.max()),
+    }
+
+
+def _process_rss(pid: Optional[int] = None) -> Optional[int]:
+    """Resident memory of a process and its child processes in bytes (None where /proc is unavailable)."""
+    pid = pid or os.getpid()
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            rss = next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmRSS:"))
+    except (OSError, StopIteration, ValueError):
+        return None
+
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            child_pids = [int(child) for child in children.read().split()]
+    except OSError:
+        child_pids = []
+    for child in child_pids:
+        rss += _process_rss(child) or 0
+    return rss
+
+
+def _memory_report(before: Optional[int], after: Optional[int]) -> Dict:
+    return {
+        'rss_before_mb': before / 2**20 if before is not None else None,
+        'rss_after_mb': after / 2**20 if after is not None else None,
+        'growth_mb': (after - before) / 2**20 if before is not None and after is not None else None,
+    }
+
+
+def _rename(values: pd.Series, suffix: str) -> pd.Series:
+    return values.where(values.isna() | (values.astype(str).str.len() == 0), values.astype(str) + suffix)
+
+
+def write_synthetic_catalog(size: int, directory: Optional[str] = None, source: str = ".", seed: int = 0) -> str:
+    """
+    Write a working directory whose catalogs hold `size` medications.
+
+    The source catalogs are repeated with numbered copies of every name
+    (" 2", " 3", ...), including the names inside alternatives lists, so each
+    copy keeps the structure of the real catalog. The first copy keeps the
+    original names, so the default medications still resolve. Every other
+    data file is copied unchanged.
+
+    Args:
+        size: Rows per catalog
+        directory: Working directory to create (a new temporary directory by default)
+        source: Working directory holding the source data/ directory
+        seed: Random seed for the per-copy price variation
+
+    Returns:
+        The working directory
+    """
+    directory = directory or tempfile.mkdtemp(prefix="medimatch-load-")
+    source_data = os.path.join(source, "data")
+    target_data = os.path.join(directory, "data")
+    os.makedirs(target_data, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    for file_name in sorted(os.listdir(source_data)) if os.path.isdir(source_data) else []:
+        source_path = os.path.join(source_data, file_name)
+        target_path = os.path.join(target_data, file_name)
+        if file_name not in SYNTHETIC_NAME_COLUMNS:
+            if os.path.isfile(source_path) and file_name.endswith(".csv"):
+                shutil.copyfile(source_path, target_path)
+            continue
+
+        base = pd.read_csv(source_path)
+        if base.empty:
+            base.to_csv(target_path, index=False)
+            continue
+
+        copies = []
+        for copy in range(-(-size // len(base))):
+            df = base.copy()
+            if copy:
+                suffix = f" {copy + 1}"
+                for column in SYNTHETIC_NAME_COLUMNS[file_name]:
+                    if column in df.columns:
+                        df[column] = _rename(df[column], suffix)
+                for column in SYNTHETIC_LIST_COLUMNS.get(file_name, []):
+                    if column in df.columns:
+                        df[column] = df[column].map(
+                            lambda names: ", ".join(name.strip() + suffix for name in names.split(",") if name.strip())
+                            if isinstance(names, str) else names
+                        )
+                for column in ('avg_cost', 'Avg Cost (USD)'):
+                    if column in df.columns:
+                        df[column] = (df[column] * rng.uniform(0.8, 1.2, len(df))).round(2)
+            copies.append(df)
+        pd.concat(copies, ignore_index=True).head(size).to_csv(target_path, index=False)
+
+    return directory
+
+
+class _Recorder:
+    """Thread-safe per-step latency collector."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[int, int] = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, step: str, seconds: float, status: Optional[int] = None):
+        with self._lock:
+            self.latencies.setdefault(step, []).append(seconds * 1000)
+            if status is not None:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def report(self) -> Dict[str, Dict]:
+        return {step: _percentiles(latencies) for step, latencies in self.latencies.items()}
+
+
+def _session_report(recorder: _Recorder, sessions: int, concurrency: int, elapsed: float, memory: Dict) -> Dict:
+    latency = recorder.report()
+    requests = sum(stats['count'] for step, stats in latency.items() if step != 'session')
+    return {
+        'sessions': sessions,
+        'concurrency': concurrency,
+        'elapsed_seconds': elapsed,
+        'sessions_per_second': sessions / elapsed if elapsed > 0 else 0.0,
+        'requests_per_second': requests / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': latency,
+        'statuses': recorder.statuses,
+        'errors': recorder.errors,
+        'memory': memory,
+    }
+
+
+def run_engine_sessions(
+    sessions: int = 200,
+    concurrency: int = 16,
+    medications: Optional[List[str]] = None,
+    seed: int = 0
+) -> Dict:
+    """
+    Replay user sessions against the engine functions in this process.
+
+    Each session searches a medication, gets recommendations, finds
+    alternatives in the simplified catalog, asks the assistant three
+    questions and downloads the PDF report, as a user of the apps would.
+
+    Args:
+        sessions: Number of sessions to run
+        concurrency: Sessions running at once (one thread each)
+        medications: Medication names to search
+        seed: Random seed for the medications searched
+
+    Returns:
+        Dictionary with throughput, per-step latency percentiles (ms),
+        errors and memory growth of this process
+    """
+    import medication_db
+    import simple_db
+    from pdf_generator import generate_pdf
+    from recommendation_engine import generate_recommendations
+    from simple_assistant import SimpleAssistant
+
+    assistant = SimpleAssistant()
+    rng = random.Random(seed)
+    plan = rng.choices(medications or DEFAULT_MEDICATIONS, k=sessions)
+    recorder = _Recorder()
+
+    def timed(step: str, func: Callable, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        recorder.add(step, time.perf_counter() - start)
+        return result
+
+    def session(medication: str):
+        start = time.perf_counter()
+        try:
+            med_info = timed('search', medication_db.get_medication_info, medication)
+            recommendations = timed('recommendations', generate_recommendations, medication, None, SESSION_INSURANCE)
+            simple_info = simple_db.get_medication_info(medication)
+            alternatives = timed('alternatives', simple_db.find_alternatives, simple_info, None, SESSION_COVERAGE) \
+                if simple_info else []
+            for question in SESSION_QUESTIONS:
+                timed('assistant', assistant.answer_question, question, simple_info, alternatives[0] if alternatives else None)
+            if med_info:
+                timed('pdf', generate_pdf, medication, med_info, recommendations, SESSION_INSURANCE, None)
+        except Exception as e:
+            print(f"Error in session for {medication}: {e}")
+            recorder.error()
+        recorder.add('session', time.perf_counter() - start)
+
+    # Load the catalogs before measuring, as a running app would have
+    medication_db.get_catalog()
+    simple_db.get_catalog()
+
+    rss_before = _process_rss()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(session, plan))
+    elapsed = time.perf_counter() - start
+
+    return _session_report(recorder, sessions, concurrency, elapsed, _memory_report(rss_before, _process_rss()))
+
+
+async def run_server_sessions(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    sessions: int = 200,
+    concurrency: int = 16,
+    medications: Optional[List[str]] = None,
+    seed: int = 0,
+    server_pid: Optional[int] = None
+) -> Dict:
+    """
+    Replay user sessions against a running API server.
+
+    Sessions follow the same flow as `run_engine_sessions`, each over its
+    own keep-alive connection.
+
+    Args:
+        host: Server host
+        port: Server port
+        sessions: Number of sessions to run
+        concurrency: Sessions running at once
+        medications: Medication names to search
+        seed: Random seed for the medications searched
+        server_pid: Server process to measure memory growth of (when it runs on this host)
+
+    Returns:
+        Dictionary with throughput, per-step latency percentiles (ms),
+        status counts, connection errors and the server's memory growth
+    """
+    rng = random.Random(seed)
+    plan = rng.choices(medications or DEFAULT_MEDICATIONS, k=sessions)
+    recorder = _Recorder()
+    next_session = 0
+
+    async def timed(connection: Connection, step: str, method: str, path: str, body: Optional[Dict] = None):
+        start = time.perf_counter()
+        status, payload = await connection.request(method, path, body)
+        recorder.add(step, time.perf_counter() - start, status)
+        return status, payload
+
+    async def session(connection: Connection, medication: str):
+        start = time.perf_counter()
+        try:
+            await timed(connection, 'search', "GET", f"/api/medication?name={quote(medication)}")
+            await timed(connection, 'recommendations', "POST", "/api/recommendations",
+                        {'medication': medication, 'insurance': SESSION_INSURANCE})
+            status, payload = await timed(connection, 'alternatives', "POST", "/api/alternatives",
+                                          {'medication': medication, 'insurance': SESSION_COVERAGE})
+            alternatives = json.loads(payload).get('alternatives', []) if status == 200 else []
+            alternative = alternatives[0]['name'] if alternatives else None
+            for question in SESSION_QUESTIONS:
+                await timed(connection, 'assistant', "POST", "/api/assistant",
+                            {'question': question, 'medication': medication, 'alternative': alternative})
+            await timed(connection, 'pdf', "POST", "/api/pdf", {'medication': medication, 'insurance': SESSION_INSURANCE})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            recorder.error()
+            connection.close()
+        recorder.add('session', time.perf_counter() - start)
+
+    async def user():
+        nonlocal next_session
+        connection = Connection(host, port)
+        try:
+            while next_session < sessions:
+                medication = plan[next_session]
+                next_session += 1
+                await session(connection, medication)
+        finally:
+            connection.close()
+
+    rss_before = _process_rss(server_pid) if server_pid else None
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    rss_after = _process_rss(server_pid) if server_pid else None
+
+    return _session_report(recorder, sessions, concurrency, elapsed, _memory_report(rss_before, rss_after))
+
+
+def start_server(port: int = DEFAULT_PORT, workdir: str = ".", processes: int = 1) -> subprocess.Popen:
+    """
+    Start the API server in a subprocess and wait until it answers.
+
+    Args:
+        port: Port for the server
+        workdir: Working directory holding the server's data/ directory
+        processes: Server processes
+
+    Returns:
+        The server process (terminate it when done)
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "api_server.py")
+    server = subprocess.Popen(
+        [sys.executable, script, "--port", str(port), "--processes", str(processes)],
+        cwd=workdir
+    )
+
+    async def wait_ready():
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"API server exited with code {server.returncode}")
+            connection = Connection(DEFAULT_HOST, port)
+            try:
+                status, _ = await connection.request("GET", "/health")
+                if status == 200:
+                    return
+            except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                await asyncio.sleep(0.2)
+            finally:
+                connection.close()
+        raise RuntimeError(f"API server did not start within {SERVER_START_TIMEOUT}s")
+
+    try:
+        asyncio.run(wait_ready())
+    except BaseException:
+        server.terminate()
+        raise
+    return server
+
+
+def _print_session_report(stats: Dict):
+    print(f"{stats['sessions']:,} sessions with {stats['concurrency']} concurrent users in "
+          f"{stats['elapsed_seconds']:.2f}s: {stats['sessions_per_second']:,.1f} sessions/second, "
+          f"{stats['requests_per_second']:,.0f} requests/second")
+    for step, latency in stats['latency_ms'].items():
+        print(f"  {step:<16} n={latency['count']:<7,} p50 {latency['p50']:.1f}ms, p90 {latency['p90']:.1f}ms, "
+              f"p99 {latency['p99']:.1f}ms, max {latency['max']:.1f}ms")
+    if stats['statuses']:
+        print(f"Statuses {stats['statuses']}")
+    print(f"Errors {stats['errors']}")
+    memory = stats['memory']
+    if memory['growth_mb'] is not None:
+        print(f"Memory {memory['rss_before_mb']:.1f}MB -> {memory['rss_after_mb']:.1f}MB "
+              f"({memory['growth_mb']:+.1f}MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the MediMatch AI JSON API.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Server host")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Server port")
+    parser.add_argument("--requests", type=int, default=20000, help="Total requests to send")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent connections")
+    parser.add_argument("--min-rps", type=float, default=0, help="Exit with an error below this throughput")
+    parser.add_argument("--sessions", type=int, default=0,
+                        help="Replay this many user sessions (search, alternatives, 3 questions, PDF) "
+                             "instead of the request mix")
+    parser.add_argument("--engine", action="store_true",
+                        help="Drive the sessions against the engine functions in this process instead of a server")
+    parser.add_argument("--start-server", action="store_true", help="Start a local API server for the test")
+    parser.add_argument("--server-processes", type=int, default=1, help="Processes for --start-server")
+    parser.add_argument("--catalog-size", type=int, default=0,
+                        help="Run against a synthetic catalog of this many medications")
+    parser.add_argument("--workdir", help="Directory for the synthetic catalog (temporary by default)")
+    args = parser.parse_args()
+
+    workdir = "."
+    if args.catalog_size:
+        workdir = write_synthetic_catalog(args.catalog_size, args.workdir)
+        print(f"Synthetic catalog of {args.catalog_size:,} medications in {workdir}")
+
+    if args.engine:
+        # The catalogs are read from data/ relative to the working directory
+        os.chdir(workdir)
+        stats = run_engine_sessions(args.sessions or 200, args.concurrency)
+        _print_session_report(stats)
+        rate, unit = stats['requests_per_second'], "requests/second"
+    else:
+        server = start_server(args.port, workdir, args.server_processes) if args.start_server else None
+        try:
+            if args.sessions:
+                stats = asyncio.run(run_server_sessions(
+                    args.host, args.port, args.sessions, args.concurrency,
+                    server_pid=server.pid if server else None
+                ))
+                _print_session_report(stats)
+            else:
+                stats = asyncio.run(run_load_test(args.host, args.port, args.requests, args.concurrency))
+                latency = stats['latency_ms']
+
+                print(f"{stats['requests']:,} requests over {stats['concurrency']} connections in "
+                      f"{stats['elapsed_seconds']:.2f}s: {stats['requests_per_second']:,.0f} requests/second")
+                print(f"Latency p50 {latency['p50']:.1f}ms, p90 {latency['p90']:.1f}ms, "
+                      f"p99 {latency['p99']:.1f}ms, max {latency['max']:.1f}ms")
+                print(f"Statuses {stats['statuses']}, connection errors {stats['errors']}")
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+        rate, unit = stats['requests_per_second'], "requests/second"
+
+    if args.min_rps and rate < args.min_rps:
+        raise SystemExit(f"Throughput {rate:,.0f} {unit} is below {args.min_rps:,.0f}")
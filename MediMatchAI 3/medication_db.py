@@ -1,12 +1,43 @@
+import numpy as np
 import pandas as pd
 import os
 import re
-from typing import Dict, List, Optional, Union
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+import shared_catalog
+import sqlite_backend
+from catalog import Catalog, CatalogSwap, DELTAS_DIR, as_delta, build_catalog, save_delta, write_csv_atomic
+from compiled_catalog import CompiledCatalog, coerce_numeric
 
 # Data file paths
 MEDICATIONS_CSV = os.path.join("data", "medications.csv")
 DRUG_CLASSES_CSV = os.path.join("data", "drug_classes.csv")
 
+# SQLite table holding the medications catalog when the SQLite backend is enabled
+MEDICATIONS_TABLE = "medications"
+
+# Persisted catalog deltas, replayed on top of the CSV whenever it is loaded
+MEDICATIONS_DELTAS_DIR = os.path.join(DELTAS_DIR, "medications")
+
+# Columns covered by full-text search
+MEDICATIONS_TEXT_COLUMNS = ['name', 'description', 'side_effects']
+
+# Comma-separated and numeric columns parsed once per catalog version, and plain columns kept with them
+MEDICATIONS_LIST_COLUMNS = ['side_effects', 'interactions']
+MEDICATIONS_NUMERIC_COLUMNS = ['avg_cost']
+MEDICATIONS_VALUE_COLUMNS = ['drug_class', 'is_brand', 'brand_equivalent']
+
+# Guards the caches derived from the catalog
+_catalog_lock = threading.RLock()
+
+# Parsed catalog fields, rebuilt only when the catalog or its version changes
+_compiled: Optional[CompiledCatalog] = None
+_compiled_key: Optional[tuple] = None
+
+# Brand/generic pair maps, rebuilt only when the catalog or its version changes
+_pairs_cache: Dict[str, Dict[str, str]] = {}
+_pairs_key: Optional[tuple] = None
+
 def load_medications() -> pd.DataFrame:
     """
     Load the medications database from CSV.
@@ -145,9 +176,9 @@ def load_medications() -> pd.DataFrame:
                 ]
             }
             
-            # Create and save the dataframe
+            # Create and save the dataframe (atomically, since other threads may be reading the file)
             df = pd.DataFrame(data)
-            df.to_csv(MEDICATIONS_CSV, index=False)
+            write_csv_atomic(df, MEDICATIONS_CSV)
         
         # Load drug classes if file doesn't exist
         if not os.path.exists(DRUG_CLASSES_CSV):
@@ -190,12 +221,12 @@ def load_medications() -> pd.DataFrame:
                 ]
             }
             
-            # Create and save the dataframe
+            # Create and save the dataframe (atomically, since other threads may be reading the file)
             class_df = pd.DataFrame(class_data)
-            class_df.to_csv(DRUG_CLASSES_CSV, index=False)
+            write_csv_atomic(class_df, DRUG_CLASSES_CSV)
             
         # Load medications data
-        return pd.read_csv(MEDICATIONS_CSV)
+        return coerce_numeric(pd.read_csv(MEDICATIONS_CSV), MEDICATIONS_NUMERIC_COLUMNS, MEDICATIONS_CSV)
     
     except Exception as e:
         print(f"Error loading medications database: {e}")
@@ -213,31 +244,138 @@ def load_drug_classes() -> pd.DataFrame:
         # Return an empty DataFrame as fallback
         return pd.DataFrame(columns=['class_name', 'full_name', 'description', 'common_uses'])
 
-def get_medication_info(medication_name: str) -> Optional[Dict]:
+
+def get_sqlite_catalog() -> Optional[sqlite_backend.SqliteCatalog]:
     """
-    Get information about a specific medication.
+    Get the SQLite-backed medications catalog if the backend is enabled.
     
-    Args:
-        medication_name: Name of the medication to look up
-        
     Returns:
-        Dictionary with medication information or None if not found
+        SqliteCatalog or None when lookups should use the in-memory catalog
     """
+    if not sqlite_backend.is_enabled():
+        return None
+    
+    # Make sure the sample data exists before the table is built from it
+    if not os.path.exists(MEDICATIONS_CSV):
+        load_medications()
+    
+    return sqlite_backend.get_catalog(
+        MEDICATIONS_TABLE,
+        MEDICATIONS_CSV,
+        name_column='name',
+        class_column='drug_class',
+        generic_column='brand_equivalent',
+        text_columns=MEDICATIONS_TEXT_COLUMNS,
+        deltas_dir=MEDICATIONS_DELTAS_DIR
+    )
+
+def _build_catalog() -> Catalog:
+    """Build the in-memory medications catalog from the CSV and any persisted deltas."""
     df = load_medications()
+    return build_catalog(
+        df,
+        name_column='name',
+        class_column='drug_class',
+        generic_column='brand_equivalent',
+        text_columns=MEDICATIONS_TEXT_COLUMNS,
+        deltas_dir=MEDICATIONS_DELTAS_DIR
+    )
+
+# In-memory catalog shared by every lookup in this process
+_catalog_swap = CatalogSwap(_build_catalog, MEDICATIONS_CSV)
+
+def get_shared_catalog() -> Optional[shared_catalog.SharedCatalog]:
+    """
+    Get the medications catalog shared by every process on this host, if enabled.
     
-    # Case-insensitive search for exact match
-    medication = df[df['name'].str.lower() == medication_name.lower()]
+    The first process to need it (or the first after the CSV changes) builds
+    and publishes it; the others attach the published copy read-only.
     
-    if not medication.empty:
-        return medication.iloc[0].to_dict()
+    Returns:
+        SharedCatalog or None when the shared catalog is not enabled
+    """
+    if not shared_catalog.is_enabled():
+        return None
     
-    # If no exact match, try partial matching
-    medication = df[df['name'].str.lower().str.contains(medication_name.lower())]
+    if not os.path.exists(MEDICATIONS_CSV):
+        load_medications()  # Creates the sample data
     
-    if not medication.empty:
-        return medication.iloc[0].to_dict()
+    return shared_catalog.get_shared_catalog(
+        MEDICATIONS_TABLE,
+        _build_catalog,
+        os.path.getmtime(MEDICATIONS_CSV) if os.path.exists(MEDICATIONS_CSV) else None
+    )
+
+def get_catalog() -> Union[Catalog, shared_catalog.SharedCatalog, sqlite_backend.SqliteCatalog]:
+    """
+    Get the medications catalog used for lookups.
     
-    return None
+    Returns the SQLite catalog when that backend is enabled, then the
+    host-wide shared catalog when that is enabled, otherwise an
+    in-memory catalog that is loaded once and only reloaded when the CSV
+    file changes. Price and other updates are applied with `apply_catalog_delta`.
+    
+    In-memory catalogs are immutable snapshots: reloads and deltas publish a
+    new catalog with an atomic swap (see `catalog.CatalogSwap`), so keep the
+    returned catalog for a consistent view across several lookups.
+    
+    Returns:
+        Catalog object
+    """
+    sqlite_catalog = get_sqlite_catalog()
+    if sqlite_catalog is not None:
+        return sqlite_catalog
+    
+    shared = get_shared_catalog()
+    if shared is not None:
+        return shared
+    
+    return _catalog_swap.get()
+
+def get_catalog_version() -> int:
+    """Return the version of the medications catalog (bumped by every delta)."""
+    return get_catalog().version
+
+def apply_catalog_delta(delta: Union[str, pd.DataFrame], persist: bool = False) -> Dict:
+    """
+    Apply a delta of upserts and deletes to the medications catalog.
+    
+    Args:
+        delta: Path to a delta CSV or a delta DataFrame (see `catalog.read_delta`)
+        persist: Also save the delta so it is replayed when the catalog is reloaded
+        
+    Returns:
+        Dictionary with the new catalog version and row counts
+    """
+    delta = as_delta(delta)
+    
+    if isinstance(get_catalog(), shared_catalog.SharedCatalog):
+        # Publish an updated copy that every process switches to
+        result = shared_catalog.apply_shared_delta(MEDICATIONS_TABLE, delta)
+    elif isinstance(get_catalog(), Catalog):
+        # Apply to a copy and swap it in, so readers never see a half-applied delta
+        result = _catalog_swap.apply_delta(delta)
+    else:
+        with _catalog_lock:
+            result = get_catalog().apply_delta(delta)
+    
+    if persist:
+        save_delta(delta, MEDICATIONS_DELTAS_DIR)
+    
+    return result
+
+def get_medication_info(medication_name: str) -> Optional[Dict]:
+    """
+    Get information about a specific medication.
+    
+    Args:
+        medication_name: Name of the medication to look up
+        
+    Returns:
+        Dictionary with medication information or None if not found
+    """
+    # Case-insensitive search for exact match, then partial matching
+    return get_catalog().find(medication_name)
 
 def get_medication_by_class(drug_class: str) -> List[Dict]:
     """
@@ -249,15 +387,8 @@ def get_medication_by_class(drug_class: str) -> List[Dict]:
     Returns:
         List of dictionaries with medication information
     """
-    df = load_medications()
-    
     # Case-insensitive search
-    medications = df[df['drug_class'].str.lower() == drug_class.lower()]
-    
-    if medications.empty:
-        return []
-    
-    return medications.to_dict('records')
+    return get_catalog().by_class(drug_class)
 
 def search_medications(query: str) -> List[Dict]:
     """
@@ -269,18 +400,90 @@ def search_medications(query: str) -> List[Dict]:
     Returns:
         List of dictionaries with medication information
     """
-    df = load_medications()
-    
     # Search in name or drug class (case-insensitive)
-    medications = df[
-        df['name'].str.lower().str.contains(query.lower()) |
-        df['drug_class'].str.lower().str.contains(query.lower())
+    return get_catalog().search(query)
+
+def search_medication_text(query: str, limit: int = 20) -> List[Dict]:
+    """
+    Full-text search over medication names, descriptions and side effects.
+    
+    Uses the FTS5 index when the SQLite backend is enabled, otherwise scans
+    the catalog for rows containing every search term.
+    
+    Args:
+        query: Free-text search terms
+        limit: Maximum number of results
+        
+    Returns:
+        List of dictionaries with medication information
+    """
+    return get_catalog().full_text_search(query, limit)
+
+def get_compiled_catalog() -> CompiledCatalog:
+    """
+    Get the catalog's comma-separated and numeric fields parsed once per catalog version.
+    
+    Only the compiled columns are read from the catalog, so this stays small
+    on the SQLite and shared-memory backends; full records are fetched by row
+    on demand (see `CompiledCatalog.records`).
+    
+    Returns:
+        CompiledCatalog (shared; do not modify)
+    """
+    global _compiled, _compiled_key
+    
+    catalog = get_catalog()
+    key = (id(catalog), catalog.version)
+    if _compiled is not None and key == _compiled_key:
+        return _compiled
+    
+    with _catalog_lock:
+        if _compiled is None or key != _compiled_key:
+            _compiled = CompiledCatalog(
+                catalog,
+                'name',
+                list_fields=MEDICATIONS_LIST_COLUMNS,
+                numeric_fields=MEDICATIONS_NUMERIC_COLUMNS,
+                value_fields=MEDICATIONS_VALUE_COLUMNS
+            )
+            _compiled_key = key
+        return _compiled
+
+def _counterpart_pairs(catalog) -> List[Tuple[str, str, bool]]:
+    """(generic, listed brand, whether the brand is a brand in the catalog) for every generic listing a brand."""
+    if isinstance(catalog, sqlite_backend.SqliteCatalog):
+        # One self-join in SQLite instead of reading the generic and brand rows
+        return catalog.counterpart_pairs('is_brand')
+    
+    compiled = get_compiled_catalog()
+    flags = np.asarray(compiled.values['is_brand'], dtype=object)
+    brands = {name for name, is_brand in zip(compiled.names, flags == True) if is_brand}
+    return [
+        (name, brand, brand in brands)
+        for name, brand, is_generic in zip(compiled.names, compiled.values['brand_equivalent'], flags == False)
+        if is_generic and pd.notna(brand) and brand
     ]
+
+def _cached_pairs(kind: str) -> Dict[str, str]:
+    """Return a pair map computed once per catalog version (shared; do not modify)."""
+    global _pairs_key
     
-    if medications.empty:
-        return []
+    catalog = get_catalog()
+    key = (id(catalog), catalog.version)
     
-    return medications.to_dict('records')
+    with _catalog_lock:
+        if key != _pairs_key:
+            generic_brand = {}
+            brand_generic = {}
+            for generic, brand, brand_listed in _counterpart_pairs(catalog):
+                generic_brand[generic] = brand
+                # First generic listed for each brand
+                if brand_listed:
+                    brand_generic.setdefault(brand, generic)
+            _pairs_cache.clear()
+            _pairs_cache.update(generic_brand=generic_brand, brand_generic=brand_generic)
+            _pairs_key = key
+        return _pairs_cache[kind]
 
 def get_brand_generic_pairs() -> Dict[str, str]:
     """
@@ -289,20 +492,7 @@ def get_brand_generic_pairs() -> Dict[str, str]:
     Returns:
         Dictionary mapping brand names to their generic equivalents
     """
-    df = load_medications()
-    
-    # Filter for brand medications
-    brands = df[df['is_brand'] == True]
-    
-    pairs = {}
-    for _, row in brands.iterrows():
-        # Find the generic equivalent
-        generic = df[(df['brand_equivalent'] == row['name']) & (df['is_brand'] == False)]
-        
-        if not generic.empty:
-            pairs[row['name']] = generic.iloc[0]['name']
-    
-    return pairs
+    return _cached_pairs('brand_generic')
 
 def get_generic_brand_pairs() -> Dict[str, str]:
     """
@@ -311,17 +501,7 @@ def get_generic_brand_pairs() -> Dict[str, str]:
     Returns:
         Dictionary mapping generic names to their brand equivalents
     """
-    df = load_medications()
-    
-    # Filter for generic medications
-    generics = df[df['is_brand'] == False]
-    
-    pairs = {}
-    for _, row in generics.iterrows():
-        if row['brand_equivalent']:
-            pairs[row['name']] = row['brand_equivalent']
-    
-    return pairs
+    return _cached_pairs('generic_brand')
 
 def get_drug_class_info(class_name: str) -> Optional[Dict]:
     """
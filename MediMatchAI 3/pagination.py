@@ -0,0 +1,157 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+# Cards per page when the caller does not choose
+DEFAULT_PAGE_SIZE = 5
+
+# Background threads that prepare the page after the one being shown, shared by every session
+PREFETCH_WORKERS = 4
+_prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="medimatch-prefetch")
+
+
+def encode_cursor(offset: int) -> str:
+    """Cursor for the page starting at `offset`."""
+    return f"o{offset}"
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """
+    Offset a cursor points at (None is the first page).
+
+    Raises:
+        ValueError: If the cursor was not produced by `encode_cursor`
+    """
+    if cursor is None:
+        return 0
+    if not isinstance(cursor, str) or not cursor.startswith("o") or not cursor[1:].isdigit():
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return int(cursor[1:])
+
+
+class PagedResults:
+    """
+    Cursor-paginated view over a result list whose cards are built on demand.
+
+    Only the requested page is materialized; the following page is prepared
+    on a background thread so "load more" finds it ready. Materialized cards
+    are kept, and the cache can be shared between several views over the
+    same results (e.g. one per tab).
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[Hashable],
+        materialize: Callable[[Hashable], Any],
+        page_size: int = DEFAULT_PAGE_SIZE,
+        cache: Optional[Dict[Hashable, Any]] = None
+    ):
+        """
+        Args:
+            keys: Result keys in display order
+            materialize: Builds the card for one key; must not touch UI state,
+                since it may run on the prefetch thread
+            page_size: Cards per page
+            cache: Materialized cards by key, to share with other views
+        """
+        if page_size <= 0:
+            raise ValueError("page_size must be positive")
+        self.keys = list(keys)
+        self.materialize = materialize
+        self.page_size = page_size
+        self.cache = cache if cache is not None else {}
+        self._pending: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def card(self, key: Hashable) -> Any:
+        """
+        The materialized card for a key.
+
+        Waits for the prefetch thread only if it is already building the
+        card; a card still queued behind other sessions' prefetches is
+        taken back and built here.
+        """
+        with self._lock:
+            if key in self.cache:
+                return self.cache[key]
+            future = self._pending.get(key)
+
+        if future is not None:
+            if not future.cancel():
+                return future.result()
+            with self._lock:
+                if self._pending.get(key) is future:
+                    del self._pending[key]
+
+        return self._build(key)
+
+    def _build(self, key: Hashable) -> Any:
+        card = self.materialize(key)
+        with self._lock:
+            return self.cache.setdefault(key, card)
+
+    def _prefetch(self, keys: List[Hashable]):
+        for key in keys:
+            with self._lock:
+                future = self._pending.get(key)
+            # Skip cards the page being shown took back (see `card`)
+            if future is None or not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._build(key))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._pending.pop(key, None)
+
+    def prefetch(self, cursor: Optional[str]):
+        """Start building the cards of the page at `cursor` in the background."""
+        if cursor is None:
+            return
+        start = decode_cursor(cursor)
+        keys = []
+        with self._lock:
+            for key in self.keys[start:start + self.page_size]:
+                if key not in self.cache and key not in self._pending:
+                    self._pending[key] = Future()
+                    keys.append(key)
+        if keys:
+            _prefetch_executor.submit(self._prefetch, keys)
+
+    def page(self, cursor: Optional[str] = None, prefetch: bool = True) -> Dict:
+        """
+        One page of materialized cards.
+
+        Args:
+            cursor: Page to return (None for the first page)
+            prefetch: Prepare the next page in the background
+
+        Returns:
+            Dictionary with 'cards', 'cursor', 'next_cursor' (None on the
+            last page) and 'total' (number of results)
+        """
+        start = decode_cursor(cursor)
+        end = min(start + self.page_size, len(self.keys))
+        next_cursor = encode_cursor(end) if end < len(self.keys) else None
+
+        # Queue the next page first so it is built while this one is drawn
+        if prefetch:
+            self.prefetch(next_cursor)
+
+        return {
+            'cards': [self.card(key) for key in self.keys[start:end]],
+            'cursor': encode_cursor(start),
+            'next_cursor': next_cursor,
+            'total': len(self.keys),
+        }
+
+    def pages(self, count: int) -> List[Dict]:
+        """The first `count` pages (at least one), as shown after pressing "load more" count - 1 times."""
+        pages = [self.page(None, prefetch=count <= 1)]
+        while len(pages) < count and pages[-1]['next_cursor'] is not None:
+            pages.append(self.page(pages[-1]['next_cursor'], prefetch=len(pages) + 1 >= count))
+        return pages
@@ -5,7 +5,14 @@ from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
 from typing import Dict, List, Optional
+from coalesce import get_flight, make_key
+from profiler import profiled
+from price_history import DEFAULT_WINDOW_DAYS, describe_price_summary, get_price_summary
 
+# Identical reports requested at the same moment are rendered once
+_pdf_flight = get_flight("generate_pdf")
+
+@profiled()
 def generate_pdf(
     original_medication: str,
     med_info: Dict,
@@ -16,6 +23,9 @@ def generate_pdf(
     """
     Generate a PDF report of medication recommendations.
     
+    Concurrent calls with identical inputs share one rendering; each caller
+    gets its own buffer.
+    
     Args:
         original_medication: Name of the prescribed medication
         med_info: Dictionary with original medication information
@@ -26,6 +36,30 @@ def generate_pdf(
     Returns:
         BytesIO object containing the generated PDF
     """
+    key = make_key(original_medication, med_info, recommendations, insurance, budget)
+    pdf = _pdf_flight.do(key, _render_pdf, original_medication, med_info, recommendations, insurance, budget)
+    return BytesIO(pdf)
+
+def _render_pdf(
+    original_medication: str,
+    med_info: Dict,
+    recommendations: List[Dict],
+    insurance: str,
+    budget: Optional[float]
+) -> bytes:
+    """
+    Render a PDF report of medication recommendations.
+    
+    Args:
+        original_medication: Name of the prescribed medication
+        med_info: Dictionary with original medication information
+        recommendations: List of recommendation dictionaries
+        insurance: Insurance provider
+        budget: Monthly budget constraint (optional)
+        
+    Returns:
+        The PDF document as bytes
+    """
     buffer = io.BytesIO()
     
     # Create the PDF document
@@ -100,6 +134,8 @@ def generate_pdf(
     for i, rec in enumerate(recommendations):
         elements.append(Paragraph(f"{i+1}. <b>{rec['name']}</b> - {rec['recommendation_type']}", subheading_style))
         elements.append(Paragraph(f"<b>Average Monthly Cost:</b> ${rec['avg_cost']:.2f}", normal_style))
+        if rec.get('patient_cost', rec['avg_cost']) < rec['avg_cost']:
+            elements.append(Paragraph(f"<b>Your Cost With {insurance}:</b> ${rec['patient_cost']:.2f}", normal_style))
         
         if 'savings' in rec:
             elements.append(Paragraph(f"<b>Potential Savings:</b> ${rec['savings']:.2f}/month", normal_style))
@@ -110,6 +146,10 @@ def generate_pdf(
         if 'availability' in rec:
             elements.append(Paragraph(f"<b>Availability:</b> {rec['availability']}", normal_style))
         
+        price_history = describe_price_summary(get_price_summary(rec['name']))
+        if price_history:
+            elements.append(Paragraph(f"<b>{DEFAULT_WINDOW_DAYS}-Day Price History:</b> {price_history}", normal_style))
+        
         elements.append(Paragraph(f"<b>Side Effects:</b> {rec['side_effects']}", normal_style))
         elements.append(Paragraph(f"<b>Source:</b> {rec['source']}", normal_style))
         
@@ -152,7 +192,4 @@ def generate_pdf(
     # Build the PDF
     doc.build(elements)
     
-    # Reset buffer position to the beginning
-    buffer.seek(0)
-    
-    return buffer
+    return buffer.getvalue()
@@ -0,0 +1,354 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pharmacy_prices import LOCAL_PHARMACY, is_independent_pharmacy, normalize_pharmacy_name
+from price_matrix import ANY_PHARMACY, PriceMatrix, get_price_matrix
+
+# Store locations (store_id, chain, lat, lon, and optionally zip and address)
+PHARMACY_LOCATIONS_CSV = os.path.join("data", "pharmacy_locations.csv")
+
+# ZIP code centroids (zip, lat, lon); ZIPs missing here fall back to the centroid of their stores
+ZIP_CODES_CSV = os.path.join("data", "zip_codes.csv")
+
+# Search radius offered by default, and the largest one accepted
+DEFAULT_RADIUS_MILES = 10.0
+MAX_RADIUS_MILES = 100.0
+
+# Side of a grid cell; a query scans the cells overlapping its radius
+GRID_CELL_MILES = 5.0
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.0
+
+LOCATION_COLUMNS = ['store_id', 'chain', 'lat', 'lon', 'zip', 'address']
+
+_ZIP_RE = re.compile(r"^\d{5}")
+
+
+def normalize_zip(zip_code) -> Optional[str]:
+    """First five digits of a ZIP code ("02139-4307" -> "02139"), or None if it is not one."""
+    if zip_code is None:
+        return None
+    text = str(zip_code).strip()
+    if text.isdigit() and len(text) < 5:
+        text = text.zfill(5)  # Leading zeros lost when the column was read as numbers
+    match = _ZIP_RE.match(text)
+    return match.group(0) if match else None
+
+
+def haversine_miles(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distance in miles from one point to each of the given points."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class PharmacyLocator:
+    """
+    Grid index over pharmacy store locations.
+
+    Stores are bucketed into cells of GRID_CELL_MILES of latitude by the
+    same number of degrees of longitude, and sorted by cell, so each cell
+    is a contiguous slice of the store arrays. A radius query only computes
+    distances for the stores in the cells its bounding box overlaps.
+    """
+
+    def __init__(self, stores: pd.DataFrame, zip_centroids: Optional[Dict[str, Tuple[float, float]]] = None,
+                 cell_miles: float = GRID_CELL_MILES):
+        """
+        Args:
+            stores: Store locations with store_id, chain, lat and lon columns (zip and address optional)
+            zip_centroids: ZIP code -> (lat, lon)
+            cell_miles: Side of a grid cell in miles of latitude
+        """
+        self.cell_degrees = cell_miles / MILES_PER_DEGREE_LAT
+
+        stores = stores.reset_index(drop=True)
+        lat_cells = np.floor(stores['lat'].to_numpy(dtype=np.float64) / self.cell_degrees).astype(np.int64)
+        lon_cells = np.floor(stores['lon'].to_numpy(dtype=np.float64) / self.cell_degrees).astype(np.int64)
+        order = np.lexsort((lon_cells, lat_cells))
+        stores = stores.iloc[order].reset_index(drop=True)
+        lat_cells, lon_cells = lat_cells[order], lon_cells[order]
+
+        self.store_ids = stores['store_id'].astype(str).to_numpy(dtype=object)
+        self.chains = stores['chain'].to_numpy(dtype=object)
+        self.lats = stores['lat'].to_numpy(dtype=np.float64)
+        self.lons = stores['lon'].to_numpy(dtype=np.float64)
+        self.addresses = stores['address'].fillna("").astype(str).to_numpy(dtype=object)
+
+        # (lat cell, lon cell) -> (first store, one past the last store)
+        self.cells: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        if len(stores):
+            changes = np.flatnonzero((np.diff(lat_cells) != 0) | (np.diff(lon_cells) != 0)) + 1
+            starts = np.concatenate(([0], changes))
+            ends = np.concatenate((changes, [len(stores)]))
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                self.cells[(int(lat_cells[start]), int(lon_cells[start]))] = (start, end)
+
+        # Chain name -> code, so chain filters and price lookups are array operations
+        self.chain_names, self.chain_codes = np.unique(self.chains.astype(str), return_inverse=True)
+
+        self.zip_centroids = dict(zip_centroids or {})
+        if len(stores):
+            # Centroid of each ZIP's stores, for ZIPs missing from the centroid table
+            zips = stores['zip'].map(normalize_zip)
+            known = zips.notna()
+            means = stores[known].groupby(zips[known])[['lat', 'lon']].mean()
+            for zip_code, lat, lon in zip(means.index, means['lat'].tolist(), means['lon'].tolist()):
+                self.zip_centroids.setdefault(zip_code, (lat, lon))
+
+    def __len__(self) -> int:
+        return len(self.store_ids)
+
+    def locate(self, zip_code) -> Optional[Tuple[float, float]]:
+        """Latitude and longitude of a ZIP code, or None if it is unknown."""
+        return self.zip_centroids.get(normalize_zip(zip_code))
+
+    def within(self, lat: float, lon: float, radius_miles: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Stores within a radius of a point.
+
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+            radius_miles: Search radius
+
+        Returns:
+            Tuple of (store positions, distances in miles), nearest first
+        """
+        lat_span = radius_miles / MILES_PER_DEGREE_LAT
+        # Degrees of longitude shrink toward the poles; clamp so the box stays finite
+        lon_span = lat_span / max(np.cos(np.radians(min(abs(lat) + lat_span, 89.0))), 0.01)
+
+        lat_range = range(int(np.floor((lat - lat_span) / self.cell_degrees)),
+                          int(np.floor((lat + lat_span) / self.cell_degrees)) + 1)
+        lon_range = range(int(np.floor((lon - lon_span) / self.cell_degrees)),
+                          int(np.floor((lon + lon_span) / self.cell_degrees)) + 1)
+
+        slices = []
+        if len(lat_range) * len(lon_range) > len(self.cells):
+            # Larger box than the grid: walking the occupied cells is cheaper
+            for (lat_cell, lon_cell), (start, end) in self.cells.items():
+                if lat_cell in lat_range and lon_cell in lon_range:
+                    slices.append(np.arange(start, end))
+        else:
+            for lat_cell in lat_range:
+                for lon_cell in lon_range:
+                    span = self.cells.get((lat_cell, lon_cell))
+                    if span is not None:
+                        slices.append(np.arange(*span))
+
+        if not slices:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        candidates = np.concatenate(slices)
+        distances = haversine_miles(lat, lon, self.lats[candidates], self.lons[candidates])
+        inside = distances <= radius_miles
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return candidates[order], distances[order]
+
+    def cheapest_fills(
+        self,
+        medication_names: Sequence[str],
+        lat: float,
+        lon: float,
+        radius_miles: float = DEFAULT_RADIUS_MILES,
+        pharmacy: str = ANY_PHARMACY,
+        prices: Optional[PriceMatrix] = None
+    ) -> Dict[str, Dict]:
+        """
+        Cheapest nearby fill for each medication.
+
+        Prices come from the price feed, which prices each chain rather than
+        each store, so a store counts as stocking a medication when its
+        chain has a price for it. Among the stores within the radius, the
+        cheapest chain wins and its nearest store is returned; ties go to
+        the nearer store.
+
+        Args:
+            medication_names: Medications to fill
+            lat: Latitude of the patient
+            lon: Longitude of the patient
+            radius_miles: Search radius
+            pharmacy: Pharmacy chain to limit the search to, or "Any"
+            prices: Price matrix (defaults to the shared one)
+
+        Returns:
+            Dictionary mapping each medication that can be filled nearby to a
+            dictionary with store_id, chain, address, distance_miles and monthly_cost
+        """
+        prices = prices if prices is not None else get_price_matrix()
+        stores, distances = self.within(lat, lon, radius_miles)
+        if prices.empty or not len(stores):
+            return {}
+
+        if pharmacy not in (None, "", ANY_PHARMACY):
+            name = normalize_pharmacy_name(pharmacy)
+            if name == LOCAL_PHARMACY:
+                wanted = np.flatnonzero([is_independent_pharmacy(chain) for chain in self.chain_names])
+            else:
+                wanted = np.flatnonzero(self.chain_names == name)
+            keep = np.isin(self.chain_codes[stores], wanted)
+            stores, distances = stores[keep], distances[keep]
+
+        # Price matrix column of each nearby store's chain (-1 when the feed has no prices for it)
+        chain_columns = np.array([prices.pharmacy_index.get(chain, -1) for chain in self.chain_names], dtype=np.int64)
+        columns = chain_columns[self.chain_codes[stores]] if len(stores) else np.empty(0, dtype=np.int64)
+        priced_chain = columns >= 0
+        stores, distances, columns = stores[priced_chain], distances[priced_chain], columns[priced_chain]
+        if not len(stores):
+            return {}
+
+        rows = prices.rows(medication_names)
+        fills = {}
+        for name, row in zip(medication_names, rows.tolist()):
+            if row < 0:
+                continue
+            store_prices = prices.prices[row, columns]
+            in_stock = np.flatnonzero(~np.isnan(store_prices))
+            if not len(in_stock):
+                continue
+            # Stores are nearest first, so the first minimum is the nearest cheapest store
+            best = in_stock[np.argmin(store_prices[in_stock])]
+            store = stores[best]
+            fills[name] = {
+                'store_id': self.store_ids[store],
+                'chain': self.chains[store],
+                'address': self.addresses[store],
+                'distance_miles': float(distances[best]),
+                'monthly_cost': float(store_prices[best]),
+            }
+        return fills
+
+
+def load_pharmacy_locations(path: str = PHARMACY_LOCATIONS_CSV) -> pd.DataFrame:
+    """
+    Load store locations, with chain names normalized and invalid coordinates dropped.
+
+    Returns:
+        DataFrame with store_id, chain, lat, lon, zip and address columns
+        (empty if the file does not exist)
+    """
+    try:
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=LOCATION_COLUMNS)
+        df = pd.read_csv(path, dtype={'store_id': str, 'zip': str})
+        for column in ('zip', 'address'):
+            if column not in df.columns:
+                df[column] = None
+        df['chain'] = df['chain'].map(normalize_pharmacy_name)
+        df['lat'] = pd.to_numeric(df['lat'], errors='coerce')
+        df['lon'] = pd.to_numeric(df['lon'], errors='coerce')
+        valid = df['lat'].between(-90, 90) & df['lon'].between(-180, 180)
+        if not valid.all():
+            print(f"Warning: skipping {int((~valid).sum())} pharmacy locations without valid coordinates")
+        return df.loc[valid, LOCATION_COLUMNS]
+    except Exception as e:
+        print(f"Error loading pharmacy locations: {e}")
+        return pd.DataFrame(columns=LOCATION_COLUMNS)
+
+
+def load_zip_centroids(path: str = ZIP_CODES_CSV) -> Dict[str, Tuple[float, float]]:
+    """
+    Load ZIP code centroids.
+
+    Returns:
+        Dictionary mapping five-digit ZIP code to (lat, lon) (empty if the file does not exist)
+    """
+    try:
+        if not os.path.exists(path):
+            return {}
+        df = pd.read_csv(path, dtype={'zip': str})
+        df['zip'] = df['zip'].map(normalize_zip)
+        df = df.dropna(subset=['zip', 'lat', 'lon'])
+        return {zip_code: (float(lat), float(lon)) for zip_code, lat, lon in zip(df['zip'], df['lat'], df['lon'])}
+    except Exception as e:
+        print(f"Error loading ZIP codes: {e}")
+        return {}
+
+
+_locator: Optional[PharmacyLocator] = None
+_locator_key: Optional[tuple] = None
+_locator_lock = threading.Lock()
+
+
+def _mtime(path: str) -> Optional[float]:
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def get_pharmacy_locator(path: str = PHARMACY_LOCATIONS_CSV, zip_path: str = ZIP_CODES_CSV) -> PharmacyLocator:
+    """
+    Get the shared pharmacy locator, rebuilt when the locations or ZIP code files change.
+
+    Returns:
+        PharmacyLocator (empty if no locations have been loaded)
+    """
+    global _locator, _locator_key
+
+    key = (path, _mtime(path), zip_path, _mtime(zip_path))
+    if _locator is not None and key == _locator_key:
+        return _locator
+
+    with _locator_lock:
+        if _locator is None or key != _locator_key:
+            _locator = PharmacyLocator(load_pharmacy_locations(path), load_zip_centroids(zip_path))
+            _locator_key = key
+        return _locator
+
+
+def find_local_fills(
+    medication_names: Sequence[str],
+    zip_code: str,
+    radius_miles: float = DEFAULT_RADIUS_MILES,
+    pharmacy: str = ANY_PHARMACY
+) -> Optional[Dict[str, Dict]]:
+    """
+    Cheapest in-stock fill for each medication within a radius of a ZIP code.
+
+    Args:
+        medication_names: Medications to fill (e.g. the recommended alternatives)
+        zip_code: Patient's ZIP code
+        radius_miles: Search radius (capped at MAX_RADIUS_MILES)
+        pharmacy: Pharmacy chain to limit the search to, or "Any"
+
+    Returns:
+        Dictionary as returned by `PharmacyLocator.cheapest_fills`, or None
+        if the ZIP code is unknown
+    """
+    locator = get_pharmacy_locator()
+    point = locator.locate(zip_code)
+    if point is None:
+        return None
+    return locator.cheapest_fills(medication_names, point[0], point[1], min(radius_miles, MAX_RADIUS_MILES), pharmacy)
+
+
+def attach_local_fills(
+    recommendations: List[Dict],
+    zip_code: str,
+    radius_miles: float = DEFAULT_RADIUS_MILES,
+    pharmacy: str = ANY_PHARMACY
+) -> List[Dict]:
+    """
+    Copies of the recommendations with the cheapest nearby fill of each as 'local_fill'.
+
+    Recommendations that cannot be filled nearby get 'local_fill' None.
+    """
+    fills = find_local_fills([rec['name'] for rec in recommendations], zip_code, radius_miles, pharmacy) or {}
+    return [{**rec, 'local_fill': fills.get(rec['name'])} for rec in recommendations]
+
+
+def describe_local_fill(fill: Optional[Dict], radius_miles: float = DEFAULT_RADIUS_MILES) -> str:
+    """Text for a recommendation's nearest cheapest fill."""
+    if not fill:
+        return f"No in-stock pharmacy price found within {radius_miles:g} miles"
+    where = f"{fill['chain']} #{fill['store_id']}"
+    if fill['address']:
+        where += f", {fill['address']}"
+    return f"${fill['monthly_cost']:.2f}/month at {where} ({fill['distance_miles']:.1f} mi)"
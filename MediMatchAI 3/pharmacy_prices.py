@@ -0,0 +1,323 @@
+import argparse
+import os
+import string
+import time
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+from catalog import write_csv_atomic
+from price_history import PRICE_HISTORY_DIR, compact_price_history, record_prices
+
+# Normalized per-pharmacy price table produced by feed ingestion
+PHARMACY_PRICES_CSV = os.path.join("data", "pharmacy_prices.csv")
+
+# Rows parsed per chunk; bounds memory use regardless of feed size
+FEED_CHUNK_SIZE = 500000
+
+# Units dispensed per month, used to turn unit prices into the monthly costs shown in the app
+UNITS_PER_MONTH = 30
+
+# Pharmacy choice in the app standing for every pharmacy outside the known chains
+LOCAL_PHARMACY = "Local/Independent"
+
+# Pharmacy chains offered in the app, used as the canonical pharmacy names
+PHARMACY_CHAINS = ["CVS", "Walgreens", "Walmart", "Rite Aid", "Costco", "Sam's Club", LOCAL_PHARMACY]
+
+# Name fragments found in feed pharmacy names, mapped to the canonical chain
+PHARMACY_ALIASES = {
+    "cvs": "CVS",
+    "walgreen": "Walgreens",
+    "duane reade": "Walgreens",
+    "walmart": "Walmart",
+    "wal-mart": "Walmart",
+    "wal mart": "Walmart",
+    "rite aid": "Rite Aid",
+    "riteaid": "Rite Aid",
+    "costco": "Costco",
+    "sam's club": "Sam's Club",
+    "sams club": "Sam's Club",
+}
+
+# Accepted header spellings for each feed column
+FEED_COLUMN_ALIASES = {
+    "pharmacy": ["pharmacy", "pharmacy_name", "chain", "store"],
+    "drug": ["drug", "drug_name", "medication", "medication_name", "name"],
+    "package": ["package", "package_size", "pkg_size", "quantity", "qty"],
+    "unit_price": ["unit_price", "price", "unit_cost", "price_per_unit"],
+    "date": ["date", "price_date", "effective_date", "as_of"],
+}
+
+# Columns of the normalized price table
+PRICE_TABLE_COLUMNS = ['pharmacy', 'drug', 'package', 'unit_price', 'monthly_cost', 'price_date']
+
+
+def normalize_pharmacy_name(name: str) -> str:
+    """
+    Map a pharmacy name from a feed to its canonical name.
+
+    Args:
+        name: Pharmacy or store name as it appears in the feed
+
+    Returns:
+        Canonical chain name, or for unrecognized pharmacies the name itself
+        with its spacing and capitalization normalized
+    """
+    lowered = " ".join(str(name).split()).lower()
+
+    for chain in PHARMACY_CHAINS:
+        if lowered == chain.lower():
+            return chain
+
+    for fragment, chain in PHARMACY_ALIASES.items():
+        if fragment in lowered:
+            return chain
+
+    return string.capwords(lowered)
+
+
+def is_independent_pharmacy(name: str) -> bool:
+    """Whether a canonical pharmacy name is outside the known chains (see LOCAL_PHARMACY)."""
+    return name == LOCAL_PHARMACY or name not in PHARMACY_CHAINS
+
+
+def _resolve_columns(header: Iterable[str]) -> Dict[str, str]:
+    """Map each feed column name to its normalized name."""
+    lookup = {}
+    for column in header:
+        key = str(column).strip().lower().replace(' ', '_')
+        for normalized, aliases in FEED_COLUMN_ALIASES.items():
+            if key in aliases and normalized not in lookup.values():
+                lookup[column] = normalized
+                break
+
+    missing = set(FEED_COLUMN_ALIASES) - set(lookup.values())
+    if missing:
+        raise ValueError(f"Price feed is missing required columns: {sorted(missing)}")
+
+    return lookup
+
+
+def _empty_state() -> pd.DataFrame:
+    return pd.DataFrame({
+        'pharmacy': pd.Series(dtype=object),
+        'drug_key': pd.Series(dtype=object),
+        'drug': pd.Series(dtype=object),
+        'package': pd.Series(dtype=float),
+        'unit_price': pd.Series(dtype=float),
+        'price_date': pd.Series(dtype='datetime64[ns]'),
+    })
+
+
+def _latest_prices(df: pd.DataFrame) -> pd.DataFrame:
+    """Keep the most recent price per pharmacy and drug (cheapest on ties)."""
+    df = df.sort_values(['price_date', 'unit_price'], ascending=[True, False], kind='stable')
+    return df.drop_duplicates(['pharmacy', 'drug_key'], keep='last')
+
+
+def _clean_chunk(chunk: pd.DataFrame, rejected: Dict[str, int], pharmacy_names: Dict[str, str]) -> pd.DataFrame:
+    """Validate and normalize one chunk of feed rows."""
+    pharmacy = chunk['pharmacy'].astype(str).str.strip()
+    drug = chunk['drug'].astype(str).str.strip()
+    package = pd.to_numeric(chunk['package'], errors='coerce')
+    unit_price = pd.to_numeric(chunk['unit_price'], errors='coerce')
+    price_date = pd.to_datetime(chunk['date'], errors='coerce', cache=True)
+
+    checks = {
+        'missing_pharmacy': chunk['pharmacy'].isna() | (pharmacy == ''),
+        'missing_drug': chunk['drug'].isna() | (drug == ''),
+        'invalid_package': package.isna() | (package <= 0),
+        'invalid_price': unit_price.isna() | (unit_price <= 0),
+        'invalid_date': price_date.isna(),
+    }
+
+    bad = pd.Series(False, index=chunk.index)
+    for reason, mask in checks.items():
+        # Count each row once, against the first check it fails
+        new_bad = mask & ~bad
+        rejected[reason] = rejected.get(reason, 0) + int(new_bad.sum())
+        bad |= mask
+
+    keep = ~bad
+
+    # Feeds repeat a small set of pharmacy names; normalize each distinct name once
+    pharmacy = pharmacy[keep]
+    for raw in pharmacy.unique():
+        if raw not in pharmacy_names:
+            pharmacy_names[raw] = normalize_pharmacy_name(raw)
+
+    return pd.DataFrame({
+        'pharmacy': pharmacy.map(pharmacy_names),
+        'drug_key': drug[keep].str.lower(),
+        'drug': drug[keep],
+        'package': package[keep],
+        'unit_price': unit_price[keep],
+        'price_date': price_date[keep],
+    })
+
+
+def ingest_price_feed(
+    feed_path: str,
+    output_path: str = PHARMACY_PRICES_CSV,
+    chunksize: int = FEED_CHUNK_SIZE,
+    merge_existing: bool = True,
+    history_dir: Optional[str] = PRICE_HISTORY_DIR
+) -> Dict:
+    """
+    Stream a pharmacy price feed into the normalized per-pharmacy price table.
+
+    The feed is read in fixed-size chunks. Each chunk is validated, normalized
+    and reduced to the latest price per (pharmacy, drug) before being merged
+    into the running table, so memory is bounded by the number of distinct
+    pharmacy/drug pairs rather than by the number of feed rows. Every
+    accepted row is also appended to the price history, one segment per
+    chunk and month; the months the feed touched are compacted back to a
+    single segment each once the feed is read.
+
+    Args:
+        feed_path: CSV feed with pharmacy, drug, package, unit price and date columns
+        output_path: Where to write the normalized price table
+        chunksize: Number of feed rows parsed at a time
+        merge_existing: Start from the existing price table instead of replacing it
+        history_dir: Price history to append the accepted rows to (None to skip it)
+
+    Returns:
+        Dictionary of ingestion statistics (rows read, accepted, rejected by
+        reason, pharmacies, drugs, history rows, elapsed seconds and rows per
+        second)
+    """
+    start = time.perf_counter()
+
+    header = pd.read_csv(feed_path, nrows=0).columns
+    column_map = _resolve_columns(header)
+
+    state = _empty_state()
+    if merge_existing and os.path.exists(output_path):
+        existing = load_pharmacy_prices(output_path)
+        if not existing.empty:
+            existing['drug_key'] = existing['drug'].str.lower()
+            state = existing[state.columns]
+
+    rows_read = 0
+    rows_accepted = 0
+    history_rows = 0
+    history_months = set()
+    rejected: Dict[str, int] = {}
+    pharmacy_names: Dict[str, str] = {}
+
+    reader = pd.read_csv(
+        feed_path,
+        usecols=list(column_map),
+        dtype={column: str for column, name in column_map.items() if name in ('pharmacy', 'drug', 'date')},
+        chunksize=chunksize
+    )
+
+    for chunk in reader:
+        rows_read += len(chunk)
+        chunk = chunk.rename(columns=column_map)
+
+        cleaned = _clean_chunk(chunk, rejected, pharmacy_names)
+        rows_accepted += len(cleaned)
+
+        if not cleaned.empty:
+            state = _latest_prices(pd.concat([state, _latest_prices(cleaned)], ignore_index=True))
+            if history_dir is not None:
+                history_rows += record_prices(pd.DataFrame({
+                    'drug': cleaned['drug'],
+                    'pharmacy': cleaned['pharmacy'],
+                    'date': cleaned['price_date'],
+                    'monthly_cost': (cleaned['unit_price'] * UNITS_PER_MONTH).round(2),
+                }), history_dir)
+                history_months.update(cleaned['price_date'].dt.strftime('%Y-%m').unique())
+
+    if history_months:
+        compact_price_history(history_months, history_dir)
+
+    save_pharmacy_prices(state, output_path)
+
+    elapsed = time.perf_counter() - start
+
+    return {
+        'rows_read': rows_read,
+        'rows_accepted': rows_accepted,
+        'rows_rejected': rows_read - rows_accepted,
+        'rejected_by_reason': rejected,
+        'pharmacies': int(state['pharmacy'].nunique()),
+        'drugs': int(state['drug_key'].nunique()),
+        'price_rows': len(state),
+        'history_rows': history_rows,
+        'elapsed_seconds': elapsed,
+        'rows_per_second': rows_read / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def save_pharmacy_prices(state: pd.DataFrame, output_path: str = PHARMACY_PRICES_CSV):
+    """Write the normalized price table, replacing the previous file atomically."""
+    directory = os.path.dirname(output_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    table = state.sort_values(['pharmacy', 'drug_key'], kind='stable').copy()
+    table['monthly_cost'] = (table['unit_price'] * UNITS_PER_MONTH).round(2)
+    table['price_date'] = pd.to_datetime(table['price_date']).dt.strftime('%Y-%m-%d')
+
+    write_csv_atomic(table[PRICE_TABLE_COLUMNS], output_path)
+
+
+def load_pharmacy_prices(path: str = PHARMACY_PRICES_CSV) -> pd.DataFrame:
+    """
+    Load the normalized per-pharmacy price table.
+
+    Returns:
+        DataFrame with pharmacy, drug, package, unit_price, monthly_cost and
+        price_date columns (empty if no feed has been ingested)
+    """
+    try:
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=PRICE_TABLE_COLUMNS)
+        df = pd.read_csv(path, parse_dates=['price_date'])
+        df['pharmacy'] = df['pharmacy'].astype(str)
+        df['drug'] = df['drug'].astype(str)
+        return df
+    except Exception as e:
+        print(f"Error loading pharmacy prices: {e}")
+        return pd.DataFrame(columns=PRICE_TABLE_COLUMNS)
+
+
+def get_pharmacy_price_tables(path: str = PHARMACY_PRICES_CSV) -> Dict[str, pd.DataFrame]:
+    """
+    Split the normalized price table into one table per pharmacy.
+
+    Returns:
+        Dictionary mapping pharmacy name to a DataFrame indexed by lowercase drug name
+    """
+    df = load_pharmacy_prices(path)
+    if df.empty:
+        return {}
+
+    df = df.assign(drug_key=df['drug'].str.lower())
+    return {
+        pharmacy: group.set_index('drug_key')
+        for pharmacy, group in df.groupby('pharmacy', sort=True)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a pharmacy price feed into MediMatch AI.")
+    parser.add_argument("feed", help="CSV feed with pharmacy, drug, package, unit price and date columns")
+    parser.add_argument("--output", default=PHARMACY_PRICES_CSV, help="Normalized price table to write")
+    parser.add_argument("--chunksize", type=int, default=FEED_CHUNK_SIZE, help="Rows parsed per chunk")
+    parser.add_argument("--replace", action="store_true", help="Replace the existing table instead of merging")
+    parser.add_argument("--no-history", action="store_true", help="Don't append the feed to the price history")
+    args = parser.parse_args()
+
+    stats = ingest_price_feed(args.feed, args.output, args.chunksize, merge_existing=not args.replace,
+                              history_dir=None if args.no_history else PRICE_HISTORY_DIR)
+
+    print(f"Read {stats['rows_read']:,} rows in {stats['elapsed_seconds']:.1f}s "
+          f"({stats['rows_per_second']:,.0f} rows/second)")
+    print(f"Accepted {stats['rows_accepted']:,} rows, rejected {stats['rows_rejected']:,} "
+          f"{stats['rejected_by_reason']}")
+    print(f"Price table: {stats['price_rows']:,} prices for {stats['drugs']:,} drugs "
+          f"at {stats['pharmacies']} pharmacies")
+    print(f"Price history: {stats['history_rows']:,} rows appended")
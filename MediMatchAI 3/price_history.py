@@ -0,0 +1,457 @@
+import datetime
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from session_store import SharedResults
+
+# Directory holding the history segments, one or more per month
+PRICE_HISTORY_DIR = os.path.join("data", "price_history")
+
+# Window of the summaries shown on the recommendation cards and in the PDF report
+DEFAULT_WINDOW_DAYS = 90
+
+# Change over the window, as a fraction of the average price, below which prices count as stable
+TREND_THRESHOLD = 0.02
+
+# Decoded segments kept in memory
+SEGMENT_CACHE_SIZE = 64
+
+_SEGMENT_RE = re.compile(r"^(\d{4}-\d{2})-(\d{6})\.npz$")
+
+
+def _narrow(values: np.ndarray) -> np.ndarray:
+    """The values in the smallest signed integer type that holds them."""
+    if not len(values):
+        return values.astype(np.int8)
+    low, high = values.min(), values.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values.astype(np.int64)
+
+
+def _delta_encode(values: np.ndarray) -> np.ndarray:
+    return _narrow(np.diff(values.astype(np.int64), prepend=0))
+
+
+def _delta_decode(values: np.ndarray) -> np.ndarray:
+    return np.cumsum(values, dtype=np.int64)
+
+
+def encode_segment(rows: pd.DataFrame, month: str) -> Dict[str, np.ndarray]:
+    """
+    Encode one month of price observations as delta-encoded columns.
+
+    Rows are sorted by medication, pharmacy and date. Medications and
+    pharmacies are stored as codes into the segment's own sorted name
+    arrays. Every column then holds the difference from the previous row,
+    which is mostly zero or small, so the columns fit in one or two bytes
+    and compress well.
+
+    Args:
+        rows: Observations with drug, pharmacy, date and monthly_cost columns, all in `month`
+        month: The month as "YYYY-MM"
+
+    Returns:
+        Dictionary of arrays, as saved in the segment file
+    """
+    # Fixed-width string arrays, so segments load without pickle
+    medications, medication_codes = np.unique(rows['drug'].astype(str).str.lower().to_numpy(dtype=str),
+                                              return_inverse=True)
+    pharmacies, pharmacy_codes = np.unique(rows['pharmacy'].astype(str).to_numpy(dtype=str), return_inverse=True)
+    month_start = np.datetime64(month, 'D')
+    days = (rows['date'].to_numpy(dtype='datetime64[D]') - month_start).astype(np.int64)
+    cents = np.round(rows['monthly_cost'].to_numpy(dtype=np.float64) * 100).astype(np.int64)
+
+    order = np.lexsort((days, pharmacy_codes, medication_codes))
+    return {
+        'month': np.array(month),
+        'medications': medications,
+        'pharmacies': pharmacies,
+        'medication': _delta_encode(medication_codes[order]),
+        'pharmacy': _delta_encode(pharmacy_codes[order]),
+        'day': _delta_encode(days[order]),
+        'cents': _delta_encode(cents[order]),
+    }
+
+
+class _Segment:
+    """
+    One segment file.
+
+    Only the name arrays are read up front; the observation columns are
+    read and decoded the first time a medication in the segment is asked for.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with np.load(path) as arrays:
+            self.medications = arrays['medications']
+            self.pharmacies = arrays['pharmacies']
+            self.month_start = np.datetime64(str(arrays['month']), 'D')
+        self._columns: Optional[Tuple[np.ndarray, ...]] = None
+
+    def code(self, medication_key: str) -> Optional[int]:
+        """Code of a medication in this segment, or None if it has no observations here."""
+        code = int(np.searchsorted(self.medications, medication_key))
+        if code < len(self.medications) and self.medications[code] == medication_key:
+            return code
+        return None
+
+    def columns(self) -> Tuple[np.ndarray, ...]:
+        """Decoded (medication, pharmacy, day, cents) columns."""
+        if self._columns is None:
+            with np.load(self.path) as arrays:
+                self._columns = tuple(_delta_decode(arrays[name])
+                                      for name in ('medication', 'pharmacy', 'day', 'cents'))
+        return self._columns
+
+    def observations(self, medication_key: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Observations of one medication (rows are sorted by medication, so they are one slice).
+
+        Returns:
+            Tuple of (dates, pharmacy names, prices in cents), or None if the medication is not in the segment
+        """
+        code = self.code(medication_key)
+        if code is None:
+            return None
+        medication, pharmacy, day, cents = self.columns()
+        start, end = np.searchsorted(medication, [code, code + 1])
+        return self.month_start + day[start:end], self.pharmacies[pharmacy[start:end]], cents[start:end]
+
+
+def _months(start: datetime.date, end: datetime.date) -> List[str]:
+    """Months from `start` to `end` inclusive, as "YYYY-MM"."""
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+class PriceHistory:
+    """
+    Append-only store of pharmacy price observations, chunked by month.
+
+    Each append writes new segment files ("YYYY-MM-NNNNNN.npz", compressed
+    and delta-encoded, see `encode_segment`) for the months it covers;
+    existing segments are never rewritten except by `compact`. A query
+    reads only the segments of the months it spans, and only the name
+    arrays of a segment that has no observations of the medication.
+    When the same medication, pharmacy and date appear more than once, the
+    most recently appended price wins.
+    """
+
+    def __init__(self, directory: str = PRICE_HISTORY_DIR, cache_size: int = SEGMENT_CACHE_SIZE):
+        self.directory = directory
+        self._segments = SharedResults(cache_size)
+        self._write_lock = threading.Lock()
+
+    def segment_paths(self, month: str) -> List[str]:
+        """Segment files of a month, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(name for name in os.listdir(self.directory)
+                       if _SEGMENT_RE.match(name) and name.startswith(month + "-"))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def months(self) -> List[str]:
+        """Months that have at least one segment."""
+        if not os.path.isdir(self.directory):
+            return []
+        matches = (_SEGMENT_RE.match(name) for name in os.listdir(self.directory))
+        return sorted({match.group(1) for match in matches if match})
+
+    def _write_segment(self, month: str, rows: pd.DataFrame, sequence: int) -> str:
+        path = os.path.join(self.directory, f"{month}-{sequence:06d}.npz")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez_compressed(f, **encode_segment(rows, month))
+        os.replace(temp_path, path)
+        return path
+
+    def _next_sequence(self, month: str) -> int:
+        paths = self.segment_paths(month)
+        return int(_SEGMENT_RE.match(os.path.basename(paths[-1])).group(2)) + 1 if paths else 0
+
+    def append(self, prices: pd.DataFrame) -> int:
+        """
+        Append price observations.
+
+        Args:
+            prices: DataFrame with drug, pharmacy, date and monthly_cost columns
+
+        Returns:
+            Number of observations written
+        """
+        prices = prices.dropna(subset=['drug', 'pharmacy', 'date', 'monthly_cost'])
+        if prices.empty:
+            return 0
+        prices = prices.assign(date=pd.to_datetime(prices['date']).dt.normalize())
+
+        with self._write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            for month, rows in prices.groupby(prices['date'].dt.strftime('%Y-%m'), sort=True):
+                self._write_segment(month, rows, self._next_sequence(month))
+        return len(prices)
+
+    def compact(self, month: str) -> int:
+        """
+        Merge a month's segments into one, dropping superseded observations.
+
+        Returns:
+            Number of observations in the merged segment
+        """
+        with self._write_lock:
+            paths = self.segment_paths(month)
+            if len(paths) < 2:
+                return 0
+            parts = []
+            for path in paths:
+                segment = self._load(path)
+                for key in segment.medications:
+                    dates, pharmacies, cents = segment.observations(key)
+                    parts.append(pd.DataFrame({'drug': key, 'pharmacy': pharmacies, 'date': dates,
+                                               'monthly_cost': cents / 100}))
+            rows = pd.concat(parts, ignore_index=True).drop_duplicates(['drug', 'pharmacy', 'date'], keep='last')
+            self._write_segment(month, rows, self._next_sequence(month))
+            for path in paths:
+                os.remove(path)
+        return len(rows)
+
+    def _load(self, path: str) -> _Segment:
+        return self._segments.get((path, os.path.getmtime(path)), lambda: _Segment(path))
+
+    def _observations(
+        self,
+        medication: str,
+        start: datetime.date,
+        end: datetime.date,
+        pharmacy: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(dates, pharmacy names, prices in cents) in a date range, sorted by date and pharmacy."""
+        key = str(medication).lower()
+        parts = []
+        for month in _months(start, end):
+            for path in self.segment_paths(month):
+                try:
+                    observations = self._load(path).observations(key)
+                except (OSError, KeyError, ValueError) as e:
+                    print(f"Error reading price history segment {path}: {e}")
+                    continue
+                if observations is not None:
+                    parts.append(observations)
+
+        if not parts:
+            return np.empty(0, dtype='datetime64[D]'), np.empty(0, dtype=str), np.empty(0, dtype=np.int64)
+
+        dates, pharmacies, cents = (np.concatenate(column) for column in zip(*parts))
+        keep = (dates >= np.datetime64(start, 'D')) & (dates <= np.datetime64(end, 'D'))
+        if pharmacy:
+            keep &= pharmacies == pharmacy
+        dates, pharmacies, cents = dates[keep], pharmacies[keep], cents[keep]
+
+        # Sort by date and pharmacy, later appends after earlier ones, and keep the last of each
+        order = np.lexsort((np.arange(len(dates)), pharmacies, dates))
+        dates, pharmacies, cents = dates[order], pharmacies[order], cents[order]
+        last = np.ones(len(dates), dtype=bool)
+        last[:-1] = (dates[1:] != dates[:-1]) | (pharmacies[1:] != pharmacies[:-1])
+        return dates[last], pharmacies[last], cents[last]
+
+    def query(
+        self,
+        medication: str,
+        start: datetime.date,
+        end: datetime.date,
+        pharmacy: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Price observations of a medication in a date range.
+
+        Args:
+            medication: Medication name (case-insensitive)
+            start: First date (inclusive)
+            end: Last date (inclusive)
+            pharmacy: Pharmacy chain to limit the results to (optional)
+
+        Returns:
+            DataFrame with date, pharmacy and monthly_cost columns, sorted by date and pharmacy
+        """
+        dates, pharmacies, cents = self._observations(medication, start, end, pharmacy)
+        return pd.DataFrame({
+            'date': dates.astype('datetime64[ns]'),
+            'pharmacy': pharmacies.astype(object),
+            'monthly_cost': cents / 100,
+        })
+
+    def _cheapest_by_day(
+        self,
+        medication: str,
+        days: int,
+        end: Optional[datetime.date],
+        pharmacy: Optional[str]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(days with observations, cheapest price in cents on each, every price in cents) in the window."""
+        end = end or datetime.date.today()
+        dates, _, cents = self._observations(medication, end - datetime.timedelta(days=days - 1), end, pharmacy)
+        if not len(dates):
+            return dates, cents, cents
+        starts = np.flatnonzero(np.concatenate(([True], dates[1:] != dates[:-1])))
+        return dates[starts], np.minimum.reduceat(cents, starts), cents
+
+    def cheapest_by_day(
+        self,
+        medication: str,
+        days: int = DEFAULT_WINDOW_DAYS,
+        end: Optional[datetime.date] = None,
+        pharmacy: Optional[str] = None
+    ) -> pd.Series:
+        """
+        Cheapest observed price per day over the last `days` days.
+
+        Returns:
+            Series of monthly costs indexed by date (empty if there are no observations)
+        """
+        dates, cheapest, _ = self._cheapest_by_day(medication, days, end, pharmacy)
+        return pd.Series(cheapest / 100, index=pd.DatetimeIndex(dates.astype('datetime64[ns]'), name='date'),
+                         name='monthly_cost')
+
+    def summary(
+        self,
+        medication: str,
+        days: int = DEFAULT_WINDOW_DAYS,
+        end: Optional[datetime.date] = None,
+        pharmacy: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Minimum, average and maximum price and the price trend over the last `days` days.
+
+        The trend is fitted to the cheapest price of each day, so a chain
+        that stops reporting does not show up as a price change.
+
+        Args:
+            medication: Medication name
+            days: Window length in days
+            end: Last day of the window (defaults to today)
+            pharmacy: Pharmacy chain to limit the summary to (optional)
+
+        Returns:
+            Dictionary with days, start, end, min, avg, max, first, last,
+            change, change_pct, trend ('rising', 'falling' or 'stable') and
+            observations, or None if there are no observations in the window
+        """
+        dates, cheapest, cents = self._cheapest_by_day(medication, days, end, pharmacy)
+        if not len(dates):
+            return None
+
+        daily = cheapest / 100
+        avg = float(cents.mean()) / 100
+
+        if len(daily) > 1:
+            offsets = (dates - dates[0]).astype(np.float64)
+            slope = np.polyfit(offsets, daily, 1)[0]
+            fitted_change = slope * (days - 1)
+        else:
+            fitted_change = 0.0
+        if fitted_change > TREND_THRESHOLD * avg:
+            trend = "rising"
+        elif fitted_change < -TREND_THRESHOLD * avg:
+            trend = "falling"
+        else:
+            trend = "stable"
+
+        first, last = float(daily[0]), float(daily[-1])
+        return {
+            'days': days,
+            'start': dates[0].astype(datetime.date),
+            'end': dates[-1].astype(datetime.date),
+            'min': float(cents.min()) / 100,
+            'avg': avg,
+            'max': float(cents.max()) / 100,
+            'first': first,
+            'last': last,
+            'change': last - first,
+            'change_pct': (last - first) / first * 100 if first else 0.0,
+            'trend': trend,
+            'observations': len(cents),
+        }
+
+
+_history: Optional[PriceHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_price_history(directory: str = PRICE_HISTORY_DIR) -> PriceHistory:
+    """Get the shared price history store."""
+    global _history
+
+    if _history is None or _history.directory != directory:
+        with _history_lock:
+            if _history is None or _history.directory != directory:
+                _history = PriceHistory(directory)
+    return _history
+
+
+def record_prices(prices: pd.DataFrame, directory: str = PRICE_HISTORY_DIR) -> int:
+    """Append price observations to the history (see `PriceHistory.append`)."""
+    try:
+        return get_price_history(directory).append(prices)
+    except OSError as e:
+        print(f"Error recording price history: {e}")
+        return 0
+
+
+def compact_price_history(months: Iterable[str], directory: str = PRICE_HISTORY_DIR) -> int:
+    """
+    Merge each month's segments into one (see `PriceHistory.compact`).
+
+    Returns:
+        Number of months that had more than one segment
+    """
+    history = get_price_history(directory)
+    compacted = 0
+    for month in sorted(set(months)):
+        try:
+            compacted += history.compact(month) > 0
+        except OSError as e:
+            print(f"Error compacting price history for {month}: {e}")
+    return compacted
+
+
+def get_price_summary(
+    medication: str,
+    days: int = DEFAULT_WINDOW_DAYS,
+    pharmacy: Optional[str] = None,
+    end: Optional[datetime.date] = None
+) -> Optional[Dict]:
+    """Price summary for a medication over the last `days` days (see `PriceHistory.summary`)."""
+    return get_price_history().summary(medication, days, end, pharmacy)
+
+
+def get_price_trend_chart(
+    medication: str,
+    days: int = DEFAULT_WINDOW_DAYS,
+    pharmacy: Optional[str] = None,
+    end: Optional[datetime.date] = None
+) -> Optional[pd.DataFrame]:
+    """Cheapest price per day for a line chart, or None if there are no observations."""
+    daily = get_price_history().cheapest_by_day(medication, days, end, pharmacy)
+    if daily.empty:
+        return None
+    return daily.rename('Cheapest Price').rename_axis('Date').to_frame()
+
+
+def describe_price_summary(summary: Optional[Dict]) -> Optional[str]:
+    """One-line text for a price summary, or None if there is none."""
+    if not summary:
+        return None
+    return (f"${summary['min']:.2f} to ${summary['max']:.2f} over the last {summary['days']} days "
+            f"(average ${summary['avg']:.2f}); {summary['trend']}, {summary['change_pct']:+.1f}%")
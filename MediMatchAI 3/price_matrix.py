@@ -0,0 +1,236 @@
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pharmacy_prices import (
+    LOCAL_PHARMACY,
+    PHARMACY_PRICES_CSV,
+    is_independent_pharmacy,
+    load_pharmacy_prices,
+    normalize_pharmacy_name
+)
+
+# Pharmacy value meaning "fill wherever it is cheapest"
+ANY_PHARMACY = "Any"
+
+
+class PriceMatrix:
+    """
+    Dense medications x pharmacies matrix of monthly costs.
+
+    Missing prices are NaN. Lookups take a batch of medication names and
+    return NumPy arrays, so ranking a whole drug class is a handful of array
+    operations instead of a Python loop per candidate.
+    """
+
+    def __init__(self, medication_keys: Sequence[str], pharmacies: Sequence[str], prices: np.ndarray):
+        self.medication_keys = list(medication_keys)
+        self.pharmacies = list(pharmacies)
+        self.prices = prices
+        self.row_index = pd.Index(self.medication_keys)
+        self.pharmacy_index = {name: i for i, name in enumerate(self.pharmacies)}
+
+        # Cheapest pharmacy per medication, precomputed once for "Any" queries
+        self.best_column, self.best_price = self._cheapest(np.arange(len(self.pharmacies)))
+        # Cheapest pharmacy outside the known chains, for LOCAL_PHARMACY queries
+        independent = [col for col, name in enumerate(self.pharmacies) if is_independent_pharmacy(name)]
+        self.local_column, self.local_price = self._cheapest(np.array(independent, dtype=np.int64))
+
+    def _cheapest(self, columns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Cheapest of `columns` per medication, as (column, price); -1 and NaN where none prices it."""
+        if not self.prices.size or not len(columns):
+            return np.full(len(self.medication_keys), -1), np.full(len(self.medication_keys), np.nan)
+        prices = self.prices[:, columns]
+        has_price = ~np.isnan(prices).all(axis=1)
+        filled = np.where(np.isnan(prices), np.inf, prices)
+        return np.where(has_price, columns[filled.argmin(axis=1)], -1), np.where(has_price, filled.min(axis=1), np.nan)
+
+    @property
+    def empty(self) -> bool:
+        return not self.prices.size
+
+    def rows(self, medication_names: Sequence[str]) -> np.ndarray:
+        """Matrix row for each medication name (-1 when the medication has no prices)."""
+        keys = pd.Index([str(name).lower() for name in medication_names])
+        return self.row_index.get_indexer(keys)
+
+    def fill_costs(
+        self,
+        medication_names: Sequence[str],
+        base_costs: Sequence[float],
+        pharmacy: str = ANY_PHARMACY
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Monthly cost and pharmacy for filling each medication.
+
+        Args:
+            medication_names: Medications to price
+            base_costs: Catalog average cost for each medication, used when
+                there is no pharmacy price
+            pharmacy: Pharmacy, "Any" for the cheapest pharmacy, or
+                LOCAL_PHARMACY for the cheapest pharmacy outside the known chains
+
+        Returns:
+            Tuple of (costs, pharmacies); pharmacies holds the pharmacy the
+            cost comes from, or None where the catalog average was used
+        """
+        base = np.asarray(base_costs, dtype=float)
+        rows = self.rows(medication_names)
+        known = rows >= 0
+        no_pharmacy = np.full(len(rows), None, dtype=object)
+
+        if self.empty or not known.any():
+            return base, no_pharmacy
+
+        safe_rows = np.where(known, rows, 0)
+
+        if pharmacy in (None, "", ANY_PHARMACY):
+            price = np.where(known, self.best_price[safe_rows], np.nan)
+            column = np.where(known, self.best_column[safe_rows], -1)
+        elif normalize_pharmacy_name(pharmacy) == LOCAL_PHARMACY:
+            price = np.where(known, self.local_price[safe_rows], np.nan)
+            column = np.where(known, self.local_column[safe_rows], -1)
+        else:
+            col = self.pharmacy_index.get(normalize_pharmacy_name(pharmacy))
+            if col is None:
+                return base, no_pharmacy
+            price = np.where(known, self.prices[safe_rows, col], np.nan)
+            column = np.full(len(rows), col)
+
+        priced = ~np.isnan(price)
+        costs = np.where(priced, price, base)
+
+        names = np.array(self.pharmacies + [None], dtype=object)
+        pharmacies = np.where(priced, names[np.where(column >= 0, column, -1)], None)
+
+        return costs, pharmacies
+
+    def quotes(self, medication_name: str) -> List[Tuple[str, float]]:
+        """Monthly cost at every pharmacy that prices a medication, as (pharmacy, cost) tuples, cheapest first."""
+        row = self.rows([medication_name])[0]
+        if self.empty or row < 0:
+            return []
+        prices = self.prices[row]
+        priced = np.flatnonzero(~np.isnan(prices))
+        order = priced[np.argsort(prices[priced], kind='stable')]
+        return [(self.pharmacies[col], float(prices[col])) for col in order]
+
+    def cheapest_fills(
+        self,
+        medication_names: Sequence[str],
+        base_costs: Sequence[float],
+        budget: Optional[float] = None,
+        pharmacy: str = ANY_PHARMACY
+    ) -> pd.DataFrame:
+        """
+        Cheapest place to fill each medication, optionally limited to a budget.
+
+        Args:
+            medication_names: Candidate medications (e.g. every member of a class)
+            base_costs: Catalog average cost for each medication
+            budget: Maximum monthly cost (optional)
+            pharmacy: Pharmacy chain, or "Any" for the cheapest pharmacy
+
+        Returns:
+            DataFrame with name, cost and pharmacy columns, cheapest first
+        """
+        costs, pharmacies = self.fill_costs(medication_names, base_costs, pharmacy)
+        keep = costs <= budget if budget else np.ones(len(costs), dtype=bool)
+        order = np.flatnonzero(keep)[np.argsort(costs[keep], kind='stable')]
+
+        return pd.DataFrame({
+            'name': np.asarray(medication_names, dtype=object)[order],
+            'cost': costs[order],
+            'pharmacy': pharmacies[order],
+        })
+
+
+def build_price_matrix(prices: pd.DataFrame) -> PriceMatrix:
+    """
+    Build a price matrix from the normalized per-pharmacy price table.
+
+    Args:
+        prices: DataFrame from `pharmacy_prices.load_pharmacy_prices`
+
+    Returns:
+        PriceMatrix with one row per priced medication
+    """
+    if prices.empty:
+        return PriceMatrix([], [], np.empty((0, 0)))
+
+    drug_codes, drug_keys = pd.factorize(prices['drug'].str.lower())
+    pharmacy_codes, pharmacies = pd.factorize(prices['pharmacy'])
+
+    matrix = np.full((len(drug_keys), len(pharmacies)), np.nan)
+    matrix[drug_codes, pharmacy_codes] = prices['monthly_cost'].to_numpy(dtype=float)
+
+    return PriceMatrix(list(drug_keys), list(pharmacies), matrix)
+
+
+_matrix: Optional[PriceMatrix] = None
+_matrix_mtime: Optional[float] = None
+_matrix_lock = threading.Lock()
+
+
+def get_price_matrix(path: str = PHARMACY_PRICES_CSV) -> PriceMatrix:
+    """
+    Get the shared price matrix, rebuilding it when the price table changes.
+
+    Returns:
+        PriceMatrix (empty if no price feed has been ingested)
+    """
+    global _matrix, _matrix_mtime
+
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    if _matrix is not None and mtime == _matrix_mtime:
+        return _matrix
+
+    with _matrix_lock:
+        if _matrix is None or mtime != _matrix_mtime:
+            _matrix = build_price_matrix(load_pharmacy_prices(path))
+            _matrix_mtime = mtime
+        return _matrix
+
+
+def get_fill_costs(
+    medications: List[Dict],
+    pharmacy: str = ANY_PHARMACY,
+    name_key: str = 'name',
+    cost_key: str = 'avg_cost'
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Price a list of medication records at a pharmacy.
+
+    Args:
+        medications: Medication dictionaries from the catalog
+        pharmacy: Pharmacy chain, or "Any" for the cheapest pharmacy
+        name_key: Key holding the medication name
+        cost_key: Key holding the catalog average cost
+
+    Returns:
+        Tuple of (costs, pharmacies) as returned by `PriceMatrix.fill_costs`
+    """
+    names = [med[name_key] for med in medications]
+    base_costs = [med[cost_key] for med in medications]
+    return get_price_matrix().fill_costs(names, base_costs, pharmacy)
+
+
+def get_price_quotes(medication_name: str) -> List[Tuple[str, float]]:
+    """Pharmacy price quotes for a medication (see `PriceMatrix.quotes`)."""
+    return get_price_matrix().quotes(medication_name)
+
+
+def describe_availability(fill_pharmacy: Optional[str], pharmacy: str = ANY_PHARMACY) -> str:
+    """Availability text for a recommendation priced at a pharmacy."""
+    if fill_pharmacy:
+        if pharmacy in (None, "", ANY_PHARMACY):
+            return f"Lowest price at {fill_pharmacy}"
+        return f"Available at {fill_pharmacy}"
+
+    if pharmacy not in (None, "", ANY_PHARMACY):
+        return f"No {pharmacy} price on file; showing the average price"
+
+    return "Available at most pharmacies"
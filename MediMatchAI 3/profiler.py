@@ -0,0 +1,235 @@
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# Profile every wrapped call when set to 1 (otherwise only calls inside `profile_request`)
+PROFILE_ENV = "MEDIMATCH_PROFILE"
+
+# Only calls slower than this many milliseconds are written out
+PROFILE_THRESHOLD_ENV = "MEDIMATCH_PROFILE_THRESHOLD_MS"
+DEFAULT_THRESHOLD_MS = 250.0
+
+# Milliseconds between stack samples
+PROFILE_INTERVAL_ENV = "MEDIMATCH_PROFILE_INTERVAL_MS"
+DEFAULT_INTERVAL_MS = 5.0
+
+# Directory the folded-stack files are written to
+PROFILE_DIR_ENV = "MEDIMATCH_PROFILE_DIR"
+DEFAULT_PROFILE_DIR = os.path.join("data", "profiles")
+
+
+def _env_enabled() -> bool:
+    return os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes")
+
+
+# Read once, since wrapped calls check it on every call
+_enabled = _env_enabled()
+
+
+def is_enabled() -> bool:
+    """Whether every wrapped call is profiled (MEDIMATCH_PROFILE at startup, or `set_enabled`)."""
+    return _enabled
+
+
+def set_enabled(enabled: bool):
+    """Turn profiling of every wrapped call on or off for this process."""
+    global _enabled
+    _enabled = enabled
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        print(f"Warning: ignoring invalid {name}={os.environ[name]!r}")
+        return default
+
+
+def get_profile_dir() -> str:
+    return os.environ.get(PROFILE_DIR_ENV, DEFAULT_PROFILE_DIR)
+
+
+class _Session:
+    """Samples collected for one profiled call on one thread."""
+
+    def __init__(self, name: str, root):
+        self.name = name
+        self.root = root
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler for selected calls.
+
+    A background thread wakes every `interval_ms` and records the stack of
+    each thread that is inside a profiled call, from the profiled function
+    down. Nothing runs while no call is being profiled, and the profiled
+    threads themselves are never traced.
+    """
+
+    def __init__(self, interval_ms: Optional[float] = None):
+        self.interval_ms = interval_ms
+        self._sessions: Dict[int, _Session] = {}
+        self._wake = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.profiles_written = 0
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._wake:
+                while not self._sessions:
+                    self._wake.wait()
+            interval = self.interval_ms or _env_float(PROFILE_INTERVAL_ENV, DEFAULT_INTERVAL_MS)
+            time.sleep(interval / 1000)
+
+            frames = sys._current_frames()
+            for thread_id, session in list(self._sessions.items()):
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and frame is not session.root:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if frame is None:
+                    continue  # The profiled call has already returned
+                stack.append(_frame_label(frame))
+                session.stacks[";".join(reversed(stack))] += 1
+                session.samples += 1
+
+    def start(self, name: str, root) -> _Session:
+        session = _Session(name, root)
+        with self._wake:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="medimatch-profiler", daemon=True)
+                self._thread.start()
+            self._sessions[threading.get_ident()] = session
+            self._wake.notify()
+        return session
+
+    def stop(self) -> Optional[_Session]:
+        with self._wake:
+            return self._sessions.pop(threading.get_ident(), None)
+
+    def write(self, session: _Session, elapsed_ms: float, directory: Optional[str] = None) -> Optional[str]:
+        """
+        Write a session's samples as folded stacks ("frame;frame;frame count" per line).
+
+        The files load directly into flamegraph.pl, speedscope or inferno.
+
+        Returns:
+            Path of the written file, or None if nothing was sampled
+        """
+        if not session.stacks:
+            return None
+        directory = directory or get_profile_dir()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(
+                directory,
+                f"{session.name}-{time.strftime('%Y%m%d-%H%M%S')}-{elapsed_ms:.0f}ms-{threading.get_ident()}.folded"
+            )
+            with open(path, "w") as f:
+                for stack, count in session.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            print(f"Error writing profile for {session.name}: {e}")
+            return None
+        self.profiles_written += 1
+        return path
+
+
+_profiler = SamplingProfiler()
+_local = threading.local()
+
+
+@contextmanager
+def profile_request(threshold_ms: Optional[float] = None):
+    """
+    Profile the wrapped calls made on this thread inside the block, even when
+    profiling is not enabled for the process.
+
+    Args:
+        threshold_ms: Write calls slower than this (defaults to MEDIMATCH_PROFILE_THRESHOLD_MS)
+    """
+    previous = getattr(_local, 'request', None)
+    _local.request = {'threshold_ms': threshold_ms}
+    try:
+        yield
+    finally:
+        _local.request = previous
+
+
+def with_profiling(func: Callable, threshold_ms: Optional[float] = None) -> Callable:
+    """Wrap `func` so it runs inside `profile_request` on whichever thread calls it."""
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        with profile_request(threshold_ms):
+            return func(*args, **kwargs)
+    return run
+
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """
+    Decorator that samples a function's call tree when profiling is on.
+
+    Profiling is on for every call when MEDIMATCH_PROFILE=1, or for calls
+    inside `profile_request`. A call slower than the threshold is written to
+    the profile directory as a folded-stack file; faster calls are dropped.
+    Calls made while an outer profiled call is running on the same thread
+    are part of the outer profile.
+
+    Args:
+        name: Profile file name prefix (defaults to the function name)
+    """
+    def decorate(func: Callable) -> Callable:
+        profile_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            request = getattr(_local, 'request', None)
+            if (request is None and not _enabled) or getattr(_local, 'active', False):
+                return func(*args, **kwargs)
+
+            threshold_ms = request.get('threshold_ms') if request else None
+            if threshold_ms is None:
+                threshold_ms = _env_float(PROFILE_THRESHOLD_ENV, DEFAULT_THRESHOLD_MS)
+
+            _local.active = True
+            session = _profiler.start(profile_name, sys._getframe())
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                _profiler.stop()
+                _local.active = False
+                if elapsed_ms >= threshold_ms:
+                    path = _profiler.write(session, elapsed_ms)
+                    if path:
+                        print(f"Slow {profile_name} call ({elapsed_ms:.0f}ms) profiled to {path}")
+
+        return wrapper
+    return decorate
+
+
+def get_profiler_stats() -> Dict:
+    """Whether profiling is enabled, the threshold and the number of profiles written."""
+    return {
+        'enabled': is_enabled(),
+        'threshold_ms': _env_float(PROFILE_THRESHOLD_ENV, DEFAULT_THRESHOLD_MS),
+        'profiles_written': _profiler.profiles_written,
+    }
@@ -0,0 +1,157 @@
+import functools
+import re
+from typing import Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from assistant_answers import INTERACTION_ENTITIES, SUPPLEMENT_ENTITIES
+from session_store import SharedResults
+
+# Answers kept for all sessions, and how long each stays valid in seconds
+ANSWER_CACHE_SIZE = 2048
+ANSWER_CACHE_TTL = 3600.0
+
+# Distinct (question, medication) pairs whose canonical form is remembered
+CANONICAL_CACHE_SIZE = 4096
+
+# Words that carry no meaning for matching a question
+STOPWORDS = frozenset("""
+    a an the i me my we our you your it its this that these those is are am was were be been being
+    do does did can could will would should shall may might must have has had of on in at to for
+    with and or if so about from by as while when taking take taken use using there here
+    ok okay fine alright please tell know want wondering just really still also
+""".split())
+
+# Words mapped to one spelling, so phrasings of the same question match
+SYNONYMS = {
+    "drink": "alcohol", "drinks": "alcohol", "drinking": "alcohol", "booze": "alcohol",
+    "beer": "alcohol", "beers": "alcohol", "wine": "alcohol", "liquor": "alcohol",
+    "mix": "combine", "mixing": "combine", "combining": "combine", "together": "combine",
+    "interact": "interaction", "interacts": "interaction", "interactions": "interaction",
+    "conflicts": "conflict",
+    "price": "cost", "prices": "cost", "costs": "cost", "pay": "cost", "expensive": "cost",
+    "cheap": "cheaper", "less": "cheaper",
+    "safely": "safe", "safety": "safe", "dangerous": "safe", "risky": "safe",
+    "supplements": "supplement", "vitamins": "vitamin",
+    "meds": "medication", "med": "medication", "medicine": "medication", "drug": "medication",
+    "medications": "medication", "pill": "medication", "pills": "medication",
+    "alternatives": "alternative", "treats": "treat", "treating": "treat", "used": "treat",
+}
+
+# Spellings of each entity, replaced by one token before the question is split into words
+ENTITY_ALIASES = {
+    "st. john's wort": ["st. john's wort", "st john's wort", "st. johns wort", "st johns wort",
+                        "saint john's wort", "st. john", "st john"],
+    "omega-3": ["omega-3", "omega 3", "omega3", "fish oil"],
+    "vitamin d": ["vitamin d"],
+    "advil": ["advil", "ibuprofen"],
+    "tylenol": ["tylenol", "acetaminophen"],
+}
+_ENTITY_PATTERNS = []
+for _entity in INTERACTION_ENTITIES + SUPPLEMENT_ENTITIES:
+    for _alias in sorted(ENTITY_ALIASES.get(_entity, [_entity]), key=len, reverse=True):
+        _ENTITY_PATTERNS.append((_alias, _entity))
+_ENTITY_PATTERNS.sort(key=lambda pattern: len(pattern[0]), reverse=True)
+_ENTITY_RE = re.compile("|".join(r"\b" + re.escape(alias) + r"\b" for alias, _ in _ENTITY_PATTERNS))
+_ENTITY_BY_ALIAS = dict(_ENTITY_PATTERNS)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+class CanonicalQuestion(NamedTuple):
+    """A question reduced to the words that matter."""
+    text: str
+    entities: Tuple[str, ...]
+
+
+def _entity_token(entity: str) -> str:
+    return "<" + entity + ">"
+
+
+@functools.lru_cache(maxsize=CANONICAL_CACHE_SIZE)
+def canonicalize_question(question: str, medication: Optional[str] = None) -> CanonicalQuestion:
+    """
+    Reduce a question to a canonical form shared by its phrasings.
+
+    The question is lowercased, known medications and supplements are
+    extracted as entities, punctuation and stopwords are dropped, synonyms
+    are mapped to one word and the remaining words are sorted. Mentions of
+    the selected medication are dropped, since "this" means the same thing.
+    "can i drink on zoloft" and "Is alcohol OK with Zoloft?" both become
+    "alcohol" for Zoloft.
+
+    Args:
+        question: The user's question
+        medication: Name of the selected medication, if any
+
+    Returns:
+        CanonicalQuestion with the canonical text and the entities mentioned
+    """
+    q = question.lower()
+    selected = medication.lower() if medication else None
+
+    entities = []
+
+    def extract(match) -> str:
+        entity = _ENTITY_BY_ALIAS[match.group(0)]
+        if entity != selected and entity not in entities:
+            entities.append(entity)
+        return " "
+
+    q = _ENTITY_RE.sub(extract, q)
+
+    words = set()
+    for word in _WORD_RE.findall(q):
+        word = SYNONYMS.get(word, word)
+        if word not in STOPWORDS and word != selected:
+            words.add(word)
+    words.update(_entity_token(entity) for entity in entities)
+
+    return CanonicalQuestion(" ".join(sorted(words)), tuple(sorted(entities)))
+
+
+_answer_cache = SharedResults(ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+
+
+def get_cached_answer(key: Hashable, answer: Callable[[], str]) -> str:
+    """
+    Get an answer from the process-wide answer cache shared by every session.
+
+    Args:
+        key: From `answer_cache_key`
+        answer: Computes the answer on a miss
+
+    Returns:
+        The answer text
+    """
+    return _answer_cache.get(key, answer)
+
+
+def answer_cache_key(canonical: CanonicalQuestion, intent: Hashable, medication: Optional[str],
+                     alternative: Optional[str], catalog_version: Hashable) -> tuple:
+    """
+    Cache key for an answer.
+
+    The intent the rules classify the raw question as is part of the key,
+    so two phrasings only share an answer when the rules treat them alike.
+
+    Args:
+        canonical: From `canonicalize_question`
+        intent: Classification of the raw question (see `assistant_answers.classify_intent`)
+        medication: Name of the selected medication, if any
+        alternative: Name of the selected alternative, if any
+        catalog_version: Version of the catalog the answer was computed from
+    """
+    return (
+        canonical.text,
+        intent,
+        medication.lower() if medication else None,
+        alternative.lower() if alternative else None,
+        catalog_version,
+    )
+
+
+def clear_answer_cache():
+    _answer_cache.clear()
+
+
+def get_answer_cache_stats() -> Dict:
+    """Statistics for the process-wide answer cache."""
+    return _answer_cache.stats()
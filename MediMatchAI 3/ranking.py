@@ -0,0 +1,184 @@
+import heapq
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Weight of each ranking criterion; every criterion scores candidates from 0 (worst) to 1 (best)
+DEFAULT_WEIGHTS = {
+    'cost': 0.5,           # Lower out-of-pocket monthly cost
+    'coverage': 0.15,      # Larger share of the price paid by insurance
+    'side_effects': 0.15,  # Fewer listed side effects
+    'generic': 0.1,        # Generic rather than brand name
+    'availability': 0.1,   # Priced at the requested (or any) pharmacy
+}
+
+# Criterion value used when a candidate has no data for it (e.g. supplements)
+UNKNOWN_SCORE = 0.5
+
+# Number of listed side effects that scores 0 on the side-effect criterion
+SIDE_EFFECTS_SCALE = 10
+
+
+def resolve_weights(weights: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    Merge caller weights over the defaults and normalize them to sum to 1.
+
+    Args:
+        weights: Weights for some or all criteria; set a criterion to 0 to ignore it
+
+    Returns:
+        Dictionary with a weight for every criterion
+    """
+    merged = dict(DEFAULT_WEIGHTS)
+    if weights:
+        unknown = set(weights) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise ValueError(f"Unknown ranking criteria: {sorted(unknown)}")
+        merged.update({name: float(value) for name, value in weights.items()})
+
+    if any(value < 0 for value in merged.values()):
+        raise ValueError("Ranking weights must not be negative")
+
+    total = sum(merged.values())
+    if total <= 0:
+        raise ValueError("At least one ranking weight must be positive")
+    return {name: value / total for name, value in merged.items()}
+
+
+def count_side_effects(side_effects: Sequence) -> np.ndarray:
+    """Number of side effects per candidate, comma-separated or already split (NaN when not listed)."""
+    counts = np.full(len(side_effects), np.nan)
+    for i, value in enumerate(side_effects):
+        if isinstance(value, (list, tuple)):
+            if value:
+                counts[i] = len(value)
+        elif isinstance(value, str) and value.strip() and value != "Information not available":
+            counts[i] = sum(1 for effect in value.split(',') if effect.strip())
+    return counts
+
+
+def candidate_criteria(
+    candidates: List[Dict],
+    patient_costs: Optional[Sequence[float]] = None,
+    reference_cost: Optional[float] = None,
+    cost_key: str = 'avg_cost'
+) -> Dict[str, np.ndarray]:
+    """
+    Score every candidate on every criterion.
+
+    Scores are absolute rather than relative to the other candidates, so a
+    candidate scores the same whichever shortlist it is ranked in.
+
+    Args:
+        candidates: Recommendation dictionaries ('avg_cost', 'is_brand',
+            'side_effects' and 'pharmacy' are used when present)
+        patient_costs: Out-of-pocket cost per candidate (defaults to the price)
+        reference_cost: What the patient pays today; a candidate costing
+            nothing scores 1 and one costing this much or more scores 0
+            (defaults to the most expensive candidate)
+        cost_key: Key holding the price
+
+    Returns:
+        Dictionary mapping criterion name to an array of scores in [0, 1]
+    """
+    prices = np.array([float(candidate.get(cost_key, np.nan)) for candidate in candidates])
+    paid = prices if patient_costs is None else np.asarray(patient_costs, dtype=float)
+
+    if reference_cost is None:
+        reference_cost = np.nanmax(paid) if paid.size and not np.isnan(paid).all() else 0.0
+    if reference_cost > 0:
+        cost = np.clip(1 - np.nan_to_num(paid, nan=reference_cost) / reference_cost, 0.0, 1.0)
+    else:
+        cost = np.ones(len(paid))
+
+    side_effect_counts = count_side_effects([candidate.get('side_effects') for candidate in candidates])
+    side_effects = np.where(
+        np.isnan(side_effect_counts),
+        UNKNOWN_SCORE,
+        np.clip(1 - side_effect_counts / SIDE_EFFECTS_SCALE, 0.0, 1.0)
+    )
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coverage = np.where(prices > 0, 1 - paid / prices, 0.0)
+
+    is_brand = [candidate.get('is_brand') for candidate in candidates]
+    generic = np.array([UNKNOWN_SCORE if brand is None else float(not brand) for brand in is_brand])
+
+    # Candidates without a pharmacy field (supplements, lifestyle changes) have no pharmacy data,
+    # and neither does any candidate when no pharmacy prices them (e.g. no price feed is loaded)
+    pharmacies = [candidate.get('pharmacy') for candidate in candidates]
+    priced_anywhere = any(pharmacies)
+    availability = np.array([
+        float(bool(pharmacy)) if priced_anywhere and 'pharmacy' in candidate else UNKNOWN_SCORE
+        for candidate, pharmacy in zip(candidates, pharmacies)
+    ])
+
+    return {
+        'cost': cost,
+        'coverage': np.clip(np.nan_to_num(coverage), 0.0, 1.0),
+        'side_effects': side_effects,
+        'generic': generic,
+        'availability': availability,
+    }
+
+
+def score(criteria: Dict[str, np.ndarray], weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """Weighted sum of the criterion scores for every candidate."""
+    weights = resolve_weights(weights)
+    total = None
+    for name, weight in weights.items():
+        if weight and name in criteria:
+            total = criteria[name] * weight if total is None else total + criteria[name] * weight
+    return total if total is not None else np.zeros(0)
+
+
+def top_k(scores: np.ndarray, k: Optional[int]) -> List[int]:
+    """
+    Indexes of the k highest scores, best first.
+
+    Uses a bounded heap, so selecting a few candidates out of thousands does
+    not sort the whole class. Ties keep the candidates' original order.
+
+    Args:
+        scores: Score per candidate
+        k: Number of candidates to keep (None keeps them all)
+
+    Returns:
+        List of candidate indexes
+    """
+    n = len(scores)
+    if k is None or k >= n:
+        k = n
+    if k <= 0:
+        return []
+    values = scores.tolist()
+    return heapq.nlargest(k, range(n), key=values.__getitem__)
+
+
+def rank_candidates(
+    candidates: List[Dict],
+    k: Optional[int] = None,
+    weights: Optional[Dict[str, float]] = None,
+    patient_costs: Optional[Sequence[float]] = None,
+    reference_cost: Optional[float] = None,
+    cost_key: str = 'avg_cost'
+) -> Tuple[List[int], np.ndarray]:
+    """
+    Score candidates on the weighted criteria and select the best k.
+
+    Args:
+        candidates: Recommendation dictionaries
+        k: Number of candidates to return (None for all)
+        weights: Criterion weights (see DEFAULT_WEIGHTS)
+        patient_costs: Out-of-pocket cost per candidate
+        reference_cost: What the patient pays for the prescribed medication
+        cost_key: Key holding the price
+
+    Returns:
+        Tuple of (indexes of the selected candidates, best first; score of every candidate)
+    """
+    if not candidates:
+        return [], np.zeros(0)
+
+    scores = score(candidate_criteria(candidates, patient_costs, reference_cost, cost_key), weights)
+    return top_k(scores, k), scores
@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 import random
 from typing import Dict, List, Optional, Union
 from medication_db import (
@@ -6,8 +7,20 @@ from medication_db import (
     get_medication_by_class, 
     get_generic_brand_pairs,
     get_brand_generic_pairs,
+    get_catalog_version,
+    get_compiled_catalog,
     load_medications
 )
+from compiled_catalog import CompiledCatalog, split_list
+from price_matrix import ANY_PHARMACY, describe_availability, get_fill_costs
+from price_history import get_price_summary, get_price_trend_chart
+from insurance import get_patient_costs
+from coalesce import get_flight, make_key
+from ranking import rank_candidates
+from side_effects import get_side_effect_index
+from pagination import DEFAULT_PAGE_SIZE, PagedResults
+from session_store import get_shared_results
+from profiler import profiled
 
 def identify_drug_class(medication: str) -> Optional[str]:
     """
@@ -60,12 +73,20 @@ def format_side_effects(side_effects: str) -> str:
     effects = [effect.strip() for effect in side_effects.split(',')]
     return ", ".join(effects)
 
-def check_if_generic_available(medication: str) -> Dict:
+def _side_effects_text(compiled: CompiledCatalog, med_info: Dict) -> str:
+    """Formatted side effects of a catalog medication, split when the catalog was compiled."""
+    row = compiled.row(med_info['name'])
+    if row is None:
+        return format_side_effects(med_info['side_effects'])
+    return compiled.lists['side_effects'].text(row) or "Information not available"
+
+def check_if_generic_available(medication: str, pharmacy: str = ANY_PHARMACY) -> Dict:
     """
     Check if a generic version is available for a brand-name medication.
     
     Args:
         medication: Name of the medication
+        pharmacy: Pharmacy to price both medications at ("Any" for the cheapest)
         
     Returns:
         Dictionary with generic information if available
@@ -87,33 +108,50 @@ def check_if_generic_available(medication: str) -> Dict:
         generic_info = get_medication_info(generic_name)
         
         if generic_info:
-            savings = med_info['avg_cost'] - generic_info['avg_cost']
-            savings_percent = (savings / med_info['avg_cost']) * 100
+            (original_cost, generic_cost), (_, fill_pharmacy) = get_fill_costs([med_info, generic_info], pharmacy)
+            savings = original_cost - generic_cost
+            savings_percent = (savings / original_cost) * 100
             
             return {
                 'name': generic_info['name'],
-                'avg_cost': generic_info['avg_cost'],
+                'avg_cost': float(generic_cost),
                 'savings': savings,
                 'savings_percent': savings_percent,
                 'recommendation_type': "Generic version available",
                 'explanation': f"This is a bioequivalent generic medication containing the same active ingredient as {medication}. It works the same way but costs {savings_percent:.0f}% less.",
-                'side_effects': format_side_effects(generic_info['side_effects']),
+                'side_effects': _side_effects_text(get_compiled_catalog(), generic_info),
                 'source': generic_info['source'],
-                'availability': "Available at most pharmacies"
+                'availability': describe_availability(fill_pharmacy, pharmacy),
+                'pharmacy': fill_pharmacy,
+                'is_brand': generic_info['is_brand']
             }
     
     return {}
 
-def find_cheaper_alternatives(medication: str, drug_class: str) -> List[Dict]:
+def find_cheaper_alternatives(
+    medication: str,
+    drug_class: str,
+    pharmacy: str = ANY_PHARMACY,
+    limit: Optional[int] = 3,
+    insurance: str = "None/Self-pay",
+    weights: Optional[Dict[str, float]] = None
+) -> List[Dict]:
     """
     Find cheaper alternatives in the same drug class.
     
+    Every cheaper member of the class is scored on the weighted ranking
+    criteria (see `ranking.DEFAULT_WEIGHTS`) and the best `limit` are kept.
+    
     Args:
         medication: Name of the medication
         drug_class: Drug class of the medication
+        pharmacy: Pharmacy to price the medications at ("Any" for the cheapest)
+        limit: Maximum number of alternatives (None for all)
+        insurance: Insurance provider used for the coverage and cost criteria
+        weights: Ranking criterion weights (optional)
         
     Returns:
-        List of dictionaries with alternative medications
+        List of dictionaries with alternative medications, best first
     """
     med_info = get_medication_info(medication)
     
@@ -126,37 +164,118 @@ def find_cheaper_alternatives(medication: str, drug_class: str) -> List[Dict]:
     # Filter out the original medication
     alternatives = [med for med in class_medications if med['name'].lower() != medication.lower()]
     
-    # Filter for cheaper alternatives
-    cheaper_alternatives = [
-        med for med in alternatives 
-        if med['avg_cost'] < med_info['avg_cost']
-    ]
-    
-    # Sort by cost (cheapest first)
-    cheaper_alternatives.sort(key=lambda x: x['avg_cost'])
+    # Price the prescribed medication and every alternative at the pharmacy in one pass
+    costs, fill_pharmacies = get_fill_costs([med_info] + alternatives, pharmacy)
+    original_cost, alt_costs = costs[0], costs[1:]
+    
+    # Only cheaper alternatives are candidates
+    compiled = get_compiled_catalog()
+    cheaper = np.flatnonzero(alt_costs < original_cost)
+    candidates = []
+    for i in cheaper:
+        row = compiled.row(alternatives[i]['name'])
+        candidates.append({
+            'name': alternatives[i]['name'],
+            'avg_cost': float(alt_costs[i]),
+            'is_brand': alternatives[i]['is_brand'],
+            # Already split, so ranking only counts them
+            'side_effects': compiled.lists['side_effects'][row] if row is not None else alternatives[i]['side_effects'],
+            'pharmacy': fill_pharmacies[i + 1]
+        })
+    
+    # Score every candidate against what the patient pays today and keep the
+    # best `limit` without sorting the whole class
+    patient_costs = get_patient_costs([{**med_info, 'avg_cost': float(original_cost)}] + candidates, insurance)
+    selected, scores = rank_candidates(candidates, limit, weights, patient_costs[1:], patient_costs[0])
     
     # Format the alternatives for display
     formatted_alternatives = []
-    for alt in cheaper_alternatives[:3]:  # Limit to top 3 cheapest
-        savings = med_info['avg_cost'] - alt['avg_cost']
-        savings_percent = (savings / med_info['avg_cost']) * 100
+    for j in selected:
+        i = cheaper[j]
+        alt = alternatives[i]
+        alt_cost = float(alt_costs[i])
+        fill_pharmacy = fill_pharmacies[i + 1]
+        savings = original_cost - alt_cost
+        savings_percent = (savings / original_cost) * 100
         
         formatted_alt = {
             'name': alt['name'],
-            'avg_cost': alt['avg_cost'],
+            'avg_cost': alt_cost,
             'savings': savings,
             'savings_percent': savings_percent,
             'recommendation_type': "Cheapest with similar effect",
             'explanation': f"This medication is in the same drug class ({drug_class}) as {medication} and may provide similar therapeutic benefits. It costs {savings_percent:.0f}% less than your prescribed medication.",
-            'side_effects': format_side_effects(alt['side_effects']),
+            'side_effects': _side_effects_text(compiled, alt),
             'source': alt['source'],
-            'availability': "Available at most pharmacies"
+            'availability': describe_availability(fill_pharmacy, pharmacy),
+            'pharmacy': fill_pharmacy,
+            'is_brand': alt['is_brand'],
+            'score': float(scores[j])
         }
         
         formatted_alternatives.append(formatted_alt)
     
     return formatted_alternatives
 
+def find_better_tolerated_alternatives(
+    medication: str,
+    limit: Optional[int] = 3,
+    pharmacy: str = ANY_PHARMACY
+) -> List[Dict]:
+    """
+    Find alternatives in the same drug class with the least side-effect overlap.
+    
+    Uses the precomputed medication x side-effect matrix, so the whole class
+    is compared in one vectorized pass.
+    
+    Args:
+        medication: Name of the medication
+        limit: Maximum number of alternatives (None for all)
+        pharmacy: Pharmacy to price the alternatives at ("Any" for the cheapest)
+        
+    Returns:
+        List of dictionaries with alternative medications, least overlap first
+    """
+    med_info = get_medication_info(medication)
+    
+    if not med_info:
+        return []
+    
+    matches = get_side_effect_index().least_overlap(med_info['name'], med_info['drug_class'], limit)
+    alternatives = [get_medication_info(match['name']) for match in matches]
+    if not alternatives:
+        return []
+    
+    costs, fill_pharmacies = get_fill_costs([med_info] + alternatives, pharmacy)
+    original_cost = costs[0]
+    compiled = get_compiled_catalog()
+    
+    results = []
+    for match, alt, alt_cost, fill_pharmacy in zip(matches, alternatives, costs[1:], fill_pharmacies[1:]):
+        shared = match['shared_side_effects']
+        if shared:
+            overlap_text = f"It shares {len(shared)} listed side effect(s) with {medication}: {', '.join(shared)}."
+        else:
+            overlap_text = f"None of its listed side effects are shared with {medication}."
+        
+        results.append({
+            'name': alt['name'],
+            'avg_cost': float(alt_cost),
+            'savings': float(original_cost - alt_cost),
+            'savings_percent': float((original_cost - alt_cost) / original_cost * 100) if original_cost else 0.0,
+            'recommendation_type': "Similar effect, different side effects",
+            'explanation': f"This medication is in the same drug class ({alt['drug_class']}) as {medication}. {overlap_text}",
+            'side_effects': _side_effects_text(compiled, alt),
+            'side_effect_overlap': match['jaccard'],
+            'shared_side_effects': shared,
+            'source': alt['source'],
+            'availability': describe_availability(fill_pharmacy, pharmacy),
+            'pharmacy': fill_pharmacy,
+            'is_brand': alt['is_brand']
+        })
+    
+    return results
+
 def suggest_alternative_treatments(medication: str) -> List[Dict]:
     """
     Suggest evidence-based alternative treatments or supplements.
@@ -297,17 +416,62 @@ def suggest_alternative_treatments(medication: str) -> List[Dict]:
     
     return []
 
+# Identical recommendation requests made at the same moment share one computation;
+# every caller other than the one that ran it gets its own copies of the dictionaries
+_recommendations_flight = get_flight(
+    "generate_recommendations",
+    copy_result=lambda recommendations: [dict(rec) for rec in recommendations]
+)
+
+@profiled()
 def generate_recommendations(
     medication: str,
     budget: Optional[float] = None,
     insurance: str = "None/Self-pay",
     allergies: Optional[str] = None,
     pharmacy: str = "Any",
-    include_holistic: bool = False
+    include_holistic: bool = False,
+    top_k: Optional[int] = 5,
+    weights: Optional[Dict[str, float]] = None
 ) -> List[Dict]:
     """
     Generate medication recommendations based on user inputs.
     
+    Concurrent calls with identical inputs are coalesced into one computation
+    (see `coalesce.get_coalescing_stats` for the counters).
+    
+    Args:
+        medication: The prescribed medication
+        budget: Monthly budget constraint (optional)
+        insurance: Insurance provider (optional)
+        allergies: Allergies or restrictions (optional)
+        pharmacy: Preferred pharmacy (optional)
+        include_holistic: Whether to include holistic/alternative options
+        top_k: Number of recommendations to return (None for all)
+        weights: Ranking criterion weights (see `ranking.DEFAULT_WEIGHTS`)
+        
+    Returns:
+        List of recommendation dictionaries, best first
+    """
+    key = make_key(medication, budget, insurance, allergies, pharmacy, include_holistic, top_k, weights)
+    return _recommendations_flight.do(
+        key, _generate_recommendations, medication, budget, insurance, allergies, pharmacy, include_holistic,
+        top_k, weights
+    )
+
+def _generate_recommendations(
+    medication: str,
+    budget: Optional[float] = None,
+    insurance: str = "None/Self-pay",
+    allergies: Optional[str] = None,
+    pharmacy: str = "Any",
+    include_holistic: bool = False,
+    top_k: Optional[int] = 5,
+    weights: Optional[Dict[str, float]] = None
+) -> List[Dict]:
+    """
+    Compute medication recommendations (uncoalesced).
+    
     Args:
         medication: The prescribed medication
         budget: Monthly budget constraint (optional)
@@ -315,9 +479,11 @@ def generate_recommendations(
         allergies: Allergies or restrictions (optional)
         pharmacy: Preferred pharmacy (optional)
         include_holistic: Whether to include holistic/alternative options
+        top_k: Number of recommendations to return (None for all)
+        weights: Ranking criterion weights (see `ranking.DEFAULT_WEIGHTS`)
         
     Returns:
-        List of recommendation dictionaries
+        List of recommendation dictionaries, best first
     """
     recommendations = []
     
@@ -335,12 +501,16 @@ def generate_recommendations(
     
     # Check if generic is available (if prescribed medication is brand name)
     if med_info['is_brand']:
-        generic = check_if_generic_available(medication)
+        generic = check_if_generic_available(medication, pharmacy)
         if generic:
             recommendations.append(generic)
     
-    # Find cheaper alternatives in the same drug class
-    cheaper_alternatives = find_cheaper_alternatives(medication, drug_class)
+    # Find cheaper alternatives in the same drug class, priced at the preferred pharmacy.
+    # Budget and allergy filters run afterwards, so keep every candidate when they apply.
+    alternatives_limit = None if (budget and budget > 0) or allergies else top_k
+    cheaper_alternatives = find_cheaper_alternatives(
+        medication, drug_class, pharmacy, alternatives_limit, insurance, weights
+    )
     recommendations.extend(cheaper_alternatives)
     
     # Add alternative treatments if requested
@@ -348,32 +518,279 @@ def generate_recommendations(
         alternative_treatments = suggest_alternative_treatments(medication)
         recommendations.extend(alternative_treatments)
     
-    # Filter by budget if provided
+    return rank_recommendations(med_info, recommendations, budget, insurance, allergies, top_k, weights, pharmacy)
+
+def rank_recommendations(
+    med_info: Dict,
+    recommendations: List[Dict],
+    budget: Optional[float] = None,
+    insurance: str = "None/Self-pay",
+    allergies: Optional[str] = None,
+    top_k: Optional[int] = 5,
+    weights: Optional[Dict[str, float]] = None,
+    pharmacy: str = ANY_PHARMACY
+) -> List[Dict]:
+    """
+    Price, filter and rank the candidate recommendations for a medication.
+    
+    Args:
+        med_info: The prescribed medication's catalog record
+        recommendations: Candidates (generic, cheaper alternatives, alternative treatments)
+        budget: Monthly budget constraint (optional)
+        insurance: Insurance provider (optional)
+        allergies: Allergies or restrictions (optional)
+        top_k: Number of recommendations to return (None for all)
+        weights: Ranking criterion weights (see `ranking.DEFAULT_WEIGHTS`)
+        pharmacy: Pharmacy the candidates were priced at ("Any" for the cheapest)
+        
+    Returns:
+        List of recommendation dictionaries, best first
+    """
+    # Apply the insurance plan's copays and coinsurance to every candidate in one pass
+    patient_costs = get_patient_costs(recommendations, insurance)
+    for rec, patient_cost in zip(recommendations, patient_costs):
+        rec['patient_cost'] = float(patient_cost)
+    
+    # Filter by budget if provided (the budget is what the patient pays)
     if budget and budget > 0:
-        recommendations = [rec for rec in recommendations if rec['avg_cost'] <= budget]
+        recommendations = [rec for rec in recommendations if rec['patient_cost'] <= budget]
     
     # Filter by allergies if provided
     if allergies:
         # This is a simplified implementation. A real system would need a more sophisticated
         # allergy checking mechanism against medication ingredients
-        allergy_terms = [a.strip().lower() for a in allergies.split(',')]
+        allergy_terms = [a.lower() for a in split_list(allergies)]
         filtered_recs = []
         
         for rec in recommendations:
             # Skip if any allergy term appears in side effects or explanation
-            should_skip = any(
-                term in rec.get('side_effects', '').lower() or 
-                term in rec.get('explanation', '').lower()
-                for term in allergy_terms
-            )
+            side_effects = rec.get('side_effects', '').lower()
+            explanation = rec.get('explanation', '').lower()
+            should_skip = any(term in side_effects or term in explanation for term in allergy_terms)
             
             if not should_skip:
                 filtered_recs.append(rec)
         
         recommendations = filtered_recs
     
-    # Sort by cost (cheapest first)
-    recommendations.sort(key=lambda x: x['avg_cost'])
+    # Score every remaining candidate against what the patient pays today and keep the best top_k.
+    # The prescribed medication is priced at the same pharmacy as the candidates, as in
+    # `find_cheaper_alternatives`, so both rankings use one baseline.
+    (original_cost,), _ = get_fill_costs([med_info], pharmacy)
+    original_patient_cost = get_patient_costs([{**med_info, 'avg_cost': float(original_cost)}], insurance)[0]
+    selected, scores = rank_candidates(
+        recommendations, top_k, weights, [rec['patient_cost'] for rec in recommendations], original_patient_cost
+    )
+    for i in selected:
+        recommendations[i]['score'] = float(scores[i])
+    
+    return [recommendations[i] for i in selected]
+
+# Result tabs: (key, label, recommendation type shown (None for all), message when empty)
+RESULT_TABS = [
+    ('all', "All Options", None, "No recommendations found for this medication."),
+    ('generics', "Generics", "Generic version available", "No generic alternatives found for this medication."),
+    ('affordability', "Affordability", "Cheapest with similar effect",
+     "No affordability alternatives found for this medication."),
+    ('treatments', "Alternative Treatments", "Alternative treatment",
+     "No alternative treatments found for this medication."),
+]
+
+def build_results_view(
+    medication: str,
+    recommendations: List[Dict],
+    insurance: Optional[str] = None,
+    med_info: Optional[Dict] = None,
+    pharmacy: str = ANY_PHARMACY
+) -> Dict:
+    """
+    Build everything the results page shows, once per search.
+    
+    Partitions the recommendations into the result tabs, so re-rendering
+    the page never re-filters recommendations or looks the prescribed
+    medication up again. Cards are materialized a page at a time by
+    `get_results_page`.
+    
+    Args:
+        medication: The prescribed medication as entered
+        recommendations: Recommendations from `generate_recommendations`
+        insurance: Insurance provider the costs were computed for
+        med_info: Prescribed medication record (looked up when not given)
+        pharmacy: Pharmacy the costs were computed for
+        
+    Returns:
+        Dictionary with 'medication', 'original' (the prescribed medication
+        record), 'original_cost' (its monthly cost at the pharmacy, as the
+        ranking priced it), 'insurance', 'recommendations' and 'tabs' (key,
+        label, empty_message and 'items', the indexes of the tab's recommendations)
+    """
+    if med_info is None:
+        med_info = get_medication_info(medication)
+    
+    original_cost = None
+    if med_info:
+        (original_cost,), _ = get_fill_costs([med_info], pharmacy)
+    
+    tabs = []
+    for key, label, recommendation_type, empty_message in RESULT_TABS:
+        items = [
+            i for i, rec in enumerate(recommendations)
+            if recommendation_type is None or rec['recommendation_type'] == recommendation_type
+        ]
+        tabs.append({'key': key, 'label': label, 'empty_message': empty_message, 'items': items})
+    
+    return {
+        'medication': medication,
+        'original': med_info,
+        'original_cost': None if original_cost is None else float(original_cost),
+        'insurance': insurance,
+        'recommendations': recommendations,
+        'tabs': tabs,
+        # Materialized cards by recommendation index, shared by every tab
+        'cards': {},
+        # PagedResults by (tab, page size)
+        'pages': {},
+    }
+
+def _results_card(view: Dict, index: int) -> Dict:
+    """
+    Materialize one recommendation card with its cost comparison against the
+    prescribed medication and its recent price history.
+    """
+    med_info = view['original']
+    rec = view['recommendations'][index]
+    return {
+        'index': index,
+        'recommendation': rec,
+        'cost_chart': pd.DataFrame(
+            {'Monthly Cost': [view['original_cost'], rec['avg_cost']]},
+            index=pd.Index([med_info['name'], rec['name']], name='Medication')
+        ),
+        'price_summary': get_price_summary(rec['name']),
+        'price_trend': get_price_trend_chart(rec['name']),
+    }
+
+def get_results_pages(view: Dict, tab: str = 'all', page_size: int = DEFAULT_PAGE_SIZE) -> PagedResults:
+    """
+    Get the paginated cards of one results tab.
+    
+    Args:
+        view: Results view from `build_results_view`
+        tab: Tab key (see RESULT_TABS)
+        page_size: Cards per page
+        
+    Returns:
+        PagedResults whose cards have 'index', 'recommendation', 'cost_chart',
+        'price_summary' and 'price_trend' (see `price_history`; None without history)
+    """
+    key = (tab, page_size)
+    pages = view['pages'].get(key)
+    if pages is None:
+        items = next((t['items'] for t in view['tabs'] if t['key'] == tab), None)
+        if items is None:
+            raise ValueError(f"Unknown results tab: {tab}")
+        pages = view['pages'][key] = PagedResults(
+            items, lambda index: _results_card(view, index), page_size, view['cards']
+        )
+    return pages
+
+def get_results_page(
+    view: Dict,
+    tab: str = 'all',
+    cursor: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE
+) -> Dict:
+    """
+    Get one page of a results tab; the next page is prepared in the background.
+    
+    Args:
+        view: Results view from `build_results_view`
+        tab: Tab key (see RESULT_TABS)
+        cursor: Cursor from the previous page's 'next_cursor' (None for the first page)
+        page_size: Cards per page
+        
+    Returns:
+        Dictionary with 'cards', 'cursor', 'next_cursor' (None on the last page) and 'total'
+    """
+    return get_results_pages(view, tab, page_size).page(cursor)
+
+def generate_results_view(
+    medication: str,
+    budget: Optional[float] = None,
+    insurance: str = "None/Self-pay",
+    allergies: Optional[str] = None,
+    pharmacy: str = "Any",
+    include_holistic: bool = False,
+    top_k: Optional[int] = 5,
+    weights: Optional[Dict[str, float]] = None
+) -> Optional[Dict]:
+    """
+    Generate recommendations and build the results view for them.
+    
+    Takes the same arguments as `generate_recommendations`.
     
-    # Limit to top 5 recommendations
-    return recommendations[:5]
+    Returns:
+        Results view dictionary (see `build_results_view`), or None when
+        the medication is unknown or there are no recommendations
+    """
+    med_info = get_medication_info(medication)
+    if not med_info:
+        return None
+    
+    recommendations = generate_recommendations(
+        medication, budget, insurance, allergies, pharmacy, include_holistic, top_k, weights
+    )
+    if not recommendations:
+        return None
+    
+    return build_results_view(medication, recommendations, insurance, med_info, pharmacy)
+
+def make_results_query(
+    medication: str,
+    budget: Optional[float] = None,
+    insurance: str = "None/Self-pay",
+    allergies: Optional[str] = None,
+    pharmacy: str = "Any",
+    include_holistic: bool = False,
+    top_k: Optional[int] = 5,
+    weights: Optional[Dict[str, float]] = None
+) -> Dict:
+    """
+    Build the compact query a session keeps instead of its results.
+    
+    Takes the same arguments as `generate_recommendations` and records the
+    catalog version the search ran against.
+    
+    Returns:
+        Dictionary of the search parameters plus 'catalog_version'
+    """
+    return {
+        'medication': medication,
+        'budget': budget,
+        'insurance': insurance,
+        'allergies': allergies,
+        'pharmacy': pharmacy,
+        'include_holistic': include_holistic,
+        'top_k': top_k,
+        'weights': weights,
+        'catalog_version': get_catalog_version(),
+    }
+
+def get_results_view(query: Dict) -> Optional[Dict]:
+    """
+    Resolve a results query (see `make_results_query`) to its results view.
+    
+    Views are shared by every session in the process and keyed by the query
+    and the current catalog version, so identical searches share one copy
+    and a catalog update produces fresh results.
+    
+    Args:
+        query: Compact results query
+        
+    Returns:
+        Results view dictionary (see `build_results_view`; shared, do not
+        modify) or None when there are no recommendations
+    """
+    params = {key: value for key, value in query.items() if key != 'catalog_version'}
+    key = make_key('results_view', params, get_catalog_version())
+    return get_shared_results(key, lambda: generate_results_view(**params))
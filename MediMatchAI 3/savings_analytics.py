@@ -0,0 +1,318 @@
+import argparse
+import os
+import time
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+
+from medication_db import get_brand_generic_pairs, get_compiled_catalog
+from pharmacy_prices import normalize_pharmacy_name
+from price_matrix import ANY_PHARMACY, get_price_matrix
+
+# Prescription rows parsed per chunk; bounds memory use regardless of input size
+PRESCRIPTION_CHUNK_SIZE = 500000
+
+# Top savings opportunities reported by default
+DEFAULT_TOP_N = 10
+
+# Distinct unmatched medication names kept as examples
+UNMATCHED_EXAMPLES = 10
+
+# Accepted header spellings for each prescription column; only the medication is required
+PRESCRIPTION_COLUMN_ALIASES = {
+    "medication": ["medication", "medication_name", "drug", "drug_name", "name"],
+    "pharmacy": ["pharmacy", "pharmacy_name", "chain", "store"],
+    "months": ["months", "months_supply", "fills", "refills"],
+}
+
+# Best way to save on a prescription
+GENERIC = "generic"
+ALTERNATIVE = "alternative"
+
+
+def _resolve_columns(header: Iterable[str]) -> Dict[str, str]:
+    """Map each prescription column name to its normalized name."""
+    lookup = {}
+    for column in header:
+        key = str(column).strip().lower().replace(' ', '_')
+        for normalized, aliases in PRESCRIPTION_COLUMN_ALIASES.items():
+            if key in aliases and normalized not in lookup.values():
+                lookup[column] = normalized
+                break
+
+    if "medication" not in lookup.values():
+        raise ValueError("Prescriptions are missing a medication column")
+
+    return lookup
+
+
+def build_savings_table(pharmacy: str = ANY_PHARMACY) -> pd.DataFrame:
+    """
+    Monthly savings available on each catalog medication, priced at a pharmacy.
+
+    The generic option is the brand's generic equivalent (as in
+    `check_if_generic_available`); the alternative option is the cheapest
+    other member of the drug class (the most `find_cheaper_alternatives`
+    can save). Savings that would cost more are zero.
+
+    Args:
+        pharmacy: Pharmacy chain to price at, or "Any" for the cheapest pharmacy
+
+    Returns:
+        DataFrame with one row per medication (in compiled catalog order) and
+        name, drug_class, is_brand, cost, generic, generic_savings,
+        alternative, alternative_savings, best_option and savings columns
+    """
+    compiled = get_compiled_catalog()
+    costs, _ = get_price_matrix().fill_costs(compiled.names, compiled.numbers['avg_cost'], pharmacy)
+
+    table = pd.DataFrame({
+        'name': compiled.names,
+        'drug_class': compiled.values['drug_class'],
+        'is_brand': np.array([bool(is_brand) for is_brand in compiled.values['is_brand']], dtype=bool),
+        'cost': costs,
+    })
+
+    # Generic equivalent of each brand, where the generic is in the catalog
+    pairs = get_brand_generic_pairs()
+    generic_rows = np.array([compiled.row(pairs[name]) if name in pairs else None for name in table['name']],
+                            dtype=object)
+    has_generic = np.array([row is not None for row in generic_rows], dtype=bool)
+    generic_rows = np.where(has_generic, generic_rows, 0).astype(np.int64)
+    table['generic'] = np.where(has_generic, table['name'].to_numpy(dtype=object)[generic_rows], None)
+    priced = np.isfinite(costs)
+    generic_priced = has_generic & priced & priced[generic_rows]
+    table['generic_savings'] = np.where(generic_priced, np.maximum(costs - costs[generic_rows], 0.0), 0.0)
+
+    # Cheapest member of each class; a medication that is its class's cheapest has no cheaper alternative.
+    # Medications with no class or no cost have no alternative.
+    classed = priced & table['drug_class'].notna().to_numpy() & (table['drug_class'] != "").to_numpy()
+    cheapest = table[classed].groupby('drug_class', sort=False)['cost'].idxmin()
+    cheapest_rows = table['drug_class'].map(cheapest).where(classed, 0).fillna(0).to_numpy(dtype=np.int64)
+    alternative_savings = np.where(classed, np.maximum(costs - costs[cheapest_rows], 0.0), 0.0)
+    table['alternative'] = np.where(alternative_savings > 0, table['name'].to_numpy(dtype=object)[cheapest_rows], None)
+    table['alternative_savings'] = alternative_savings
+
+    use_generic = (table['generic_savings'] > 0) & (table['generic_savings'] >= table['alternative_savings'])
+    table['best_option'] = np.where(use_generic, GENERIC, np.where(alternative_savings > 0, ALTERNATIVE, None))
+    table['savings'] = np.maximum(table['generic_savings'], table['alternative_savings'])
+    return table
+
+
+class SavingsAccumulator:
+    """
+    Running totals of prescriptions per medication and pharmacy.
+
+    Each batch is reduced to counts per catalog medication with
+    `np.bincount`, so memory is bounded by the catalog size and the number
+    of pharmacies rather than by the number of prescriptions. Savings are
+    constant per medication and pharmacy, so they are applied once to the
+    totals at the end.
+    """
+
+    def __init__(self):
+        self.index = pd.Index([name.lower() for name in get_compiled_catalog().names])
+        # pharmacy -> (prescriptions, months supplied) per catalog medication
+        self.totals: Dict[str, tuple] = {}
+        self.rows_read = 0
+        self.rows_matched = 0
+        self.unmatched_examples: List[str] = []
+        self.pharmacy_names: Dict[str, str] = {}
+
+    def _pharmacy(self, raw) -> str:
+        if raw not in self.pharmacy_names:
+            text = str(raw).strip()
+            self.pharmacy_names[raw] = (ANY_PHARMACY if not text or text.lower() in ("any", "nan")
+                                        else normalize_pharmacy_name(text))
+        return self.pharmacy_names[raw]
+
+    def add(self, batch: pd.DataFrame):
+        """
+        Add a batch of prescriptions.
+
+        Args:
+            batch: DataFrame with a medication column and optional pharmacy and
+                months (months supplied, default 1) columns
+        """
+        self.rows_read += len(batch)
+        names = batch['medication'].astype(str).str.strip().str.lower()
+        rows = self.index.get_indexer(names)
+        matched = rows >= 0
+        self.rows_matched += int(matched.sum())
+
+        if not matched.all() and len(self.unmatched_examples) < UNMATCHED_EXAMPLES:
+            for name in batch.loc[~matched, 'medication'].astype(str).unique():
+                if name not in self.unmatched_examples:
+                    self.unmatched_examples.append(name)
+                    if len(self.unmatched_examples) >= UNMATCHED_EXAMPLES:
+                        break
+
+        if 'months' in batch:
+            months = pd.to_numeric(batch['months'], errors='coerce').fillna(1.0).clip(lower=0).to_numpy()
+        else:
+            months = np.ones(len(batch))
+        if 'pharmacy' in batch:
+            pharmacies = batch['pharmacy'].fillna("").map(self._pharmacy).to_numpy()
+        else:
+            pharmacies = np.full(len(batch), ANY_PHARMACY, dtype=object)
+
+        rows, months, pharmacies = rows[matched], months[matched], pharmacies[matched]
+        for pharmacy in pd.unique(pharmacies):
+            in_pharmacy = pharmacies == pharmacy
+            counts = np.bincount(rows[in_pharmacy], minlength=len(self.index))
+            supplied = np.bincount(rows[in_pharmacy], weights=months[in_pharmacy], minlength=len(self.index))
+            if pharmacy in self.totals:
+                previous_counts, previous_supplied = self.totals[pharmacy]
+                counts, supplied = previous_counts + counts, previous_supplied + supplied
+            self.totals[pharmacy] = (counts, supplied)
+
+    def per_medication(self) -> pd.DataFrame:
+        """Prescriptions and savings per medication and pharmacy, with the savings table columns."""
+        frames = []
+        for pharmacy, (counts, supplied) in self.totals.items():
+            table = build_savings_table(pharmacy)
+            table['pharmacy'] = pharmacy
+            table['prescriptions'] = counts
+            table['months'] = supplied
+            frames.append(table[counts > 0])
+        if not frames:
+            return pd.DataFrame(columns=['name', 'drug_class', 'is_brand', 'pharmacy', 'prescriptions', 'months',
+                                         'savings', 'total_savings', 'generic_substitutable'])
+        result = pd.concat(frames, ignore_index=True)
+        result['total_savings'] = result['savings'] * result['months']
+        result['generic_substitutable'] = np.where(result['generic_savings'] > 0, result['prescriptions'], 0)
+        return result
+
+    def result(self, top_n: int = DEFAULT_TOP_N) -> Dict:
+        """
+        Population-level savings over every prescription added so far.
+
+        Args:
+            top_n: Number of top savings opportunities
+
+        Returns:
+            Dictionary with prescriptions, matched, unmatched,
+            unmatched_examples, total_monthly_savings, total_savings,
+            generic_share, generic_substitution_rate, by_class (one dictionary
+            per drug class, most savings first) and top_opportunities (one
+            dictionary per medication and pharmacy, most savings first)
+        """
+        per_medication = self.per_medication()
+        matched = self.rows_matched
+
+        by_class = per_medication.groupby('drug_class', sort=False).agg(
+            prescriptions=('prescriptions', 'sum'),
+            total_savings=('total_savings', 'sum'),
+            generic_substitutable=('generic_substitutable', 'sum'),
+        )
+        by_class['generic_substitution_rate'] = by_class['generic_substitutable'] / by_class['prescriptions']
+        by_class = by_class.sort_values('total_savings', ascending=False, kind='stable').reset_index()
+
+        monthly = per_medication['savings'] * per_medication['prescriptions']
+        opportunities = per_medication[per_medication['total_savings'] > 0]
+        top = opportunities.nlargest(top_n, 'total_savings') if top_n else opportunities.iloc[:0]
+
+        return {
+            'prescriptions': self.rows_read,
+            'matched': matched,
+            'unmatched': self.rows_read - matched,
+            'unmatched_examples': list(self.unmatched_examples),
+            'total_monthly_savings': float(monthly.sum()),
+            'total_savings': float(per_medication['total_savings'].sum()),
+            'generic_share': float(per_medication.loc[~per_medication['is_brand'].astype(bool), 'prescriptions'].sum()
+                                   / matched) if matched else 0.0,
+            'generic_substitution_rate': float(per_medication['generic_substitutable'].sum() / matched)
+            if matched else 0.0,
+            'by_class': by_class.to_dict('records'),
+            'top_opportunities': [
+                {
+                    'medication': row['name'],
+                    'drug_class': row['drug_class'],
+                    'pharmacy': row['pharmacy'],
+                    'prescriptions': int(row['prescriptions']),
+                    'monthly_savings': float(row['savings']),
+                    'total_savings': float(row['total_savings']),
+                    'best_option': row['best_option'],
+                    'switch_to': row['generic'] if row['best_option'] == GENERIC else row['alternative'],
+                }
+                for row in top.to_dict('records')
+            ],
+        }
+
+
+def analyze_prescriptions(
+    prescriptions: Union[str, pd.DataFrame, Iterable[pd.DataFrame]],
+    top_n: int = DEFAULT_TOP_N,
+    chunksize: int = PRESCRIPTION_CHUNK_SIZE
+) -> Dict:
+    """
+    Compute population-level savings over a batch of prescriptions in one pass.
+
+    A CSV is read in fixed-size chunks and each chunk is reduced to per-medication
+    counts before the next is read, so inputs far larger than memory are fine.
+
+    Args:
+        prescriptions: CSV path, DataFrame, or iterable of DataFrame batches, with a
+            medication column and optional pharmacy and months columns
+        top_n: Number of top savings opportunities
+        chunksize: Number of CSV rows parsed at a time
+
+    Returns:
+        Dictionary as returned by `SavingsAccumulator.result`, plus elapsed
+        seconds and rows per second
+    """
+    start = time.perf_counter()
+
+    if isinstance(prescriptions, str):
+        header = pd.read_csv(prescriptions, nrows=0).columns
+        column_map = _resolve_columns(header)
+        batches = pd.read_csv(
+            prescriptions,
+            usecols=list(column_map),
+            dtype={column: str for column, name in column_map.items() if name in ('medication', 'pharmacy')},
+            chunksize=chunksize
+        )
+    elif isinstance(prescriptions, pd.DataFrame):
+        batches = [prescriptions]
+    else:
+        batches = prescriptions
+
+    accumulator = SavingsAccumulator()
+    for batch in batches:
+        accumulator.add(batch.rename(columns=_resolve_columns(batch.columns)))
+
+    result = accumulator.result(top_n)
+    elapsed = time.perf_counter() - start
+    result['elapsed_seconds'] = elapsed
+    result['rows_per_second'] = result['prescriptions'] / elapsed if elapsed > 0 else 0.0
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Population-level savings over a batch of prescriptions.")
+    parser.add_argument("prescriptions", help="CSV with a medication column and optional pharmacy and months columns")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_N, help="Top savings opportunities to list")
+    parser.add_argument("--chunksize", type=int, default=PRESCRIPTION_CHUNK_SIZE, help="Rows parsed per chunk")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.prescriptions):
+        parser.error(f"{args.prescriptions} does not exist")
+
+    stats = analyze_prescriptions(args.prescriptions, args.top, args.chunksize)
+
+    print(f"Read {stats['prescriptions']:,} prescriptions in {stats['elapsed_seconds']:.1f}s "
+          f"({stats['rows_per_second']:,.0f} rows/second); {stats['unmatched']:,} not in the catalog "
+          f"{stats['unmatched_examples']}")
+    print(f"Potential savings: ${stats['total_monthly_savings']:,.2f}/month "
+          f"(${stats['total_savings']:,.2f} over the months supplied)")
+    print(f"Already generic: {stats['generic_share']:.1%}; "
+          f"could switch to a generic: {stats['generic_substitution_rate']:.1%}")
+    print("By drug class:")
+    for row in stats['by_class']:
+        print(f"  {row['drug_class']}: {row['prescriptions']:,} prescriptions, ${row['total_savings']:,.2f}, "
+              f"{row['generic_substitution_rate']:.1%} generic-substitutable")
+    print("Top savings opportunities:")
+    for row in stats['top_opportunities']:
+        print(f"  {row['medication']} at {row['pharmacy']} -> {row['switch_to']} ({row['best_option']}): "
+              f"{row['prescriptions']:,} prescriptions, ${row['total_savings']:,.2f}")
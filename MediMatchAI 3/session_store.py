@@ -0,0 +1,148 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+# Search results kept for all sessions; the least recently used are rebuilt on demand
+SHARED_RESULTS_SIZE = 256
+
+
+class SharedResults:
+    """
+    Process-wide LRU cache of search results, shared by every user session.
+
+    Sessions keep only the compact query that produced their results and
+    resolve the results here on each render. Identical searches share one
+    copy, and an evicted or expired entry is simply rebuilt from the query.
+    """
+
+    def __init__(self, size: int = SHARED_RESULTS_SIZE, ttl: Optional[float] = None):
+        """
+        Args:
+            size: Maximum number of entries
+            ttl: Seconds an entry stays valid (None keeps entries until evicted)
+        """
+        self.size = size
+        self.ttl = ttl
+        # key -> (expiry time or None, value)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """
+        Get the results for a key, building them on a miss.
+
+        Args:
+            key: Identifies the search (query parameters and catalog version)
+            build: Computes the results
+
+        Returns:
+            The shared results (treat as read-only)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or time.monotonic() < expires:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+
+        value = build()
+
+        with self._lock:
+            expires = time.monotonic() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Entries, hits, misses (including expired entries) and hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+_shared_results = SharedResults()
+
+
+def get_shared_results(key: Hashable, build: Callable[[], Any]) -> Any:
+    """Get results from the process-wide cache shared by every session (see `SharedResults.get`)."""
+    return _shared_results.get(key, build)
+
+
+def get_shared_results_stats() -> Dict:
+    """Statistics for the process-wide results cache."""
+    return _shared_results.stats()
+
+
+def deep_sizeof(value: Any, seen: set = None) -> int:
+    """
+    Approximate memory held by a value and everything it references, in bytes.
+
+    Objects referenced more than once are counted once.
+    """
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (0 if value.base is None else value.nbytes)
+
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, Mapping):
+        return size + sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(deep_sizeof(item, seen) for item in value)
+    if hasattr(value, '__dict__'):
+        return size + deep_sizeof(vars(value), seen)
+    return size
+
+
+def measure_session_state(state: Mapping) -> Dict:
+    """
+    Measure the memory one session's state holds.
+
+    Args:
+        state: The session state (e.g. `st.session_state`) or any mapping
+
+    Returns:
+        Dictionary with 'total_bytes' and 'keys' (bytes per key, largest first)
+    """
+    seen: set = set()
+    sizes = {str(key): deep_sizeof(state[key], seen) for key in list(state.keys())}
+    return {
+        'total_bytes': sum(sizes.values()),
+        'keys': dict(sorted(sizes.items(), key=lambda item: item[1], reverse=True)),
+    }
@@ -0,0 +1,189 @@
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import medication_db
+from compiled_catalog import CompiledCatalog, ListColumn
+
+
+class SideEffectIndex:
+    """
+    Sparse medication x side-effect matrix in CSR form.
+
+    Row i's effects are `indices[indptr[i]:indptr[i + 1]]`, numbered by the
+    shared `effects` vocabulary of lowercase effect names. Rows are those of
+    the compiled catalog, whose side-effect lists are already split. Overlap between one medication and any set
+    of rows is computed in a single vectorized pass, so a whole drug class is
+    compared without building a dense matrix.
+    """
+
+    def __init__(self, names: Sequence[str], drug_classes: Sequence[str], side_effects: ListColumn,
+                 row_index: Optional[Dict[str, int]] = None):
+        self.names = names
+
+        # Effect names differing only in case or spacing are one effect
+        self.vocabulary: Dict[str, int] = {}
+        self.effects: List[str] = []
+        effect_of_item = np.zeros(len(side_effects.vocabulary), dtype=np.int64)
+        for code, item in enumerate(side_effects.vocabulary):
+            effect = " ".join(item.split()).lower()
+            if effect not in self.vocabulary:
+                self.vocabulary[effect] = len(self.effects)
+                self.effects.append(effect)
+            effect_of_item[code] = self.vocabulary[effect]
+
+        # Keep the first listing of each effect per row, in listed order
+        entries = effect_of_item[side_effects.codes]
+        owners = side_effects.entry_rows()
+        _, first = np.unique(owners * max(len(self.effects), 1) + entries, return_index=True)
+        first.sort()
+
+        self.indices = entries[first]
+        lengths = np.bincount(owners[first], minlength=len(self.names)).astype(np.int64)
+        self.indptr = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.indptr[1:])
+        self.row_lengths = lengths
+
+        # Row of each row entry in `indices`, used to sum per-row overlaps
+        self.entry_rows = np.repeat(np.arange(len(self.names)), lengths)
+
+        # lowercase name -> row (shared with the compiled catalog when built from one)
+        self.row_index: Dict[str, int] = row_index
+        if row_index is None:
+            self.row_index = {}
+            for row, name in enumerate(self.names):
+                self.row_index.setdefault(str(name).lower(), row)
+
+        self.class_rows: Dict[str, np.ndarray] = {}
+        grouped: Dict[str, List[int]] = {}
+        for row, drug_class in enumerate(drug_classes):
+            if isinstance(drug_class, str):
+                grouped.setdefault(drug_class.lower(), []).append(row)
+        for key, rows in grouped.items():
+            self.class_rows[key] = np.array(rows, dtype=np.int64)
+
+    def row_effects(self, row: int) -> np.ndarray:
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def overlap(self, row: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Shared-effect counts and Jaccard similarity between one row and others.
+
+        Args:
+            row: Row of the reference medication
+            rows: Rows to compare against (defaults to every row)
+
+        Returns:
+            Tuple of (shared effect count, Jaccard similarity) per compared row
+        """
+        marked = np.zeros(len(self.effects), dtype=np.int64)
+        marked[self.row_effects(row)] = 1
+
+        if rows is None:
+            shared = np.bincount(self.entry_rows, weights=marked[self.indices], minlength=len(self.names))
+            lengths = self.row_lengths
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            lengths = self.row_lengths[rows]
+            # Gather the compared rows' entries, then sum the marks per row
+            starts = self.indptr[rows]
+            owner = np.repeat(np.arange(len(rows)), lengths)
+            offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            entries = self.indices[np.repeat(starts, lengths) + offsets]
+            shared = np.bincount(owner, weights=marked[entries], minlength=len(rows))
+
+        union = self.row_lengths[row] + lengths - shared
+        with np.errstate(divide='ignore', invalid='ignore'):
+            jaccard = np.where(union > 0, shared / union, 0.0)
+        return shared.astype(np.int64), jaccard
+
+    def pairwise_similarity(self, rows: Sequence[int]) -> np.ndarray:
+        """Dense Jaccard similarity matrix between a (small) set of rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return np.vstack([self.overlap(int(row), rows)[1] for row in rows]) if len(rows) else np.zeros((0, 0))
+
+    def least_overlap(
+        self,
+        medication: str,
+        drug_class: Optional[str] = None,
+        limit: Optional[int] = 5
+    ) -> List[Dict]:
+        """
+        Medications with the least side-effect overlap with `medication`.
+
+        Args:
+            medication: Reference medication name
+            drug_class: Only compare within this class (defaults to the whole catalog)
+            limit: Maximum number of results (None for all)
+
+        Returns:
+            List of dictionaries with name, jaccard, shared_side_effects and
+            side_effect_count, least overlap first (fewer side effects break ties)
+        """
+        row = self.row_index.get(str(medication).lower())
+        if row is None:
+            return []
+
+        rows = self.class_rows.get(drug_class.lower(), np.zeros(0, dtype=np.int64)) if drug_class else None
+        candidates = np.arange(len(self.names)) if rows is None else rows
+        candidates = candidates[candidates != row]
+        if not len(candidates):
+            return []
+
+        shared, jaccard = self.overlap(row, candidates)
+
+        # Only sort the candidates that can make the cut
+        pool = np.arange(len(candidates))
+        if limit is not None and limit < len(candidates):
+            if limit <= 0:
+                return []
+            cutoff = np.partition(jaccard, limit - 1)[limit - 1]
+            pool = np.flatnonzero(jaccard <= cutoff)
+        order = pool[np.lexsort((self.row_lengths[candidates[pool]], jaccard[pool]))]
+        if limit is not None:
+            order = order[:limit]
+
+        reference = set(self.row_effects(row).tolist())
+        results = []
+        for i in order:
+            candidate = int(candidates[i])
+            results.append({
+                'name': self.names[candidate],
+                'jaccard': float(jaccard[i]),
+                'shared_side_effects': [self.effects[e] for e in self.row_effects(candidate) if e in reference],
+                'side_effect_count': int(self.row_lengths[candidate]),
+            })
+        return results
+
+
+def build_side_effect_index(compiled: CompiledCatalog, class_key: str = 'drug_class',
+                            side_effects_key: str = 'side_effects') -> SideEffectIndex:
+    """Build a side-effect index from a compiled catalog's split side-effect lists."""
+    return SideEffectIndex(compiled.names, compiled.values[class_key], compiled.lists[side_effects_key],
+                           compiled.row_index)
+
+
+_index: Optional[SideEffectIndex] = None
+_index_source: Optional[CompiledCatalog] = None
+_index_lock = threading.Lock()
+
+
+def get_side_effect_index() -> SideEffectIndex:
+    """
+    Get the side-effect index for the medications catalog.
+
+    Built from the compiled catalog whenever it is recompiled (once per
+    catalog version), so lookups never re-split side effects.
+    """
+    global _index, _index_source
+
+    compiled = medication_db.get_compiled_catalog()
+    if _index is not None and compiled is _index_source:
+        return _index
+
+    with _index_lock:
+        if _index is None or compiled is not _index_source:
+            _index = build_side_effect_index(compiled)
+            _index_source = compiled
+        return _index
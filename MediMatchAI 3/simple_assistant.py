@@ -1,6 +1,11 @@
 
 
 from typing import Dict, List, Optional, Tuple
+from insurance import SELF_PAY_PLAN, describe_patient_cost
+from profiler import profiled
+from assistant_answers import GENERAL, MEDICATION_INTENTS, classify_intent, get_answer_table
+from bm25 import search_knowledge
+from question_cache import answer_cache_key, canonicalize_question, get_cached_answer
 
 class SimpleAssistant:
     """
@@ -112,6 +117,9 @@ class SimpleAssistant:
             }
         }
         
+        # Longest passage quoted in a search-based answer
+        self.max_passage_chars = 400
+        
         # Information about drug classes
         self.drug_classes = {
             "nsaid": "NSAIDs (Non-Steroidal Anti-Inflammatory Drugs) reduce pain, fever, and inflammation by blocking certain enzymes in the body.",
@@ -123,11 +131,85 @@ class SimpleAssistant:
             "ppi": "Proton Pump Inhibitors (PPIs) reduce stomach acid production by blocking the enzymes that produce acid."
         }
     
+    @profiled()
     def answer_question(self, question: str, medication_info: Optional[Dict] = None, 
                         alternative_info: Optional[Dict] = None) -> str:
         """
         Provide an answer to the user's question based on rule-based matching.
         
+        Questions that match no rule are answered with the best-matching
+        passages from the knowledge index (see `bm25`). Answers are cached for all sessions under the canonical form of the
+        question (see `question_cache`), so rephrasings of a question share
+        one answer. Answers that depend only on the medication come from the
+        precomputed answer table (see `assistant_answers`); the rest are computed.
+        
+        Args:
+            question: The user's question
+            medication_info: Information about the original medication (optional)
+            alternative_info: Information about the alternative medication (optional)
+            
+        Returns:
+            A text response to the question
+        """
+        medication = medication_info.get('Medication Name') if medication_info else None
+        alternative = alternative_info.get('name') if alternative_info else None
+        intent, entity = classify_intent(question, bool(medication_info), bool(alternative_info))
+        table = get_answer_table(self.rule_answer)
+        
+        canonical = canonicalize_question(question, medication)
+        
+        key = answer_cache_key(canonical, (intent, entity), medication, alternative, table.catalog_key)
+        return get_cached_answer(
+            key, lambda: self._compute_answer(question, medication_info, alternative_info, intent, entity, table,
+                                              canonical)
+        )
+    
+    def _compute_answer(self, question: str, medication_info: Optional[Dict], alternative_info: Optional[Dict],
+                        intent: str, entity: Optional[str], table, canonical) -> str:
+        # Free-form questions are answered from the knowledge index when it has something relevant
+        if intent == GENERAL:
+            answer = self.search_answer(canonical.text)
+            if answer:
+                return answer
+        
+        # Answers that mention the alternative are computed, except where the medication takes precedence
+        if intent in MEDICATION_INTENTS and (alternative_info is None or intent != 'without_insurance') \
+                and (medication_info or alternative_info is None):
+            medication = medication_info.get('Medication Name') if medication_info else None
+            answer = table.lookup(medication, intent, entity)
+            if answer is not None:
+                return answer
+        
+        return self.rule_answer(question, medication_info, alternative_info)
+    
+    def search_answer(self, question: str) -> Optional[str]:
+        """
+        Answer a free-form question with the best-matching knowledge passages.
+        
+        Args:
+            question: The question (canonical form, see `question_cache`)
+            
+        Returns:
+            The answer, or None if no passage is relevant enough
+        """
+        passages = search_knowledge(question)
+        if not passages:
+            return None
+        
+        response = "Here's what I found that may help:\n\n"
+        for passage in passages:
+            text = " ".join(passage['text'].split())
+            if len(text) > self.max_passage_chars:
+                text = text[:self.max_passage_chars].rsplit(" ", 1)[0] + "..."
+            response += f"**{passage['title']}:** {text}\n\n"
+        response += "For specific medical advice, please consult your healthcare provider."
+        return response
+    
+    def rule_answer(self, question: str, medication_info: Optional[Dict] = None, 
+                    alternative_info: Optional[Dict] = None) -> str:
+        """
+        Compute the rule-based answer to a question (see `answer_question`).
+        
         Args:
             question: The user's question
             medication_info: Information about the original medication (optional)
@@ -314,7 +396,7 @@ class SimpleAssistant:
         return "I'm a simple assistant designed to help with basic medication questions. For specific medical advice, please consult your healthcare provider."
 
 
-    def explain_recommendation(self, original_med: Dict, alternative_med: Dict) -> str:
+    def explain_recommendation(self, original_med: Dict, alternative_med: Dict, insurance: Optional[str] = None) -> str:
         savings = original_med['Avg Cost (USD)'] - alternative_med['avg_cost']
         savings_percent = (savings / original_med['Avg Cost (USD)']) * 100
 
@@ -329,19 +411,14 @@ class SimpleAssistant:
 
 
 
-        insurance_level = alternative_med.get('insurance_coverage', 'None')
-        if insurance_level == "Most":
-            savings_min = max(5, int(alternative_med['avg_cost'] * 0.4))
-            savings_max = max(10, int(alternative_med['avg_cost'] * 0.7))
-            explanation += f"**Insurance Coverage:** Most plans cover this medication. You may save **${savings_min}–${savings_max}** per month with insurance.\n\n"
-        elif insurance_level == "Some":
-            savings_min = max(3, int(alternative_med['avg_cost'] * 0.2))
-            savings_max = max(6, int(alternative_med['avg_cost'] * 0.4))
-            explanation += f"**Insurance Coverage:** Some plans offer partial coverage. Estimated savings: **${savings_min}–${savings_max}** monthly.\n\n"
-        elif insurance_level == "Limited":
-            explanation += "**Insurance Coverage:** Only a few plans cover this drug. Savings may be small or none.\n\n"
-        else:
-            explanation += "**Insurance Coverage:** This medication is not covered. Expect to pay the full price out of pocket.\n\n"
+        # What the patient pays under their plan, from the plan's formulary tiers
+        plan = insurance or alternative_med.get('insurance_plan', SELF_PAY_PLAN)
+        explanation += describe_patient_cost(
+            alternative_med['avg_cost'],
+            alternative_med.get('insurance_coverage', 'None'),
+            plan,
+            alternative_med['name']
+        ) + "\n\n"
 
         explanation += f"Both medications are in the **{original_med['Type/Class']}** class and work in similar ways."
 
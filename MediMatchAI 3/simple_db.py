@@ -1,10 +1,45 @@
 import pandas as pd
 import os
-from typing import Dict, List, Optional
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+import shared_catalog
+import sqlite_backend
+from alternatives_graph import AlternativesGraph, split_alternatives
+from catalog import Catalog, CatalogSwap, DELTAS_DIR, as_delta, build_catalog, save_delta
+from compiled_catalog import NO_RESTRICTIONS, CompiledCatalog, coerce_numeric, split_list
+from insurance import describe_cost_sharing, get_patient_costs
+from profiler import profiled
 
 # Path to the simplified medications database
 MEDICATIONS_CSV = os.path.join("data", "medications_simple.csv")
 
+# SQLite table holding the simplified catalog when the SQLite backend is enabled
+MEDICATIONS_TABLE = "medications_simple"
+
+# Persisted catalog deltas, replayed on top of the CSV whenever it is loaded
+MEDICATIONS_DELTAS_DIR = os.path.join(DELTAS_DIR, "medications_simple")
+
+# Columns covered by full-text search
+MEDICATIONS_TEXT_COLUMNS = ['Medication Name', 'Generic Name', 'Type/Class']
+
+# Comma-separated and numeric columns parsed once per catalog version
+MEDICATIONS_LIST_COLUMNS = ['Restrictions', 'Supplement Suggestions']
+MEDICATIONS_NUMERIC_COLUMNS = ['Avg Cost (USD)']
+
+# Columns kept as they are; the raw suggestions tell a catalog record from an edited copy
+MEDICATIONS_VALUE_COLUMNS = ['Supplement Suggestions']
+
+# Guards the caches derived from the catalog
+_catalog_lock = threading.RLock()
+
+# Parsed fields and alternatives graph, compiled together once per catalog version
+_compiled: Optional[CompiledCatalog] = None
+_graph: Optional[AlternativesGraph] = None
+_compiled_key: Optional[tuple] = None
+
+# Dangling alternatives last reported, so deltas that don't change them stay quiet
+_reported_dangling: Dict[str, List[str]] = {}
+
 # Medication risks database (static for now)
 MEDICATION_RISKS = {
     "Diphenhydramine": "May cause drowsiness, dry mouth, urinary retention. Not recommended for elderly.",
@@ -108,7 +143,7 @@ def load_medications() -> pd.DataFrame:
             
         # Check if the medications file exists
         if os.path.exists(MEDICATIONS_CSV):
-            return pd.read_csv(MEDICATIONS_CSV)
+            return coerce_numeric(pd.read_csv(MEDICATIONS_CSV), MEDICATIONS_NUMERIC_COLUMNS, MEDICATIONS_CSV)
         else:
             print(f"Warning: Medications file not found at {MEDICATIONS_CSV}")
             return pd.DataFrame()
@@ -117,6 +152,186 @@ def load_medications() -> pd.DataFrame:
         print(f"Error loading medications database: {e}")
         return pd.DataFrame()
 
+def get_sqlite_catalog() -> Optional[sqlite_backend.SqliteCatalog]:
+    """
+    Get the SQLite-backed simplified catalog if the backend is enabled.
+    
+    Returns:
+        SqliteCatalog or None when lookups should use the in-memory catalog
+    """
+    return sqlite_backend.get_catalog(
+        MEDICATIONS_TABLE,
+        MEDICATIONS_CSV,
+        name_column='Medication Name',
+        class_column='Type/Class',
+        generic_column='Generic Name',
+        text_columns=MEDICATIONS_TEXT_COLUMNS,
+        deltas_dir=MEDICATIONS_DELTAS_DIR
+    )
+
+def _build_catalog() -> Catalog:
+    """Build the in-memory simplified medications catalog from the CSV and any persisted deltas."""
+    df = load_medications()
+    return build_catalog(
+        df,
+        name_column='Medication Name',
+        class_column='Type/Class',
+        generic_column='Generic Name',
+        text_columns=MEDICATIONS_TEXT_COLUMNS,
+        deltas_dir=MEDICATIONS_DELTAS_DIR
+    )
+
+# In-memory catalog shared by every lookup in this process
+_catalog_swap = CatalogSwap(_build_catalog, MEDICATIONS_CSV)
+
+def get_shared_catalog() -> Optional[shared_catalog.SharedCatalog]:
+    """
+    Get the simplified medications catalog shared by every process on this host, if enabled.
+    
+    The first process to need it (or the first after the CSV changes) builds
+    and publishes it; the others attach the published copy read-only.
+    
+    Returns:
+        SharedCatalog or None when the shared catalog is not enabled
+    """
+    if not shared_catalog.is_enabled():
+        return None
+    
+    if not os.path.exists(MEDICATIONS_CSV):
+        load_medications()  # Creates the sample data
+    
+    return shared_catalog.get_shared_catalog(
+        MEDICATIONS_TABLE,
+        _build_catalog,
+        os.path.getmtime(MEDICATIONS_CSV) if os.path.exists(MEDICATIONS_CSV) else None
+    )
+
+def get_catalog() -> Union[Catalog, shared_catalog.SharedCatalog, sqlite_backend.SqliteCatalog]:
+    """
+    Get the simplified medications catalog used for lookups.
+    
+    Returns the SQLite catalog when that backend is enabled, then the
+    host-wide shared catalog when that is enabled, otherwise an
+    in-memory catalog that is loaded once and only reloaded when the CSV
+    file changes. Price and other updates are applied with `apply_catalog_delta`.
+    
+    In-memory catalogs are immutable snapshots: reloads and deltas publish a
+    new catalog with an atomic swap (see `catalog.CatalogSwap`), so keep the
+    returned catalog for a consistent view across several lookups.
+    
+    Returns:
+        Catalog object
+    """
+    sqlite_catalog = get_sqlite_catalog()
+    if sqlite_catalog is not None:
+        return sqlite_catalog
+    
+    shared = get_shared_catalog()
+    if shared is not None:
+        return shared
+    
+    return _catalog_swap.get()
+
+def get_catalog_version() -> int:
+    """Return the version of the simplified catalog (bumped by every delta)."""
+    return get_catalog().version
+
+def apply_catalog_delta(delta: Union[str, pd.DataFrame], persist: bool = False) -> Dict:
+    """
+    Apply a delta of upserts and deletes to the simplified catalog.
+    
+    Deltas are keyed by 'Medication Name'; a daily price update only needs
+    the 'Medication Name' and 'Avg Cost (USD)' columns.
+    
+    Args:
+        delta: Path to a delta CSV or a delta DataFrame (see `catalog.read_delta`)
+        persist: Also save the delta so it is replayed when the catalog is reloaded
+        
+    Returns:
+        Dictionary with the new catalog version and row counts
+    """
+    delta = as_delta(delta)
+    
+    if isinstance(get_catalog(), shared_catalog.SharedCatalog):
+        # Publish an updated copy that every process switches to
+        result = shared_catalog.apply_shared_delta(MEDICATIONS_TABLE, delta)
+    elif isinstance(get_catalog(), Catalog):
+        # Apply to a copy and swap it in, so readers never see a half-applied delta
+        result = _catalog_swap.apply_delta(delta)
+    else:
+        with _catalog_lock:
+            result = get_catalog().apply_delta(delta)
+    
+    if persist:
+        save_delta(delta, MEDICATIONS_DELTAS_DIR)
+    
+    return result
+
+def _get_compiled():
+    """
+    Parse the catalog's comma-separated and numeric fields and build the
+    alternatives graph, once per catalog version.
+    
+    Both are built from the same columns, so graph node IDs are also rows of
+    the compiled catalog. Alternatives naming medications that are not in
+    the catalog are reported here instead of being skipped on every lookup,
+    when the catalog is loaded and whenever a delta changes them.
+    
+    Returns:
+        Tuple of (CompiledCatalog, AlternativesGraph) (shared; do not modify)
+    """
+    global _compiled, _graph, _compiled_key, _reported_dangling
+    
+    catalog = get_catalog()
+    key = (id(catalog), catalog.version)
+    compiled, graph = _compiled, _graph
+    if compiled is not None and key == _compiled_key:
+        return compiled, graph
+    
+    with _catalog_lock:
+        if _compiled is None or key != _compiled_key:
+            compiled = CompiledCatalog(
+                catalog,
+                'Medication Name',
+                list_fields=MEDICATIONS_LIST_COLUMNS,
+                numeric_fields=MEDICATIONS_NUMERIC_COLUMNS,
+                value_fields=MEDICATIONS_VALUE_COLUMNS,
+                reference_field='Alternatives',
+                generic_key='Generic Name'
+            )
+            graph = AlternativesGraph(compiled.names, compiled.values['Generic Name'],
+                                      compiled.lists['Alternatives'])
+            
+            if compiled.dangling != _reported_dangling:
+                dangling = compiled.describe_dangling('Alternatives')
+                if dangling:
+                    print(f"Warning: {dangling}")
+                _reported_dangling = compiled.dangling
+            
+            _compiled, _graph, _compiled_key = compiled, graph, key
+        return _compiled, _graph
+
+def get_compiled_catalog() -> CompiledCatalog:
+    """
+    Get the simplified catalog's comma-separated and numeric fields parsed once per catalog version.
+    
+    Returns:
+        CompiledCatalog (shared; do not modify)
+    """
+    return _get_compiled()[0]
+
+def get_alternatives_graph() -> AlternativesGraph:
+    """
+    Get the therapeutic-equivalence graph for the simplified catalog.
+    
+    The 'Alternatives' lists are resolved to integer node IDs once per
+    catalog version, so alternative lookups never re-split or re-scan them.
+    
+    Returns:
+        AlternativesGraph (shared; do not modify)
+    """
+    return _get_compiled()[1]
+
 def get_medication_info(medication_name: str) -> Optional[Dict]:
     """
     Get information about a specific medication.
@@ -127,29 +342,21 @@ def get_medication_info(medication_name: str) -> Optional[Dict]:
     Returns:
         Dictionary with medication information or None if not found
     """
-    df = load_medications()
+    catalog = get_catalog()
     
-    if df.empty:
+    if catalog.empty:
         return None
     
-    # Case-insensitive search for the medication name
-    medication = df[df['Medication Name'].str.lower() == medication_name.lower()]
-    
-    if not medication.empty:
-        return medication.iloc[0].to_dict()
-    
-    # If no exact match, try partial matching
-    medication = df[df['Medication Name'].str.lower().str.contains(medication_name.lower())]
-    
-    if not medication.empty:
-        return medication.iloc[0].to_dict()
-    
-    return None
+    # Case-insensitive search for the medication name, then partial matching
+    return catalog.find(medication_name)
 
 def get_insurance_description(insurance_level: str) -> str:
     """
     Get a more detailed description of insurance coverage levels.
     
+    Covered levels include the copay/coinsurance range the known plans charge
+    for the formulary tier the level maps to.
+    
     Args:
         insurance_level: The insurance level (None, Some, Most, Limited)
         
@@ -164,78 +371,113 @@ def get_insurance_description(insurance_level: str) -> str:
         "None / Self-pay": "This medication is not covered by insurance. You'll likely pay the full price."
     }
     
-    return insurance_descriptions.get(insurance_level, insurance_level)
+    description = insurance_descriptions.get(insurance_level, insurance_level)
+    
+    cost_sharing = describe_cost_sharing(insurance_level)
+    if cost_sharing:
+        description += f" Typical cost: {cost_sharing} per month."
+    
+    return description
 
-def find_alternatives(medication_info: Dict, budget: Optional[float] = None, insurance: str = "None / Self-pay", 
-                     restrictions: Optional[str] = None) -> List[Dict]:
+def find_alternative_candidates(medication_info: Dict, restrictions: Optional[str] = None,
+                                max_depth: int = 1) -> Tuple[List[Dict], List[int]]:
     """
-    Find alternative medications based on the user's criteria.
+    Find the catalog alternatives of a medication that pass the user's restrictions.
     
     Args:
         medication_info: Dictionary with original medication information
-        budget: Optional budget constraint
-        insurance: Insurance coverage level ("None / Self-pay", "Some", "Most")
         restrictions: Optional medical restrictions/allergies
+        max_depth: How many hops of the alternatives graph to follow
         
     Returns:
-        List of alternative medication dictionaries
+        Tuple of the candidates' catalog records and the hops to each
     """
-    df = load_medications()
+    catalog = get_catalog()
     
-    if df.empty:
-        return []
+    if catalog.empty:
+        return [], []
     
-    # Get the alternative medication names - multiple alternatives separated by commas
-    alternatives_str = medication_info.get('Alternatives', '')
+    compiled, graph = _get_compiled()
     
-    if not alternatives_str:
-        return []
+    # Follow the precompiled graph from the medication, or from its listed
+    # alternatives when the medication itself is not in the catalog
+    source = graph.name_index.get(str(medication_info.get('Medication Name', '')).lower())
+    if source is not None:
+        reachable = graph.reachable(source, max_depth)
+    else:
+        seeds = graph.resolve(split_alternatives(medication_info.get('Alternatives', '')))
+        reachable = graph.reachable_from(seeds, max_depth)
     
-    # Split the alternatives by comma
-    alternative_names = [name.strip() for name in alternatives_str.split(',')]
+    user_restrictions = [r.lower() for r in split_list(str(restrictions))] if restrictions else []
+    restriction_lists = compiled.lists['Restrictions']
     
-    results = []
+    nodes = []
+    hops = []
     
-    # Process each alternative
-    for alt_name in alternative_names:
-        # Find the alternative in the database
-        alternative = df[df['Medication Name'].str.lower() == alt_name.lower()]
-        
-        if alternative.empty:
-            # Try looking for the generic name instead
-            alternative = df[df['Generic Name'].str.lower() == alt_name.lower()]
-            
-        if alternative.empty:
-            continue
-        
-        alt_info = alternative.iloc[0].to_dict()
-        
-        # Check if this alternative meets the user's criteria
-        if budget and alt_info['Avg Cost (USD)'] > budget:
-            continue  # Over budget
-            
-        if restrictions and str(alt_info['Restrictions']).lower() != 'none':
+    # Graph nodes are rows of the compiled catalog, so every alternative is already resolved
+    for node, depth in reachable:
+        if user_restrictions:
             # Check if any restriction keywords match
-            user_restrictions = [r.strip().lower() for r in str(restrictions).split(',')]
-            med_restrictions = [r.strip().lower() for r in str(alt_info['Restrictions']).split(',')]
+            med_restrictions = [r.lower() for r in restriction_lists[node]]
+            if len(med_restrictions) == 1 and med_restrictions[0] in NO_RESTRICTIONS:
+                med_restrictions = []
             
-            should_skip = False
-            for user_r in user_restrictions:
-                for med_r in med_restrictions:
-                    if user_r in med_r or med_r in user_r:
-                        should_skip = True
-                        break
-                if should_skip:
-                    break
-                        
-            if should_skip:
+            if any(user_r in med_r or med_r in user_r for user_r in user_restrictions for med_r in med_restrictions):
                 continue  # Restriction match found
         
-        # Format and add this alternative to results
-        alt_name = alt_info['Medication Name']
+        nodes.append(node)
+        hops.append(depth)
+    
+    # Only the candidates' records are fetched from the catalog
+    return compiled.records(nodes), hops
+
+def price_alternatives(medication_info: Dict, candidates: List[Dict], insurance: str = "None / Self-pay") -> List[float]:
+    """
+    Price a medication and its candidate alternatives under the user's plan in one pass.
+    
+    Returns:
+        What the patient pays per month for the original, then for each candidate
+    """
+    return get_patient_costs([medication_info] + candidates, insurance,
+                             name_key='Medication Name', cost_key='Avg Cost (USD)')
+
+def get_interaction_warnings(medication_names: List[str]) -> List[Tuple[str, List[str]]]:
+    """
+    Look up the potential risks and do-not-combine list of each medication.
+    
+    Returns:
+        List of (risks, do_not_combine) tuples, one per medication
+    """
+    return [(get_medication_risks(name), get_do_not_combine(name)) for name in medication_names]
+
+def format_alternatives(medication_info: Dict, candidates: List[Dict], hops: List[int], patient_costs: List[float],
+                        warnings: List[Tuple[str, List[str]]], budget: Optional[float] = None,
+                        insurance: str = "None / Self-pay") -> List[Dict]:
+    """
+    Build the alternative dictionaries from the priced candidates, within the budget.
+    
+    Args:
+        medication_info: Dictionary with original medication information
+        candidates: Candidate catalog records (see `find_alternative_candidates`)
+        hops: Hops to each candidate
+        patient_costs: Output of `price_alternatives` (the original first)
+        warnings: Output of `get_interaction_warnings` for the candidates
+        budget: Optional budget constraint
+        insurance: Insurance coverage level the candidates were priced under
+        
+    Returns:
+        List of alternative medication dictionaries, cheapest out-of-pocket cost first
+    """
+    original_patient_cost = patient_costs[0]
+    
+    results = []
+    for alt_info, patient_cost, depth, (risks, do_not_combine) in zip(candidates, patient_costs[1:], hops, warnings):
+        # Check if this alternative fits the budget (the budget is what the patient pays)
+        if budget and patient_cost > budget:
+            continue  # Over budget
         
         results.append({
-            'name': alt_name,
+            'name': alt_info['Medication Name'],
             'generic_name': alt_info['Generic Name'],
             'drug_class': alt_info['Type/Class'],
             'avg_cost': alt_info['Avg Cost (USD)'],
@@ -243,15 +485,44 @@ def find_alternatives(medication_info: Dict, budget: Optional[float] = None, ins
             'insurance_description': get_insurance_description(alt_info['Insurance Coverage']),
             'restrictions': alt_info['Restrictions'],
             'savings': medication_info['Avg Cost (USD)'] - alt_info['Avg Cost (USD)'],
-            'potential_risks': get_medication_risks(alt_name),
-            'do_not_combine': get_do_not_combine(alt_name)
+            'patient_cost': float(patient_cost),
+            'patient_savings': float(original_patient_cost - patient_cost),
+            'insurance_plan': insurance,
+            'hops': depth,
+            'potential_risks': risks,
+            'do_not_combine': do_not_combine
         })
     
-    # Sort by cost (cheapest first)
-    results.sort(key=lambda x: x['avg_cost'])
+    # Sort by what the patient pays (cheapest first)
+    results.sort(key=lambda x: x['patient_cost'])
     
     return results
 
+@profiled()
+def find_alternatives(medication_info: Dict, budget: Optional[float] = None, insurance: str = "None / Self-pay", 
+                     restrictions: Optional[str] = None, max_depth: int = 1) -> List[Dict]:
+    """
+    Find alternative medications based on the user's criteria.
+    
+    Args:
+        medication_info: Dictionary with original medication information
+        budget: Optional budget constraint
+        insurance: Insurance coverage level ("None / Self-pay", "Some", "Most")
+        restrictions: Optional medical restrictions/allergies
+        max_depth: How many hops of the alternatives graph to follow
+            (1 is the listed alternatives, 2 adds their alternatives, ...)
+        
+    Returns:
+        List of alternative medication dictionaries, cheapest out-of-pocket cost first
+    """
+    candidates, hops = find_alternative_candidates(medication_info, restrictions, max_depth)
+    if not candidates:
+        return []
+    
+    patient_costs = price_alternatives(medication_info, candidates, insurance)
+    warnings = get_interaction_warnings([alt_info['Medication Name'] for alt_info in candidates])
+    return format_alternatives(medication_info, candidates, hops, patient_costs, warnings, budget, insurance)
+
 def get_supplement_suggestions(medication_info: Dict) -> List[str]:
     """
     Get supplement suggestions for a medication.
@@ -264,11 +535,14 @@ def get_supplement_suggestions(medication_info: Dict) -> List[str]:
     """
     supplements_str = medication_info.get('Supplement Suggestions', '')
     
-    if not supplements_str:
-        return []
+    # Catalog medications were split when the catalog was compiled
+    compiled = get_compiled_catalog()
+    row = compiled.row(medication_info.get('Medication Name'))
+    if row is not None and compiled.values['Supplement Suggestions'][row] == supplements_str:
+        return list(compiled.lists['Supplement Suggestions'][row])
     
     # Split by comma and strip whitespace
-    return [supp.strip() for supp in str(supplements_str).split(',')]
+    return list(split_list(supplements_str))
 
 def get_medication_risks(medication_name: str) -> str:
     """
@@ -0,0 +1,691 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from catalog import DELTA_DELETE, DELTA_OP_COLUMN, DELTA_UPSERT, list_delta_files, read_delta
+
+# Set this environment variable to a database path to serve the catalog from SQLite
+SQLITE_DB_ENV = "MEDIMATCH_SQLITE_DB"
+
+# Default location of the SQLite catalog database
+DEFAULT_SQLITE_DB = os.path.join("data", "medications.db")
+
+# Number of CSV rows inserted per transaction batch when building a table
+BUILD_CHUNK_SIZE = 50000
+
+# Maximum number of open connections per database file
+POOL_SIZE = 8
+
+
+def _quote(identifier: str) -> str:
+    """Quote a column or table name for use in SQL (CSV headers contain spaces)."""
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def is_enabled() -> bool:
+    """Return True if the SQLite catalog backend has been switched on."""
+    return bool(os.environ.get(SQLITE_DB_ENV))
+
+
+def get_db_path() -> str:
+    """Return the configured SQLite database path."""
+    path = os.environ.get(SQLITE_DB_ENV, "")
+    if not path or path.lower() in ("1", "true", "yes"):
+        return DEFAULT_SQLITE_DB
+    return path
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections to a single database file.
+
+    Connections are opened lazily up to `size` and handed out one per thread
+    at a time. The database runs in WAL mode so readers never block each other
+    or the writer rebuilding a table.
+    """
+
+    def __init__(self, db_path: str, size: int = POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False,
+                               isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Keep the per-connection page cache small so memory stays flat with catalog size
+        conn.execute("PRAGMA cache_size=-8000")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+
+        # Pool exhausted: wait for another thread to return a connection
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of a `with` block."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close every idle connection in the pool."""
+        with self._lock:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+                self._opened -= 1
+
+
+def _ensure_meta_table(conn: sqlite3.Connection):
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS catalog_meta ("
+        "table_name TEXT PRIMARY KEY, source_mtime REAL, bool_columns TEXT, row_count INTEGER, "
+        "text_columns TEXT, version INTEGER DEFAULT 0)"
+    )
+    # Arrays derived from one catalog version (e.g. parsed list columns), see SqliteCatalog.save_arrays
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS catalog_arrays ("
+        "table_name TEXT, version INTEGER, name TEXT, dtype TEXT, data BLOB, "
+        "PRIMARY KEY (table_name, name))"
+    )
+
+
+def _sql_type(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def _chunk_rows(chunk: pd.DataFrame) -> List[list]:
+    """Convert a DataFrame chunk to plain Python rows (NaN becomes NULL)."""
+    return chunk.astype(object).where(chunk.notna(), None).values.tolist()
+
+
+def build_table(
+    db_path: str,
+    table: str,
+    csv_path: str,
+    index_columns: List[str],
+    text_columns: List[str],
+    chunksize: int = BUILD_CHUNK_SIZE
+) -> int:
+    """
+    Build (or rebuild) a catalog table in SQLite from a CSV file.
+
+    The CSV is streamed in chunks so memory use does not depend on catalog size.
+    The whole rebuild runs in one transaction, so readers keep seeing the previous
+    table until it commits.
+
+    Args:
+        db_path: Path to the SQLite database file
+        table: Name of the table to create
+        csv_path: Path to the source CSV file
+        index_columns: Columns to index for case-insensitive equality lookups
+        text_columns: Columns to include in the FTS5 full-text index
+        chunksize: Number of CSV rows per insert batch
+
+    Returns:
+        Number of rows loaded
+    """
+    directory = os.path.dirname(db_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    fts_table = f"{table}_fts"
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        _ensure_meta_table(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+        conn.execute(f"DROP TABLE IF EXISTS {_quote(fts_table)}")
+        # Arrays derived from the old table are stale
+        conn.execute("DELETE FROM catalog_arrays WHERE table_name = ?", (table,))
+        # The rebuilt table continues after the old version, so caches keyed on it see the reload
+        previous = conn.execute("SELECT version FROM catalog_meta WHERE table_name = ?", (table,)).fetchone()
+        version = previous[0] + 1 if previous and previous[0] is not None else 0
+
+        row_count = 0
+        bool_columns: List[str] = []
+        insert_sql = None
+
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            if insert_sql is None:
+                columns = list(chunk.columns)
+                bool_columns = [col for col in columns if pd.api.types.is_bool_dtype(chunk[col].dtype)]
+                column_defs = ", ".join(f"{_quote(col)} {_sql_type(chunk[col].dtype)}" for col in columns)
+                conn.execute(f"CREATE TABLE {_quote(table)} ({column_defs})")
+                placeholders = ", ".join("?" for _ in columns)
+                insert_sql = f"INSERT INTO {_quote(table)} VALUES ({placeholders})"
+
+            conn.executemany(insert_sql, _chunk_rows(chunk))
+            row_count += len(chunk)
+
+        if insert_sql is None:
+            raise ValueError(f"{csv_path} contains no header row")
+
+        # Expression indexes serve the case-insensitive lookups used by the db modules
+        for col in index_columns:
+            conn.execute(
+                f"CREATE INDEX {_quote(f'ix_{table}_{col}')} ON {_quote(table)} (lower({_quote(col)}))"
+            )
+
+        # Full-text index keyed by the catalog rowid
+        fts_columns = ", ".join(f"c{i}" for i in range(len(text_columns)))
+        conn.execute(f"CREATE VIRTUAL TABLE {_quote(fts_table)} USING fts5({fts_columns})")
+        select_columns = ", ".join(f"coalesce({_quote(col)}, '')" for col in text_columns)
+        conn.execute(
+            f"INSERT INTO {_quote(fts_table)} (rowid, {fts_columns}) "
+            f"SELECT rowid, {select_columns} FROM {_quote(table)}"
+        )
+
+        conn.execute(
+            "INSERT OR REPLACE INTO catalog_meta "
+            "(table_name, source_mtime, bool_columns, row_count, text_columns, version) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (table, os.path.getmtime(csv_path), json.dumps(bool_columns), row_count, json.dumps(text_columns),
+             version)
+        )
+        conn.execute("COMMIT")
+        return row_count
+
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+    finally:
+        conn.close()
+
+
+def _fts_query(query: str) -> str:
+    """Turn free text into an FTS5 query that matches every term (prefix match on each)."""
+    terms = [term for term in query.replace('"', ' ').split() if term]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+class SqliteCatalog:
+    """
+    Read access to one medication catalog table stored in SQLite.
+
+    Rows are returned as plain dictionaries with the same keys as the CSV
+    columns, so callers can use them exactly like `DataFrame.to_dict()` records.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        table: str,
+        name_column: str,
+        class_column: str,
+        generic_column: Optional[str] = None
+    ):
+        self.pool = pool
+        self.table = table
+        self.name_column = name_column
+        self.class_column = class_column
+        self.generic_column = generic_column
+        self.bool_columns: List[str] = []
+        self.text_columns: List[str] = []
+        self.source_mtime = 0.0
+        self.refresh_meta()
+
+    def refresh_meta(self):
+        """Reload column type information recorded when the table was built."""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT bool_columns, text_columns, source_mtime FROM catalog_meta WHERE table_name = ?",
+                (self.table,)
+            ).fetchone()
+        self.bool_columns = json.loads(row["bool_columns"]) if row else []
+        self.text_columns = json.loads(row["text_columns"]) if row else []
+        self.source_mtime = row["source_mtime"] if row else 0.0
+
+    @property
+    def version(self) -> int:
+        """Number of deltas applied since the table was built from CSV."""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT version FROM catalog_meta WHERE table_name = ?", (self.table,)
+            ).fetchone()
+        return row["version"] if row else 0
+
+    @property
+    def empty(self) -> bool:
+        with self.pool.connection() as conn:
+            return conn.execute(f"SELECT 1 FROM {_quote(self.table)} LIMIT 1").fetchone() is None
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict:
+        record = dict(row)
+        for col in self.bool_columns:
+            if record.get(col) is not None:
+                record[col] = bool(record[col])
+        return record
+
+    def _fetch(self, where: str, params: tuple = (), limit: Optional[int] = None) -> List[Dict]:
+        sql = f"SELECT * FROM {_quote(self.table)} WHERE {where} ORDER BY rowid"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self.pool.connection() as conn:
+            return [self._to_dict(row) for row in conn.execute(sql, params)]
+
+    def find_exact(self, value: str, column: Optional[str] = None) -> Optional[Dict]:
+        """
+        Find the first row whose column matches `value` case-insensitively.
+
+        Args:
+            value: Value to look up
+            column: Column to match (defaults to the medication name column)
+
+        Returns:
+            Row dictionary or None if not found
+        """
+        column = column or self.name_column
+        rows = self._fetch(f"lower({_quote(column)}) = ?", (str(value).lower(),), limit=1)
+        return rows[0] if rows else None
+
+    def find(self, medication_name: str) -> Optional[Dict]:
+        """Find a medication by exact name, falling back to a partial name match."""
+        record = self.find_exact(medication_name)
+        if record is not None:
+            return record
+
+        rows = self._fetch(
+            f"instr(lower({_quote(self.name_column)}), ?) > 0", (medication_name.lower(),), limit=1
+        )
+        return rows[0] if rows else None
+
+    def by_class(self, drug_class: str) -> List[Dict]:
+        """Return every medication in a drug class (case-insensitive)."""
+        return self._fetch(f"lower({_quote(self.class_column)}) = ?", (drug_class.lower(),))
+
+    def search(self, query: str) -> List[Dict]:
+        """Return medications whose name or drug class contains the query."""
+        term = query.lower()
+        return self._fetch(
+            f"instr(lower({_quote(self.name_column)}), ?) > 0 OR "
+            f"instr(lower({_quote(self.class_column)}), ?) > 0",
+            (term, term)
+        )
+
+    def select(self, filters: Dict, limit: Optional[int] = None) -> List[Dict]:
+        """Return rows where every column equals the given value."""
+        clauses = " AND ".join(f"{_quote(col)} IS ?" for col in filters)
+        params = tuple(int(v) if isinstance(v, bool) else v for v in filters.values())
+        return self._fetch(clauses or "1", params, limit=limit)
+
+    def full_text_search(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        Search names, descriptions and side effects with the FTS5 index.
+
+        Args:
+            query: Free-text search terms
+            limit: Maximum number of results
+
+        Returns:
+            List of row dictionaries ordered by relevance
+        """
+        match = _fts_query(query)
+        if not match:
+            return []
+
+        fts_table = f"{self.table}_fts"
+        sql = (
+            f"SELECT t.* FROM {_quote(fts_table)} f JOIN {_quote(self.table)} t ON t.rowid = f.rowid "
+            f"WHERE {_quote(fts_table)} MATCH ? ORDER BY f.rank LIMIT ?"
+        )
+        with self.pool.connection() as conn:
+            return [self._to_dict(row) for row in conn.execute(sql, (match, int(limit)))]
+
+    def column_values(self, columns: List[str], batch_size: int = 10000) -> Tuple[np.ndarray, Dict[str, list]]:
+        """
+        Every row's values of some columns, streamed in rowid order without building row dictionaries.
+
+        Args:
+            columns: Columns to read (missing columns read as None)
+            batch_size: Number of rows fetched per query
+
+        Returns:
+            Tuple of (rowids in catalog order, values per column); pass rowids to `get_records`
+        """
+        with self.pool.connection() as conn:
+            table_columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({_quote(self.table)})")}
+        present = [column for column in columns if column in table_columns]
+        select = ", ".join(["rowid"] + [_quote(column) for column in present])
+
+        row_ids: List[int] = []
+        values: Dict[str, list] = {column: [] for column in present}
+        last_rowid = 0
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT {select} FROM {_quote(self.table)} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, batch_size)
+                ).fetchall()
+            if not rows:
+                break
+            batch = list(zip(*rows))
+            row_ids.extend(batch[0])
+            for column, column_values in zip(present, batch[1:]):
+                values[column].extend(column_values)
+            last_rowid = row_ids[-1]
+
+        for column in columns:
+            if column not in values:
+                values[column] = [None] * len(row_ids)
+            elif column in self.bool_columns:
+                values[column] = [None if value is None else bool(value) for value in values[column]]
+        return np.array(row_ids, dtype=np.int64), values
+
+    def get_records(self, row_ids: List[int], batch_size: int = 500) -> List[Optional[Dict]]:
+        """Row dictionaries by rowid (None for rows that no longer exist)."""
+        found: Dict[int, Dict] = {}
+        with self.pool.connection() as conn:
+            for start in range(0, len(row_ids), batch_size):
+                batch = [int(row_id) for row_id in row_ids[start:start + batch_size]]
+                placeholders = ", ".join("?" for _ in batch)
+                for row in conn.execute(
+                    f"SELECT rowid AS _rowid, * FROM {_quote(self.table)} WHERE rowid IN ({placeholders})", batch
+                ):
+                    record = self._to_dict(row)
+                    found[record.pop("_rowid")] = record
+        return [found.get(int(row_id)) for row_id in row_ids]
+
+    def counterpart_pairs(self, flag_column: str) -> List[Tuple[str, str, bool]]:
+        """
+        Counterparts listed by the rows whose flag is false (e.g. generics and their brands), in one self-join.
+
+        The join runs on the indexed name and generic columns, so only name
+        pairs are read.
+
+        Args:
+            flag_column: Boolean column that is false for the rows listing a counterpart
+
+        Returns:
+            List of (name, listed counterpart, whether the counterpart is a
+            catalog row whose flag is true) tuples in catalog order
+        """
+        if not self.generic_column:
+            return []
+        table = _quote(self.table)
+        name, counterpart, flag = _quote(self.name_column), _quote(self.generic_column), _quote(flag_column)
+        sql = (
+            f"SELECT row.{name}, row.{counterpart}, other.rowid IS NOT NULL FROM {table} row "
+            f"LEFT JOIN {table} other ON lower(other.{name}) = lower(row.{counterpart}) "
+            f"AND other.{name} = row.{counterpart} AND other.{flag} = 1 "
+            f"WHERE row.{flag} = 0 AND row.{counterpart} IS NOT NULL AND row.{counterpart} != '' "
+            f"ORDER BY row.rowid"
+        )
+        with self.pool.connection() as conn:
+            return [(row[0], row[1], bool(row[2])) for row in conn.execute(sql)]
+
+    def load_arrays(self, version: int, prefix: str) -> Optional[Dict[str, np.ndarray]]:
+        """Arrays saved under `prefix` for a catalog version with `save_arrays`, or None if there are none."""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT name, dtype, data FROM catalog_arrays "
+                "WHERE table_name = ? AND version = ? AND substr(name, 1, ?) = ?",
+                (self.table, version, len(prefix), prefix)
+            ).fetchall()
+        if not rows:
+            return None
+        return {row["name"][len(prefix):]: np.frombuffer(row["data"], dtype=np.dtype(row["dtype"])) for row in rows}
+
+    def save_arrays(self, version: int, prefix: str, arrays: Dict[str, np.ndarray]):
+        """
+        Store arrays derived from one catalog version under a name prefix.
+
+        Arrays of other versions are dropped. Other processes serving the
+        same database read them back with `load_arrays` instead of deriving
+        them again.
+        """
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM catalog_arrays WHERE table_name = ? AND version != ?", (self.table, version))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO catalog_arrays (table_name, version, name, dtype, data) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(self.table, version, prefix + name, array.dtype.str, np.ascontiguousarray(array).tobytes())
+                     for name, array in arrays.items()]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def iter_records(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """Stream every row in catalog order without loading the table into memory."""
+        last_rowid = 0
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT rowid AS _rowid, * FROM {_quote(self.table)} "
+                    f"WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                record = self._to_dict(row)
+                last_rowid = record.pop("_rowid")
+                yield record
+
+    def apply_delta(self, delta: pd.DataFrame) -> Dict:
+        """
+        Apply a delta of upserts and deletes keyed by medication name.
+
+        The whole delta is applied in one transaction together with the
+        matching full-text index rows, and the catalog version is bumped.
+
+        Args:
+            delta: DataFrame in the format described in `catalog.read_delta`
+
+        Returns:
+            Dictionary with the new version and the number of rows updated,
+            inserted and deleted
+        """
+        if self.name_column not in delta.columns:
+            raise ValueError(f"Delta is missing the '{self.name_column}' key column")
+
+        start = time.perf_counter()
+        table = _quote(self.table)
+        fts_table = _quote(f"{self.table}_fts")
+        name = _quote(self.name_column)
+        counts = {'updated': 0, 'inserted': 0, 'deleted': 0}
+
+        with self.pool.connection() as conn:
+            table_columns = [row["name"] for row in conn.execute(f"PRAGMA table_info({table})")]
+            data_columns = [col for col in delta.columns if col in table_columns and col != self.name_column]
+            fts_columns = ", ".join(f"c{i}" for i in range(len(self.text_columns)))
+            fts_values = ", ".join(f"coalesce({_quote(col)}, '')" for col in self.text_columns)
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for record in _chunk_rows(delta):
+                    row = dict(zip(delta.columns, record))
+                    op = str(row.get(DELTA_OP_COLUMN) or DELTA_UPSERT).strip().lower()
+                    key = str(row[self.name_column]).strip()
+                    existing = conn.execute(
+                        f"SELECT rowid FROM {table} WHERE lower({name}) = ? LIMIT 1", (key.lower(),)
+                    ).fetchone()
+
+                    if op == DELTA_DELETE:
+                        if existing is not None:
+                            conn.execute(f"DELETE FROM {table} WHERE rowid = ?", (existing[0],))
+                            conn.execute(f"DELETE FROM {fts_table} WHERE rowid = ?", (existing[0],))
+                            counts['deleted'] += 1
+                        continue
+
+                    if op != DELTA_UPSERT:
+                        raise ValueError(f"Unknown delta operation: {op}")
+
+                    values = {col: row[col] for col in data_columns if row[col] is not None}
+
+                    if existing is not None:
+                        rowid = existing[0]
+                        if values:
+                            assignments = ", ".join(f"{_quote(col)} = ?" for col in values)
+                            conn.execute(
+                                f"UPDATE {table} SET {assignments} WHERE rowid = ?",
+                                (*values.values(), rowid)
+                            )
+                        counts['updated'] += 1
+                    else:
+                        values[self.name_column] = key
+                        columns = ", ".join(_quote(col) for col in values)
+                        placeholders = ", ".join("?" for _ in values)
+                        rowid = conn.execute(
+                            f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", tuple(values.values())
+                        ).lastrowid
+                        counts['inserted'] += 1
+
+                    if self.text_columns and (existing is None or any(col in values for col in self.text_columns)):
+                        conn.execute(f"DELETE FROM {fts_table} WHERE rowid = ?", (rowid,))
+                        conn.execute(
+                            f"INSERT INTO {fts_table} (rowid, {fts_columns}) "
+                            f"SELECT rowid, {fts_values} FROM {table} WHERE rowid = ?",
+                            (rowid,)
+                        )
+
+                conn.execute(
+                    "UPDATE catalog_meta SET version = version + 1, "
+                    f"row_count = (SELECT count(*) FROM {table}) WHERE table_name = ?",
+                    (self.table,)
+                )
+                conn.execute("COMMIT")
+
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        counts['version'] = self.version
+        counts['elapsed_ms'] = (time.perf_counter() - start) * 1000
+        return counts
+
+
+# One pool per database file, one catalog per table
+_pools: Dict[str, ConnectionPool] = {}
+_catalogs: Dict[str, SqliteCatalog] = {}
+_registry_lock = threading.Lock()
+
+
+def _needs_build(db_path: str, table: str, csv_path: str) -> bool:
+    if not os.path.exists(db_path):
+        return True
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        _ensure_meta_table(conn)
+        row = conn.execute(
+            "SELECT source_mtime FROM catalog_meta WHERE table_name = ?", (table,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        return True
+
+    # Rebuild when the source CSV has been rewritten since the table was built
+    return os.path.getmtime(csv_path) > row[0]
+
+
+def get_catalog(
+    table: str,
+    csv_path: str,
+    name_column: str,
+    class_column: str,
+    generic_column: Optional[str] = None,
+    text_columns: Optional[List[str]] = None,
+    deltas_dir: Optional[str] = None
+) -> Optional[SqliteCatalog]:
+    """
+    Get the SQLite-backed catalog for a table, building it from CSV if needed.
+
+    Args:
+        table: Table name for this catalog
+        csv_path: Source CSV file
+        name_column: Column holding the medication name
+        class_column: Column holding the drug class
+        generic_column: Column holding the generic/brand counterpart name (optional)
+        text_columns: Columns to include in full-text search
+        deltas_dir: Directory of persisted delta files replayed after a rebuild
+
+    Returns:
+        SqliteCatalog, or None if the backend is disabled or the CSV is missing
+    """
+    if not is_enabled() or not os.path.exists(csv_path):
+        return None
+
+    db_path = get_db_path()
+    key = f"{db_path}:{table}"
+
+    # Fast path: the table is built and the CSV has not changed since
+    catalog = _catalogs.get(key)
+    if catalog is not None and os.path.getmtime(csv_path) <= catalog.source_mtime:
+        return catalog
+
+    with _registry_lock:
+        try:
+            rebuilt = _needs_build(db_path, table, csv_path)
+            if rebuilt:
+                index_columns = [col for col in (name_column, generic_column, class_column) if col]
+                build_table(db_path, table, csv_path, index_columns, text_columns or [name_column])
+
+            pool = _pools.get(db_path)
+            if pool is None:
+                pool = ConnectionPool(db_path)
+                _pools[db_path] = pool
+
+            catalog = SqliteCatalog(pool, table, name_column, class_column, generic_column)
+
+            # A rebuild starts again from the CSV, so replay the persisted deltas
+            if rebuilt and deltas_dir:
+                for path in list_delta_files(deltas_dir):
+                    delta = read_delta(path)
+                    if name_column in delta.columns:
+                        catalog.apply_delta(delta)
+
+            _catalogs[key] = catalog
+            return catalog
+
+        except Exception as e:
+            print(f"Error building SQLite catalog '{table}': {e}")
+            return None
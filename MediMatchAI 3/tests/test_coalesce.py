@@ -0,0 +1,113 @@
+import threading
+import time
+
+
+from coalesce import SingleFlight, make_key
+
+CALLERS = 8
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.001)
+
+
+def run_concurrently(flight, func, callers=CALLERS):
+    """Start `callers` identical calls, release them once they all joined one flight, and collect the outcomes."""
+    results = [None] * callers
+    errors = [None] * callers
+
+    def call(i):
+        try:
+            results[i] = flight.do("key", func)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flight.stats()['coalesced'] == callers - 1)
+    return threads, results, errors
+
+
+def test_concurrent_identical_calls_run_once():
+    release = threading.Event()
+    executions = []
+
+    def compute():
+        executions.append(threading.get_ident())
+        release.wait(5)
+        return 42
+
+    flight = SingleFlight("test")
+    threads, results, errors = run_concurrently(flight, compute)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(executions) == 1
+    assert results == [42] * CALLERS
+    assert errors == [None] * CALLERS
+    stats = flight.stats()
+    assert stats['executions'] == 1
+    assert stats['coalesced'] == CALLERS - 1
+    assert stats['in_flight'] == 0
+
+
+def test_every_caller_gets_a_private_copy():
+    release = threading.Event()
+    shared = []
+
+    def compute():
+        release.wait(5)
+        result = [{'name': "Atorvastatin"}]
+        shared.append(result)
+        return result
+
+    flight = SingleFlight("test", copy_result=lambda result: [dict(item) for item in result])
+    threads, results, _ = run_concurrently(flight, compute)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    # The caller that ran the computation gets a copy too, so no caller can modify what the others copy
+    assert len({id(result) for result in results + shared}) == CALLERS + 1
+    results[0].append({'name': "Lovastatin"})
+    results[1][0]['name'] = "Simvastatin"
+    assert shared[0] == [{'name': "Atorvastatin"}]
+    assert all(result == [{'name': "Atorvastatin"}] for result in results[2:])
+
+
+def test_waiters_receive_the_error():
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        raise ValueError("feed unavailable")
+
+    flight = SingleFlight("test")
+    threads, results, errors = run_concurrently(flight, compute)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert flight.stats()['errors'] == 1
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_finished_calls_are_not_cached():
+    flight = SingleFlight("test")
+    counter = iter(range(10))
+    assert flight.do("key", lambda: next(counter)) == 0
+    assert flight.do("key", lambda: next(counter)) == 1
+    assert flight.stats()['executions'] == 2
+
+
+def test_make_key_accepts_unhashable_arguments():
+    key = make_key("Lipitor", [{'name': "Atorvastatin"}], insurance="Basic")
+    assert key == make_key("Lipitor", [{'name': "Atorvastatin"}], insurance="Basic")
+    assert key != make_key("Lipitor", [{'name': "Lovastatin"}], insurance="Basic")
@@ -0,0 +1,44 @@
+import os
+
+import pandas as pd
+import pytest
+
+import savings_analytics
+
+MEDICATIONS = [
+    # name, drug_class, avg_cost, is_brand, brand_equivalent
+    ("Lipitor", "Statin", 250.0, True, None),
+    ("Atorvastatin", "Statin", 20.0, False, "Lipitor"),
+    ("Crestor", "Statin", 220.0, True, None),
+    ("Mystery Tonic", None, 40.0, False, None),
+    ("Unpriced Statin", "Statin", None, False, None),
+]
+
+
+@pytest.fixture
+def catalog_dir(tmp_path, monkeypatch):
+    for env in ("MEDIMATCH_SQLITE_DB", "MEDIMATCH_SHARED_CATALOG"):
+        monkeypatch.delenv(env, raising=False)
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    pd.DataFrame(
+        [
+            {'name': name, 'drug_class': drug_class, 'description': "", 'avg_cost': cost, 'is_brand': is_brand,
+             'brand_equivalent': brand, 'side_effects': "", 'interactions': "", 'source': ""}
+            for name, drug_class, cost, is_brand, brand in MEDICATIONS
+        ]
+    ).to_csv(os.path.join("data", "medications.csv"), index=False)
+    return tmp_path
+
+
+def test_rows_without_class_or_cost_have_no_alternative(catalog_dir):
+    table = savings_analytics.build_savings_table().set_index('name')
+
+    assert table.loc["Mystery Tonic", 'alternative_savings'] == 0.0
+    assert pd.isna(table.loc["Mystery Tonic", 'alternative'])
+    assert table.loc["Unpriced Statin", 'savings'] == 0.0
+
+    # Class members with a cost still get their class's cheapest member
+    assert table.loc["Crestor", 'alternative'] == "Atorvastatin"
+    assert table.loc["Crestor", 'alternative_savings'] == pytest.approx(200.0)
+    assert table.loc["Lipitor", 'best_option'] == savings_analytics.GENERIC
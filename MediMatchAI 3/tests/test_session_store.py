@@ -0,0 +1,68 @@
+import threading
+import time
+
+from session_store import SharedResults
+
+THREADS = 8
+LOOKUPS = 500
+
+
+def run_threads(target, count=THREADS):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+
+def test_concurrent_lookups_share_one_entry():
+    results = SharedResults(size=4)
+    built = []
+    seen = []
+
+    def build():
+        built.append(1)
+        return {'recommendations': ["Atorvastatin"]}
+
+    def lookup(_):
+        for _ in range(LOOKUPS):
+            seen.append(results.get(("Lipitor", 1), build))
+
+    run_threads(lookup)
+
+    stats = results.stats()
+    assert stats['hits'] + stats['misses'] == THREADS * LOOKUPS
+    assert stats['misses'] == len(built)
+    assert stats['entries'] == 1
+    # Once stored, every later lookup returns the stored object
+    assert all(value is seen[-1] for value in seen[len(built):])
+
+
+def test_size_bound_holds_under_concurrent_misses():
+    results = SharedResults(size=16)
+
+    def lookup(thread):
+        for i in range(LOOKUPS):
+            key = (thread, i % 40)
+            assert results.get(key, lambda: key) == key
+
+    run_threads(lookup)
+
+    stats = results.stats()
+    assert stats['entries'] == 16
+    assert stats['hits'] + stats['misses'] == THREADS * LOOKUPS
+
+
+def test_catalog_version_separates_entries():
+    results = SharedResults()
+    assert results.get(("Lipitor", 1), lambda: "v1") == "v1"
+    assert results.get(("Lipitor", 2), lambda: "v2") == "v2"
+    assert results.get(("Lipitor", 1), lambda: "rebuilt") == "v1"
+
+
+def test_expired_entries_are_rebuilt():
+    results = SharedResults(ttl=0.05)
+    assert results.get("key", lambda: 1) == 1
+    time.sleep(0.1)
+    assert results.get("key", lambda: 2) == 2
+    assert results.stats()['expired'] == 1